@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Замер пропускной способности слоя данных без MySQL: те же асинхронные вызовы,
+что делают обработчики (регистрация, создание заявки, ленты, поиск, смена статуса),
+выполняются через DbExecutor на хранилище SQLite.
+
+    python bench_repo.py --users 200 --requests 2000 --concurrency 20
+    python bench_repo.py --path /tmp/bench.sqlite3   # файл вместо памяти
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from db import Database
+from db_async import AsyncDatabase, get_db_executor
+from db_sqlite import SQLitePool
+from repositories import async_request_repo as repo
+
+LEADERS = ['Сокол', 'Беркут', 'Иванов Сокол', 'Орёл', 'Кедр', 'Гром']
+
+
+def request_data(n):
+    day = 1 + n % 28
+    return {
+        'division': f"Подразделение {n % 10}", 'direction': 'Север', 'checkpoint': 'КПП-1',
+        'date_start': f"{day:02d}.10.2026", 'date_end': f"{day:02d}.10.2026",
+        'time_start': '08:00', 'time_end': '10:00', 'car_brand': 'КамАЗ',
+        'people_count': 1 + n % 5, 'leader_name': random.choice(LEADERS),
+        'cargo': 'нет', 'purpose': 'работы',
+    }
+
+
+async def run_stage(name, count, concurrency, call):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            return await call(i)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(count)))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<22} {count:>6} оп. {elapsed:7.2f} с {count / elapsed:9.0f} оп/с")
+    return results
+
+
+async def main(args):
+    Database.set_pool(SQLitePool(args.path, size=args.concurrency))
+    Database.create_tables()
+    users = range(1, args.users + 1)
+
+    await run_stage("регистрация /start", args.users, args.concurrency,
+                    lambda i: AsyncDatabase.register_or_touch_user(users[i], f"user{i}", f"Пользователь {i}"))
+    ids = await run_stage("создание заявки", args.requests, args.concurrency,
+                          lambda i: repo.save_request(request_data(i), users[i % args.users]))
+    await run_stage("заявка по номеру", args.requests, args.concurrency,
+                    lambda i: repo.get_request_full(random.choice(ids)))
+    await run_stage("лента оператора", args.requests // 10, args.concurrency,
+                    lambda i: repo.get_operator_requests_page('01.10.2026', '31.10.2026', after_id=random.choice(ids)))
+    await run_stage("поиск по старшему", args.requests // 10, args.concurrency,
+                    lambda i: repo.search_requests_by_leader(random.choice(LEADERS), '01.10.2026', '31.10.2026'))
+    await run_stage("смена статуса", args.requests, args.concurrency,
+                    lambda i: repo.update_request_status(ids[i], repo.STATUS_IN_PROGRESS))
+
+    print(get_db_executor().stats())
+    print(Database.get_pool_stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--path', default=':memory:', help="файл SQLite или :memory:")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,134 @@
+# cache.py
+# Кэш в памяти процесса с ограниченным временем жизни записей и размером.
+# Используется для данных, которые читаются на каждом шаге диалога
+# и меняются редко (профили пользователей, заявки по номеру).
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """Загрузка значения, которую ждут параллельные промахи по тому же ключу."""
+
+    def __init__(self, token):
+        self.token = token
+        self.value = None
+        self.done = threading.Event()
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU-кэш с TTL.
+    ttl: время жизни записи, сек
+    max_size: максимум записей; при переполнении вытесняются давно не читанные
+
+    Чтобы не положить в кэш значение, прочитанное из БД до параллельной записи,
+    загрузка выполняется так:
+        token = cache.token()
+        value = <чтение из БД>
+        cache.set(key, value, token)
+    Если между token() и set() была инвалидация, значение не сохраняется.
+    """
+
+    def __init__(self, ttl=300, max_size=1000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._collapsed = 0
+        self._inflight = {}  # key -> _Flight
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] > now:
+                self._data.move_to_end(key)
+                self._hits += 1
+                return item[0]
+            if item is not None:
+                del self._data[key]
+            self._misses += 1
+            return default
+
+    def get_or_load(self, key, loader):
+        """
+        Значение из кэша или результат loader().
+        Параллельные промахи по одному ключу ждут одного вызова loader().
+        Если после начала загрузки была инвалидация, опоздавшие к ней
+        не присоединяются и читают заново. None не кэшируется.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None and flight.token == self._generation:
+                self._collapsed += 1
+                leader = False
+            else:
+                flight = _Flight(self._generation)
+                self._inflight[key] = flight
+                leader = True
+        if not leader:
+            flight.done.wait()
+            return flight.value
+        try:
+            flight.value = loader()
+            if flight.value is not None:
+                self.set(key, flight.value, flight.token)
+            return flight.value
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+            flight.done.set()
+
+    def token(self):
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, token=None):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return False
+        with self._lock:
+            if token is not None and token != self._generation:
+                return False
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._evictions += 1
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+                'collapsed': self._collapsed,
+            }
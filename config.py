@@ -15,6 +15,84 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME', 'checkpoint_bot2')
 }
 
+# Хранилище: mysql (по умолчанию) или sqlite — для тестов и замеров без MySQL
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql')
+DB_SQLITE_PATH = os.getenv('DB_SQLITE_PATH', ':memory:')  # файл базы или :memory:
+
+# Реплика для запросов только на чтение (необязательно: используется, если задан DB_REPLICA_HOST).
+# Отдельным словарём, потому что DB_CONFIG целиком передаётся в mysql.connector.connect
+DB_REPLICA_CONFIG = {
+    'host': os.getenv('DB_REPLICA_HOST', ''),
+    'user': os.getenv('DB_REPLICA_USER', DB_CONFIG['user']),
+    'password': os.getenv('DB_REPLICA_PASSWORD', DB_CONFIG['password']),
+    'database': os.getenv('DB_REPLICA_NAME', DB_CONFIG['database'])
+}
+
+# Когда читать с реплики
+DB_REPLICA_ROUTING_CONFIG = {
+    'max_lag': float(os.getenv('DB_REPLICA_MAX_LAG', '5')),                 # допустимое отставание, сек
+    'check_interval': float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '10')),  # проверка отставания, сек
+    'sticky': float(os.getenv('DB_REPLICA_STICKY', '30'))                   # после записи читать с основного, сек
+}
+
+# Параметры пула соединений с базой данных
+DB_POOL_CONFIG = {
+    'size': int(os.getenv('DB_POOL_SIZE', '5')),           # максимум открытых соединений
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),  # ожидание свободного соединения, сек
+    'recycle': int(os.getenv('DB_POOL_RECYCLE', '3600')),  # пересоздавать соединения старше, сек
+    'pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1'  # проверять соединение перед выдачей
+}
+
+# Пул потоков для запросов к БД из асинхронных обработчиков
+DB_EXECUTOR_CONFIG = {
+    'workers': int(os.getenv('DB_EXECUTOR_WORKERS', os.getenv('DB_POOL_SIZE', '5'))),  # потоков
+    'max_queue': int(os.getenv('DB_EXECUTOR_MAX_QUEUE', '50')),  # ожидающих запросов сверх потоков
+    'timeout': float(os.getenv('DB_EXECUTOR_TIMEOUT', '15'))     # ожидание результата запроса, сек
+}
+
+# Кэш профилей пользователей (роль, блокировка)
+USER_CACHE_CONFIG = {
+    'ttl': int(os.getenv('USER_CACHE_TTL', '300')),         # время жизни записи, сек (0 — без кэша)
+    'max_size': int(os.getenv('USER_CACHE_SIZE', '1000'))  # максимум пользователей в кэше
+}
+
+# Кэш заявок по номеру (get_request_full)
+REQUEST_CACHE_CONFIG = {
+    'ttl': int(os.getenv('REQUEST_CACHE_TTL', '60')),        # время жизни записи, сек (0 — без кэша)
+    'max_size': int(os.getenv('REQUEST_CACHE_SIZE', '500'))  # максимум заявок в кэше
+}
+
+# Накопление правок заявки при редактировании
+EDIT_BUFFER_CONFIG = {
+    'flush_delay': int(os.getenv('EDIT_FLUSH_DELAY', '120')),  # запись в БД после простоя, сек
+    'drafts_dir': os.getenv('EDIT_DRAFTS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'edit_drafts'))
+}
+
+# Локальный журнал заявок и смен статуса на время недоступности БД (services/journal.py)
+JOURNAL_CONFIG = {
+    'dir': os.getenv('JOURNAL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'journal')),
+    'fsync_delay': float(os.getenv('JOURNAL_FSYNC_DELAY', '0.05')),       # сбор записей в один fsync, сек
+    'replay_interval': float(os.getenv('JOURNAL_REPLAY_INTERVAL', '30'))  # попытки перенести журнал в БД, сек
+}
+
+# Фоновая отправка уведомлений из очереди outbox
+OUTBOX_CONFIG = {
+    'poll_interval': float(os.getenv('OUTBOX_POLL_INTERVAL', '5')),  # проверка очереди, сек
+    'batch_size': int(os.getenv('OUTBOX_BATCH_SIZE', '50')),         # уведомлений за одну выборку
+    'concurrency': int(os.getenv('OUTBOX_CONCURRENCY', '10')),       # одновременных отправок
+    'max_attempts': int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8')),      # попыток до статуса failed
+    'retry_delay': float(os.getenv('OUTBOX_RETRY_DELAY', '5')),      # первая пауза перед повтором, сек (далее x2)
+    'keep_days': int(os.getenv('OUTBOX_KEEP_DAYS', '7'))             # хранить отправленные, дней
+}
+
+# Перенос закрытых заявок в архив (services/archiver.py)
+ARCHIVE_CONFIG = {
+    'after_months': int(os.getenv('ARCHIVE_AFTER_MONTHS', '0')),     # старше скольких месяцев (0 — не переносить)
+    'batch_size': int(os.getenv('ARCHIVE_BATCH_SIZE', '500')),       # заявок за одну транзакцию
+    'pause': float(os.getenv('ARCHIVE_PAUSE', '0.5')),               # пауза между пачками, сек
+    'interval_hours': float(os.getenv('ARCHIVE_INTERVAL_HOURS', '24'))  # как часто запускать перенос
+}
+
 # Токен Telegram-бота и ID чата администратора
 TOKEN = os.getenv('TOKEN')
 ADMIN_CHAT_ID = os.getenv('ADMIN_CHAT_ID')
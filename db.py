@@ -1,20 +1,269 @@
 ﻿# db.py
+import contextvars
 import logging
-import mysql.connector
+import threading
 from mysql.connector import Error
-from config import DB_CONFIG, ROLE_USER, ROLE_ADMIN, ROLE_OPERATOR
+from config import (
+    DB_CONFIG, DB_POOL_CONFIG, DB_REPLICA_CONFIG, DB_REPLICA_ROUTING_CONFIG, DB_BACKEND, DB_SQLITE_PATH,
+    USER_CACHE_CONFIG, ROLE_USER, ROLE_ADMIN, ROLE_OPERATOR
+)
+from db_pool import ConnectionPool
+from db_replica import ReplicaRouter, is_connection_error
+from cache import TTLCache
 
 logger = logging.getLogger('db')
 
+_pool = None
+_pool_lock = threading.Lock()
+_replica = None
+
+# Пользователь Telegram, от имени которого выполняются запросы (выставляется
+# в main.py для каждого апдейта). Нужен, чтобы после записи пользователь
+# читал с основного сервера, а не с отстающей реплики.
+current_actor = contextvars.ContextVar('db_actor', default=None)
+
+
+# Сброс кэшей других модулей при смене хранилища (Database.set_pool)
+_pool_listeners = []
+
+
+def on_pool_change(listener):
+    _pool_listeners.append(listener)
+    return listener
+
+
+def _remember_write():
+    if _replica is not None:
+        _replica.remember_write(current_actor.get())
+
+# Профили пользователей: проверка блокировки идёт на каждом шаге диалога
+_user_cache = TTLCache(**USER_CACHE_CONFIG)
+
+
+# Версия справочника операторов: увеличивается при любом изменении ролей,
+# по ней services.operator_directory понимает, что список нужно перечитать
+_operators_version = 0
+_operators_version_lock = threading.Lock()
+
+
+def _bump_operators_version():
+    global _operators_version
+    with _operators_version_lock:
+        _operators_version += 1
+
+
+def _user_key(user_id):
+    # Администратор вводит ID текстом, обработчики передают int — ключ должен совпадать
+    return str(user_id).strip()
+
+
+# Реестр именованных запросов, которые выполняются как серверные prepared statements.
+# Запрос готовится один раз на соединение пула и дальше только выполняется.
+_statements = {}       # имя -> sql
+_statement_stats = {}  # имя -> {'prepares': n, 'executions': n}
+_statements_lock = threading.Lock()
+
+
+def register_statement(name, sql):
+    """Добавить запрос в реестр (при импорте модуля, который его выполняет)."""
+    with _statements_lock:
+        _statements[name] = sql
+        _statement_stats.setdefault(name, {'prepares': 0, 'executions': 0})
+    return name
+
+
+def _row_value(value):
+    # Бинарный протокол prepared statements отдаёт строки как bytearray
+    return value.decode('utf-8') if isinstance(value, (bytes, bytearray)) else value
+
+
+USER_INFO_STATEMENT = register_statement(
+    'user_info',
+    "SELECT user_id, username, full_name, role, blocked FROM users WHERE user_id = %s"
+)
+
 class Database:
+    @staticmethod
+    def get_pool():
+        """
+        Пул соединений создаётся лениво при первом обращении к БД.
+        DB_BACKEND=sqlite — хранилище SQLite (db_sqlite) вместо MySQL, без реплики.
+        """
+        global _pool, _replica
+        if _pool is None:
+            with _pool_lock:
+                if _pool is None:
+                    if DB_BACKEND == 'sqlite':
+                        from db_sqlite import SQLitePool
+                        _pool = SQLitePool(DB_SQLITE_PATH, on_commit=_remember_write, **DB_POOL_CONFIG)
+                    else:
+                        if DB_REPLICA_CONFIG['host']:
+                            _replica = ReplicaRouter(DB_REPLICA_CONFIG, DB_POOL_CONFIG, **DB_REPLICA_ROUTING_CONFIG)
+                        _pool = ConnectionPool(DB_CONFIG, on_commit=_remember_write, **DB_POOL_CONFIG)
+        return _pool
+
+    @staticmethod
+    def set_pool(pool):
+        """
+        Подменить хранилище (например, SQLitePool(':memory:') в тестах и замерах).
+        Реплика отключается, кэши профилей и заявок сбрасываются.
+        """
+        global _pool, _replica
+        with _pool_lock:
+            _pool, _replica = pool, None
+            if pool is not None and pool.on_commit is None:
+                pool.on_commit = _remember_write
+        _user_cache.clear()
+        for listener in _pool_listeners:
+            listener()
+
+    @staticmethod
+    def get_dialect():
+        """'mysql' или 'sqlite' — для запросов, которые в SQLite пишутся иначе."""
+        return Database.get_pool().dialect
+
     @staticmethod
     def get_connection():
+        """
+        Выдаёт соединение из пула. conn.close() возвращает его в пул.
+        При недоступности БД или исчерпании пула возвращает None.
+        """
         try:
-            return mysql.connector.connect(**DB_CONFIG)
+            return Database.get_pool().acquire()
         except Error as e:
             logger.error(f"Ошибка подключения к MySQL: {e}")
             return None
 
+    @staticmethod
+    def get_read_connection():
+        """
+        Соединение для запросов только на чтение (ленты, поиск, списки, выгрузки).
+        Выдаётся с реплики, если она настроена, доступна и не отстаёт;
+        если текущий пользователь недавно писал в БД — с основного сервера.
+        Записывать через это соединение нельзя. Возвращает None, как get_connection().
+        """
+        Database.get_pool()
+        if _replica is not None:
+            conn = _replica.acquire(current_actor.get())
+            if conn is not None:
+                return conn
+        return Database.get_connection()
+
+    @staticmethod
+    def run_read(func, *args):
+        """
+        Выполнить func(conn, *args) на соединении для чтения (get_read_connection)
+        и вернуть результат; соединение закрывается здесь.
+        Если связь с репликой оборвалась посреди запроса, реплика считается
+        недоступной до следующей проверки, а func повторяется на основном сервере.
+        Ошибки БД пробрасываются вызывающему.
+        """
+        conn = Database.get_read_connection()
+        if not conn:
+            raise Error("Нет соединения с БД")
+        try:
+            try:
+                return func(conn, *args)
+            except Error as e:
+                replica = _replica
+                if replica is None or not replica.owns(conn) or not is_connection_error(e):
+                    raise
+                logger.warning(f"Реплика БД не ответила, запрос повторяется на основном сервере: {e}")
+                replica.mark_down()
+                conn.discard()
+            conn = Database.get_connection()
+            if not conn:
+                raise Error("Нет соединения с БД")
+            return func(conn, *args)
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+
+    @staticmethod
+    def get_pool_stats():
+        return Database.get_pool().stats()
+
+    @staticmethod
+    def get_replica_stats():
+        """Состояние реплики и счётчики чтений или None, если реплика не настроена."""
+        Database.get_pool()
+        return _replica.stats() if _replica is not None else None
+
+    @staticmethod
+    def get_user_cache_stats():
+        return _user_cache.stats()
+
+    @staticmethod
+    def execute_statement(conn, name, params=()):
+        """
+        Выполнить запрос name из реестра на соединении conn.
+        Для SELECT возвращает список строк (dict), для остальных — число изменённых строк.
+        Ошибки БД пробрасываются вызывающему, как у обычного cursor.execute.
+        """
+        sql = _statements[name]
+        cursor, reused = conn.prepared_cursor(name, sql)
+        try:
+            cursor.execute(sql, params)
+            if cursor.description:
+                columns = cursor.column_names
+                result = [
+                    {column: _row_value(value) for column, value in zip(columns, row)}
+                    for row in cursor.fetchall()
+                ]
+            else:
+                result = cursor.rowcount
+        except Error:
+            conn.forget_prepared(name)
+            raise
+        with _statements_lock:
+            counters = _statement_stats[name]
+            counters['executions'] += 1
+            if not reused:
+                counters['prepares'] += 1
+        return result
+
+    @staticmethod
+    def stream_rows(query, params=(), batch_size=500):
+        """
+        Большая выборка пачками без загрузки результата в память целиком.
+        Генератор списков dict по batch_size строк из небуферизованного курсора.
+        Соединение занято, пока генератор не исчерпан или не закрыт, поэтому
+        читать результат нужно сразу, в одном потоке и без долгих пауз:
+        сервер обрывает отдачу, если клиент не читает дольше net_write_timeout.
+        Ошибки БД пробрасываются вызывающему.
+        """
+        conn = Database.get_read_connection()
+        if not conn:
+            raise Error("Нет соединения с БД")
+        finished = False
+        try:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+            cursor.close()
+            finished = True
+        finally:
+            if finished:
+                conn.close()
+            else:
+                # Недочитанный результат не даст выполнить на соединении
+                # следующий запрос — такое соединение в пул не возвращаем
+                conn.discard()
+
+    @staticmethod
+    def get_statement_stats():
+        """Счётчики prepared statements: сколько раз запрос готовился и выполнялся."""
+        with _statements_lock:
+            return {name: dict(counters) for name, counters in _statement_stats.items()}
+
+    @staticmethod
+    def get_operators_version():
+        return _operators_version
+
     @staticmethod
     def check_connection():
         conn = Database.get_connection()
@@ -23,8 +272,31 @@ class Database:
             return True
         return False
 
+    @staticmethod
+    def ping():
+        """
+        True, если БД отвечает на SELECT 1. Отличает недоступность БД (нет соединения,
+        оборван сокет) от ошибок самих запросов (блокировки, ограничения, данные).
+        """
+        conn = Database.get_connection()
+        if not conn:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            return True
+        except Exception as e:
+            logger.error(f"БД не отвечает: {e}")
+            return False
+        finally:
+            conn.close()
+
     @staticmethod
     def create_tables():
+        if Database.get_dialect() == 'sqlite':
+            # Схема SQLite создаётся вместе с хранилищем (db_sqlite.SCHEMA)
+            return Database.get_pool().create_schema()
         try:
             conn = Database.get_connection()
             if not conn:
@@ -45,22 +317,68 @@ class Database:
                         division VARCHAR(255),
                         direction VARCHAR(50),
                         checkpoint VARCHAR(100),
-                        date_start VARCHAR(50),
-                        date_end VARCHAR(50),
-                        time_start VARCHAR(5),
-                        time_end VARCHAR(5),
+                        date_start DATE,
+                        date_end DATE,
+                        time_start TIME,
+                        time_end TIME,
                         car_brand VARCHAR(255),
                         people_count INT,
                         leader_name VARCHAR(255),
+                        leader_name_norm VARCHAR(255) AS (LOWER(TRIM(leader_name))) STORED,
                         cargo TEXT,
                         purpose TEXT,
                         status VARCHAR(32) NOT NULL DEFAULT 'Новая',
                         edited_fields TEXT,
                         operator_id BIGINT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        version INT NOT NULL DEFAULT 0,
+                        journal_key CHAR(36) NULL,
+                        form_type VARCHAR(16) NOT NULL DEFAULT 'template',
+                        UNIQUE INDEX uq_requests_journal_key (journal_key),
+                        INDEX idx_requests_form_created (form_type, created_at)
                     )
                 """
                 )
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS outbox (
+                        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                        kind VARCHAR(32) NOT NULL,
+                        chat_id BIGINT NOT NULL,
+                        payload TEXT NOT NULL,
+                        status VARCHAR(16) NOT NULL DEFAULT 'pending',
+                        attempts INT NOT NULL DEFAULT 0,
+                        next_attempt_at DATETIME NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        sent_at DATETIME NULL,
+                        last_error TEXT,
+                        INDEX idx_outbox_due (status, next_attempt_at)
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS request_events (
+                        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                        request_id INT NOT NULL,
+                        from_status VARCHAR(32) NULL,
+                        to_status VARCHAR(32) NOT NULL,
+                        actor BIGINT NULL,
+                        changed_fields VARCHAR(255) NULL,
+                        ts DATETIME NOT NULL,
+                        INDEX idx_request_events_request (request_id, id),
+                        INDEX idx_request_events_ts (ts, to_status)
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS request_daily_stats (
+                        stat_date DATE NOT NULL,
+                        checkpoint VARCHAR(255) NOT NULL DEFAULT '',
+                        direction VARCHAR(255) NOT NULL DEFAULT '',
+                        status VARCHAR(32) NOT NULL,
+                        request_count INT NOT NULL DEFAULT 0,
+                        people_sum INT NOT NULL DEFAULT 0,
+                        PRIMARY KEY (stat_date, checkpoint, direction, status)
+                    )
+                """)
                 conn.commit()
                 return True
         except Error as e:
@@ -72,21 +390,8 @@ class Database:
 
     @staticmethod
     def get_user_role(user_id):
-        conn = None
-        try:
-            conn = Database.get_connection()
-            if not conn:
-                return 'user'
-            with conn.cursor(dictionary=True) as cursor:
-                cursor.execute("SELECT role FROM users WHERE user_id = %s", (user_id,))
-                row = cursor.fetchone()
-                return row['role'] if row else 'user'
-        except Error as e:
-            logger.error(f"Ошибка при получении роли пользователя: {e}")
-            return 'user'
-        finally:
-            if conn and conn.is_connected():
-                conn.close()
+        # Роль берётся из профиля, чтобы оба вызова обслуживались одним кэшем
+        return Database.get_user_info(user_id)['role']
 
     @staticmethod
     def set_user(user_id, username, full_name, role='user'):
@@ -96,12 +401,21 @@ class Database:
             if not conn:
                 return False
             with conn.cursor() as cursor:
+                cursor.execute("SELECT role FROM users WHERE user_id = %s FOR UPDATE", (user_id,))
+                row = cursor.fetchone()
+                old_role = row[0] if row else None
                 cursor.execute('''
                     INSERT INTO users (user_id, username, full_name, role)
                     VALUES (%s, %s, %s, %s)
                     ON DUPLICATE KEY UPDATE username=VALUES(username), full_name=VALUES(full_name), role=VALUES(role)
                 ''', (user_id, username, full_name, role))
                 conn.commit()
+                _user_cache.invalidate(_user_key(user_id))
+                # /start вызывает set_user на каждый вход с текущей ролью,
+                # справочник операторов сбрасываем только если затронут оператор
+                # (назначен или снят с роли)
+                if ROLE_OPERATOR in (old_role, role):
+                    _bump_operators_version()
                 return True
         except Error as e:
             logger.error(f"Ошибка при добавлении/обновлении пользователя: {e}")
@@ -112,25 +426,34 @@ class Database:
 
     @staticmethod
     def get_user_info(user_id):
+        """
+        Профиль пользователя (id, username, role, blocked).
+        Успешно прочитанные профили кэшируются, изменения через
+        set_user/block_user/unblock_user/set_user_role сбрасывают запись сразу.
+        """
+        cached = _user_cache.get(_user_key(user_id))
+        if cached is not None:
+            return dict(cached)
+        token = _user_cache.token()
         conn = None
         try:
             conn = Database.get_connection()
             if not conn:
                 return {'id': user_id, 'username': '', 'role': ROLE_USER, 'blocked': False}
-            with conn.cursor(dictionary=True) as cursor:
-                cursor.execute(
-                    "SELECT user_id, username, role, blocked FROM users WHERE user_id = %s",
-                    (user_id,)
-                )
-                row = cursor.fetchone()
-                if row:
-                    return {
-                        'id': row['user_id'],
-                        'username': row['username'],
-                        'role': row['role'],
-                        'blocked': bool(row['blocked'])
-                    }
-                return {'id': user_id, 'username': '', 'role': ROLE_USER, 'blocked': False}
+            rows = Database.execute_statement(conn, USER_INFO_STATEMENT, (user_id,))
+            if rows:
+                row = rows[0]
+                info = {
+                    'id': row['user_id'],
+                    'username': row['username'],
+                    'full_name': row['full_name'],
+                    'role': row['role'],
+                    'blocked': bool(row['blocked'])
+                }
+            else:
+                info = {'id': user_id, 'username': '', 'role': ROLE_USER, 'blocked': False}
+            _user_cache.set(_user_key(user_id), info, token)
+            return dict(info)
         except Error as e:
             logger.error(f"Ошибка при получении информации о пользователе: {e}")
             return {'id': user_id, 'username': '', 'role': ROLE_USER, 'blocked': False}
@@ -138,6 +461,53 @@ class Database:
             if conn and conn.is_connected():
                 conn.close()
 
+    @staticmethod
+    def register_or_touch_user(user_id, username, full_name):
+        """
+        Регистрация пользователя при /start.
+        Новый пользователь добавляется с ролью user, у существующего обновляются
+        только username и full_name, роль не меняется. Если имя не изменилось
+        с момента кэширования профиля, запрос к БД не выполняется.
+        Возвращает профиль как get_user_info (role, blocked).
+        """
+        key = _user_key(user_id)
+        cached = _user_cache.get(key)
+        if cached is not None and cached.get('username') == username and cached.get('full_name') == full_name:
+            return dict(cached)
+        token = _user_cache.token()
+        conn = None
+        try:
+            conn = Database.get_connection()
+            if not conn:
+                return {'id': user_id, 'username': username, 'role': ROLE_USER, 'blocked': False}
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute('''
+                    INSERT INTO users (user_id, username, full_name, role)
+                    VALUES (%s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE username=VALUES(username), full_name=VALUES(full_name)
+                ''', (user_id, username, full_name, ROLE_USER))
+                cursor.execute("SELECT role, blocked FROM users WHERE user_id = %s", (user_id,))
+                row = cursor.fetchone()
+                conn.commit()
+            info = {
+                'id': user_id,
+                'username': username,
+                'full_name': full_name,
+                'role': row['role'] if row else ROLE_USER,
+                'blocked': bool(row['blocked']) if row else False
+            }
+            _user_cache.set(key, info, token)
+            if info['role'] == ROLE_OPERATOR:
+                # Подписи кнопок выбора оператора строятся по имени
+                _bump_operators_version()
+            return dict(info)
+        except Error as e:
+            logger.error(f"Ошибка при регистрации пользователя: {e}")
+            return {'id': user_id, 'username': username, 'role': ROLE_USER, 'blocked': False}
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+
     @staticmethod
     def block_user(user_id):
         conn = None
@@ -148,6 +518,7 @@ class Database:
             with conn.cursor() as cursor:
                 cursor.execute('UPDATE users SET blocked = 1 WHERE user_id = %s', (user_id,))
                 conn.commit()
+                _user_cache.invalidate(_user_key(user_id))
                 return True
         except Error as e:
             logger.error(f"Ошибка при блокировке пользователя: {e}")
@@ -166,6 +537,7 @@ class Database:
             with conn.cursor() as cursor:
                 cursor.execute('UPDATE users SET blocked = 0 WHERE user_id = %s', (user_id,))
                 conn.commit()
+                _user_cache.invalidate(_user_key(user_id))
                 return True
         except Error as e:
             logger.error(f"Ошибка при разблокировке пользователя: {e}")
@@ -184,6 +556,8 @@ class Database:
             with conn.cursor() as cursor:
                 cursor.execute('UPDATE users SET role = %s WHERE user_id = %s', (role, user_id))
                 conn.commit()
+                _user_cache.invalidate(_user_key(user_id))
+                _bump_operators_version()
                 return True
         except Error as e:
             logger.error(f"Ошибка при изменении роли пользователя: {e}")
@@ -200,8 +574,7 @@ class Database:
         """
         conn = None
         try:
-            # Принудительно создаем новое соединение
-            conn = mysql.connector.connect(**DB_CONFIG)
+            conn = Database.get_connection()
             if not conn:
                 logger.info("[get_operators] Нет соединения с БД.")
                 return []
@@ -210,7 +583,7 @@ class Database:
                 operators = cursor.fetchall()
                 logger.info(f"[get_operators] Найдено операторов: {len(operators)}")
                 for op in operators:
-                    logger.info(f"[get_operators] Оператор: {op['user_id']} - "
+                    logger.debug(f"[get_operators] Оператор: {op['user_id']} - "
                                f"{op['full_name']} (@{op['username']})")
                 return operators
         except Error as e:
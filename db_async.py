@@ -0,0 +1,64 @@
+# db_async.py
+# Асинхронный интерфейс к Database для обработчиков бота.
+# Запросы к MySQL выполняются вне цикла событий, поэтому медленный запрос
+# одного пользователя не останавливает обработку сообщений остальных.
+
+import threading
+from config import DB_EXECUTOR_CONFIG
+from db import Database
+from db_executor import DbExecutor
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor():
+    """Пул потоков для запросов к БД создаётся лениво при первом вызове."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = DbExecutor(**DB_EXECUTOR_CONFIG)
+    return _executor
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    Выполнить синхронную функцию работы с БД в выделенном пуле потоков,
+    не блокируя цикл событий. Ограничения очереди и таймаут — см. DbExecutor.
+    """
+    return await get_db_executor().run(func, *args, **kwargs)
+
+
+class AsyncDatabase:
+    @staticmethod
+    async def get_user_role(user_id):
+        return await run_sync(Database.get_user_role, user_id)
+
+    @staticmethod
+    async def set_user(user_id, username, full_name, role='user'):
+        return await run_sync(Database.set_user, user_id, username, full_name, role)
+
+    @staticmethod
+    async def register_or_touch_user(user_id, username, full_name):
+        return await run_sync(Database.register_or_touch_user, user_id, username, full_name)
+
+    @staticmethod
+    async def get_user_info(user_id):
+        return await run_sync(Database.get_user_info, user_id)
+
+    @staticmethod
+    async def block_user(user_id):
+        return await run_sync(Database.block_user, user_id)
+
+    @staticmethod
+    async def unblock_user(user_id):
+        return await run_sync(Database.unblock_user, user_id)
+
+    @staticmethod
+    async def set_user_role(user_id, role):
+        return await run_sync(Database.set_user_role, user_id, role)
+
+    @staticmethod
+    async def get_operators():
+        return await run_sync(Database.get_operators)
@@ -0,0 +1,103 @@
+# db_executor.py
+# Выделенный пул потоков для запросов к БД из асинхронных обработчиков.
+# Ограничивает число одновременных и ожидающих запросов и время ожидания
+# ответа, чтобы медленная MySQL не накапливала бесконечную очередь задач.
+
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('db')
+
+
+class DbOverloadError(Exception):
+    """Очередь запросов к БД переполнена, новый запрос отклонён."""
+
+
+class DbExecutor:
+    """
+    workers: число потоков (имеет смысл держать равным размеру пула соединений)
+    max_queue: сколько запросов может ждать свободного потока
+    timeout: сколько секунд обработчик ждёт результата запроса
+    """
+
+    def __init__(self, workers=5, max_queue=50, timeout=15):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db')
+        self._lock = threading.Lock()
+        self._pending = 0  # отправлено в пул и ещё не завершено
+        self._active = 0   # выполняется прямо сейчас
+        self._peak_pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+
+    def _call(self, submitted_at, func, args, kwargs):
+        with self._lock:
+            self._active += 1
+            self._wait_total += time.monotonic() - submitted_at
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._pending -= 1
+                self._completed += 1
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Выполнить func в пуле потоков. Бросает DbOverloadError, если очередь
+        заполнена, и asyncio.TimeoutError, если ответ не получен за timeout секунд.
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self._rejected += 1
+                raise DbOverloadError(f"Очередь запросов к БД переполнена ({self._pending})")
+            self._pending += 1
+            self._peak_pending = max(self._peak_pending, self._pending)
+        loop = asyncio.get_running_loop()
+        # Контекст обработчика (например, db.current_actor) переносится в поток
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, self._call, time.monotonic(), func, args, kwargs)
+        try:
+            future = loop.run_in_executor(self._executor, call)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        # shield: отмена ожидания не снимает задачу из очереди, иначе слот
+        # в _pending не освободился бы; результат опоздавшего вызова просто
+        # забирается, чтобы asyncio не ругался на невостребованное исключение
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            logger.error(f"Запрос к БД {getattr(func, '__name__', func)} не завершился за {self.timeout} сек.")
+            raise
+
+    def stats(self):
+        """Загрузка пула потоков для мониторинга."""
+        with self._lock:
+            queued = max(self._pending - self._active, 0)
+            started = self._completed + self._active
+            return {
+                'workers': self.workers,
+                'active': self._active,
+                'queued': queued,
+                'max_queue': self.max_queue,
+                'saturation': self._active / self.workers if self.workers else 0.0,
+                'peak_pending': self._peak_pending,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': (self._wait_total / started * 1000) if started else 0.0,
+            }
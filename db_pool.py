@@ -0,0 +1,241 @@
+# db_pool.py
+# Пул соединений с MySQL для Database.get_connection.
+# Соединения переиспользуются между вызовами репозиториев, проверяются ping'ом
+# при выдаче, пересоздаются по возрасту и при обрыве сокета.
+
+import logging
+import threading
+import time
+import mysql.connector
+from mysql.connector import Error
+from mysql.connector.errors import PoolError
+
+logger = logging.getLogger('db')
+
+
+class PooledConnection:
+    """
+    Обёртка над соединением из пула.
+    close() не закрывает сокет, а возвращает соединение в пул,
+    остальные атрибуты (cursor, commit, rollback...) проксируются как есть.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise Error("Соединение уже возвращено в пул")
+        return getattr(raw, name)
+
+    def __setattr__(self, name, value):
+        # Свойства соединения (например, autocommit) выставляются на самом соединении
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._raw, name, value)
+
+    def prepared_cursor(self, name, sql):
+        """
+        Курсор с серверным prepared statement для запроса name на этом соединении.
+        Курсор живёт вместе с соединением в пуле, поэтому повторное выполнение
+        того же запроса не разбирает SQL заново.
+        Возвращает (cursor, reused): reused=False, если запрос подготовлен только что.
+        """
+        return self._pool._prepared_cursor(self._raw, name, sql)
+
+    def forget_prepared(self, name):
+        """Забыть prepared statement (после ошибки выполнения он может быть невалиден)."""
+        self._pool._forget_prepared(self._raw, name)
+
+    def is_connected(self):
+        # Репозитории вызывают close() только если is_connected() == True,
+        # поэтому здесь проверяется именно «соединение ещё выдано», а не ping:
+        # иначе оборванное соединение никогда не вернулось бы в пул.
+        return self._raw is not None
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw)
+
+    def commit(self):
+        self._raw.commit()
+        if self._pool.on_commit:
+            self._pool.on_commit()
+
+    def discard(self):
+        """Закрыть соединение, не возвращая в пул (например, с недочитанным результатом)."""
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._discard(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений фиксированного размера.
+    size: максимум одновременно открытых соединений
+    timeout: сколько секунд ждать свободного соединения
+    recycle: возраст соединения (сек), после которого оно пересоздаётся
+    pre_ping: проверять соединение ping'ом перед выдачей
+    on_commit: вызывается после каждого успешного commit() выданного соединения
+    """
+
+    dialect = 'mysql'
+
+    def __init__(self, config, size=5, timeout=10, recycle=3600, pre_ping=True, on_commit=None):
+        self._config = dict(config)
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.on_commit = on_commit
+        self._idle = []  # [(raw, created_at)], последние вернувшиеся — в конце
+        self._born = {}  # id(raw) -> время создания
+        self._prepared = {}  # id(raw) -> {имя запроса: (sql, курсор)}
+        self._open = 0
+        self._waiting = 0
+        self._created = 0
+        self._recycled = 0
+        self._timeouts = 0
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        raw = mysql.connector.connect(**self._config)
+        with self._cond:
+            self._born[id(raw)] = time.monotonic()
+            self._created += 1
+        return raw
+
+    def _discard(self, raw):
+        with self._cond:
+            self._born.pop(id(raw), None)
+            self._prepared.pop(id(raw), None)
+            self._open -= 1
+            self._cond.notify()
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _is_stale(self, raw, born):
+        if self.recycle and time.monotonic() - born > self.recycle:
+            return True
+        if self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                return True
+        return False
+
+    def acquire(self):
+        """
+        Выдать соединение из пула. Если все соединения заняты, ждёт
+        не дольше timeout секунд, после чего бросает PoolError.
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw = self._idle.pop()
+                    born = self._born.get(id(raw), 0)
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    raw = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolError(f"Нет свободных соединений в пуле за {self.timeout} сек.")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+        if raw is None:
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+        elif self._is_stale(raw, born):
+            # Соединение устарело или сокет оборвался — заменяем новым
+            with self._cond:
+                self._recycled += 1
+                self._born.pop(id(raw), None)
+                self._prepared.pop(id(raw), None)
+            try:
+                raw.close()
+            except Exception:
+                pass
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+        return PooledConnection(self, raw)
+
+    def _prepared_cursor(self, raw, name, sql):
+        with self._cond:
+            statements = self._prepared.setdefault(id(raw), {})
+        # Соединение выдано одному потоку, поэтому его словарь курсоров без блокировки
+        cached = statements.get(name)
+        if cached is not None and cached[0] == sql:
+            return cached[1], True
+        cursor = raw.cursor(prepared=True)
+        statements[name] = (sql, cursor)
+        return cursor, False
+
+    def _forget_prepared(self, raw, name):
+        with self._cond:
+            statements = self._prepared.get(id(raw))
+        if statements:
+            statements.pop(name, None)
+
+    def _release(self, raw):
+        try:
+            # Завершаем незакоммиченную транзакцию, чтобы следующий
+            # пользователь соединения не увидел чужих изменений или старого снимка
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception as e:
+            logger.warning(f"Соединение из пула не удалось очистить, закрываем: {e}")
+            self._discard(raw)
+            return
+        with self._cond:
+            self._idle.append(raw)
+            self._cond.notify()
+
+    def stats(self):
+        """Текущее состояние пула для мониторинга."""
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'waiting': self._waiting,
+                'created': self._created,
+                'recycled': self._recycled,
+                'timeouts': self._timeouts,
+            }
+
+    def close_all(self):
+        """Закрыть все свободные соединения (при остановке бота)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for raw in idle:
+            self._discard(raw)
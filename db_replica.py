@@ -0,0 +1,152 @@
+# db_replica.py
+# Маршрутизация запросов только на чтение на реплику MySQL.
+# Реплика используется, только если она доступна и отстаёт от основного
+# сервера не больше max_lag секунд; пользователь, который недавно писал в БД,
+# читает с основного сервера, чтобы сразу видеть свои изменения.
+
+import logging
+import threading
+import time
+from mysql.connector import Error, errorcode
+from mysql.connector.errors import InterfaceError, OperationalError
+from db_pool import ConnectionPool
+
+logger = logging.getLogger('db')
+
+
+def _replica_status(conn):
+    """
+    Строка состояния репликации или None, если сервер не реплика.
+    SHOW REPLICA STATUS (MySQL 8.0.22+, MariaDB 10.5.1+; в MySQL 8.4 старого имени нет),
+    для более старых серверов — SHOW SLAVE STATUS.
+    """
+    try:
+        return _fetch_status(conn, "SHOW REPLICA STATUS")
+    except Error:
+        return _fetch_status(conn, "SHOW SLAVE STATUS")
+
+
+def _fetch_status(conn, statement):
+    with conn.cursor(dictionary=True) as cursor:
+        cursor.execute(statement)
+        return cursor.fetchone()
+
+
+def is_connection_error(error):
+    """Ошибка связи с сервером: обрыв соединения, таймаут чтения или запрос, прерванный по max_execution_time."""
+    return (isinstance(error, (InterfaceError, OperationalError))
+            or getattr(error, 'errno', None) == errorcode.ER_QUERY_TIMEOUT)
+
+
+class ReplicaRouter:
+    """
+    config: параметры подключения к реплике (как DB_CONFIG)
+    pool_config: параметры пула соединений (как DB_POOL_CONFIG)
+    max_lag: допустимое отставание реплики, сек
+    check_interval: как часто проверять состояние репликации, сек
+    sticky: сколько секунд после записи пользователь читает с основного сервера
+    """
+
+    def __init__(self, config, pool_config, max_lag=5, check_interval=10, sticky=30):
+        self.pool = ConnectionPool(config, **pool_config)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky = sticky
+        self._lock = threading.Lock()
+        self._healthy = False
+        self._lag = None
+        self._checked_at = None
+        self._checking = False
+        self._writers = {}  # actor -> до какого момента читать с основного сервера
+        self._reads_replica = 0
+        self._reads_sticky = 0
+        self._reads_fallback = 0
+
+    def remember_write(self, actor):
+        if actor is None or self.sticky <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._writers[actor] = now + self.sticky
+            # Чистим истёкшие отметки, чтобы словарь не рос
+            if len(self._writers) > 1000:
+                self._writers = {a: until for a, until in self._writers.items() if until > now}
+
+    def _is_sticky(self, actor):
+        if actor is None:
+            return False
+        with self._lock:
+            until = self._writers.get(actor)
+        return until is not None and until > time.monotonic()
+
+    def _check(self):
+        # Проверяет один поток; остальные пока пользуются прошлым результатом
+        with self._lock:
+            due = self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval
+            if not due or self._checking:
+                return self._healthy
+            self._checking = True
+        healthy, lag = False, None
+        conn = None
+        try:
+            conn = self.pool.acquire()
+            row = _replica_status(conn)
+            if row is None:
+                logger.warning("Реплика БД: сервер не настроен как реплика, чтение идёт с основного")
+            else:
+                lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+                healthy = lag is not None and lag <= self.max_lag
+                if not healthy:
+                    logger.warning(f"Реплика БД отстаёт или репликация остановлена (lag={lag}), чтение идёт с основного")
+        except Exception as e:
+            logger.warning(f"Реплика БД недоступна, чтение идёт с основного: {e}")
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+            with self._lock:
+                self._healthy, self._lag = healthy, lag
+                self._checked_at = time.monotonic()
+                self._checking = False
+        return healthy
+
+    def mark_down(self):
+        """Считать реплику недоступной до следующей проверки."""
+        with self._lock:
+            self._healthy = False
+            self._checked_at = time.monotonic()
+
+    def owns(self, conn):
+        """Соединение выдано пулом реплики."""
+        return getattr(conn, '_pool', None) is self.pool
+
+    def acquire(self, actor=None):
+        """
+        Соединение с реплики или None, если читать нужно с основного сервера.
+        """
+        if self._is_sticky(actor):
+            with self._lock:
+                self._reads_sticky += 1
+            return None
+        if self._check():
+            try:
+                conn = self.pool.acquire()
+                with self._lock:
+                    self._reads_replica += 1
+                return conn
+            except Error as e:
+                logger.warning(f"Нет соединения с репликой БД: {e}")
+                self.mark_down()
+        with self._lock:
+            self._reads_fallback += 1
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'healthy': self._healthy,
+                'lag': self._lag,
+                'max_lag': self.max_lag,
+                'reads_replica': self._reads_replica,
+                'reads_sticky': self._reads_sticky,
+                'reads_fallback': self._reads_fallback,
+            }
@@ -0,0 +1,392 @@
+# db_sqlite.py
+# Хранилище SQLite с тем же интерфейсом, что у пула MySQL (db_pool.ConnectionPool).
+# Нужно для тестов и замеров производительности без MySQL: DB_BACKEND=sqlite.
+# Запросы репозиториев пишутся для MySQL; здесь они переводятся в диалект SQLite
+# (плейсхолдеры %s, ON DUPLICATE KEY UPDATE, FOR UPDATE), ошибки SQLite
+# пробрасываются как mysql.connector.Error, чтобы обработка ошибок не менялась.
+
+import functools
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, time as dtime
+from mysql.connector import Error
+from mysql.connector.errors import PoolError
+
+# Схема повторяет MySQL после миграций (см. Database.create_tables и migrations/)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    username VARCHAR(255),
+    full_name VARCHAR(255),
+    role VARCHAR(50) DEFAULT 'user',
+    blocked TINYINT DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_users_role ON users (role);
+
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id BIGINT NOT NULL,
+    division VARCHAR(255),
+    direction VARCHAR(255),
+    checkpoint VARCHAR(255),
+    date_start DATE,
+    date_end DATE,
+    time_start TIME,
+    time_end TIME,
+    car_brand VARCHAR(255),
+    people_count INT,
+    leader_name VARCHAR(255),
+    leader_name_norm VARCHAR(255) AS (LOWER(TRIM(leader_name))) STORED,
+    cargo TEXT,
+    purpose TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    status VARCHAR(32) NOT NULL DEFAULT 'Новая',
+    edited_fields TEXT,
+    reason TEXT,
+    operator_id BIGINT,
+    version INT NOT NULL DEFAULT 0,
+    journal_key CHAR(36),
+    form_type VARCHAR(16) NOT NULL DEFAULT 'template'
+);
+CREATE INDEX IF NOT EXISTS idx_requests_date_start ON requests (date_start);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_requests_journal_key ON requests (journal_key);
+CREATE INDEX IF NOT EXISTS idx_requests_status_created ON requests (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_requests_user_id ON requests (user_id);
+CREATE INDEX IF NOT EXISTS idx_requests_operator_id ON requests (operator_id);
+CREATE INDEX IF NOT EXISTS idx_requests_leader_norm ON requests (leader_name_norm);
+CREATE INDEX IF NOT EXISTS idx_requests_form_created ON requests (form_type, created_at);
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind VARCHAR(32) NOT NULL,
+    chat_id BIGINT NOT NULL,
+    payload TEXT NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at DATETIME,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+
+CREATE TABLE IF NOT EXISTS request_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    request_id INT NOT NULL,
+    from_status VARCHAR(32),
+    to_status VARCHAR(32) NOT NULL,
+    actor BIGINT,
+    changed_fields VARCHAR(255),
+    ts DATETIME NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_request_events_request ON request_events (request_id, id);
+CREATE INDEX IF NOT EXISTS idx_request_events_ts ON request_events (ts, to_status);
+
+-- В MySQL архив секционирован по месяцам (migrations/0007_requests_archive.py)
+CREATE TABLE IF NOT EXISTS requests_archive (
+    id INT NOT NULL,
+    user_id BIGINT NOT NULL,
+    division VARCHAR(255),
+    direction VARCHAR(255),
+    checkpoint VARCHAR(255),
+    date_start DATE,
+    date_end DATE,
+    time_start TIME,
+    time_end TIME,
+    car_brand VARCHAR(255),
+    people_count INT,
+    leader_name VARCHAR(255),
+    cargo TEXT,
+    purpose TEXT,
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP,
+    status VARCHAR(32) NOT NULL,
+    edited_fields TEXT,
+    reason TEXT,
+    operator_id BIGINT,
+    version INT NOT NULL DEFAULT 0,
+    form_type VARCHAR(16) NOT NULL DEFAULT 'template',
+    archived_at DATETIME NOT NULL,
+    PRIMARY KEY (id, created_at)
+);
+CREATE INDEX IF NOT EXISTS idx_requests_archive_user_id ON requests_archive (user_id);
+
+CREATE TABLE IF NOT EXISTS request_daily_stats (
+    stat_date DATE NOT NULL,
+    checkpoint VARCHAR(255) NOT NULL DEFAULT '',
+    direction VARCHAR(255) NOT NULL DEFAULT '',
+    status VARCHAR(32) NOT NULL,
+    request_count INT NOT NULL DEFAULT 0,
+    people_sum INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (stat_date, checkpoint, direction, status)
+);
+
+-- updated_at в MySQL обновляется через ON UPDATE CURRENT_TIMESTAMP
+CREATE TRIGGER IF NOT EXISTS trg_requests_updated_at AFTER UPDATE ON requests
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE requests SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+"""
+
+
+def _format_timedelta(value):
+    seconds = int(value.total_seconds())
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _parse_time(raw):
+    # MySQL отдаёт TIME как timedelta — так же и здесь
+    parts = raw.decode().split(':')
+    hours, minutes = int(parts[0]), int(parts[1])
+    seconds = float(parts[2]) if len(parts) > 2 else 0
+    return timedelta(hours=hours, minutes=minutes, seconds=seconds)
+
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(dtime, dtime.isoformat)
+sqlite3.register_adapter(timedelta, _format_timedelta)
+sqlite3.register_converter('DATE', lambda raw: date.fromisoformat(raw.decode()))
+sqlite3.register_converter('TIME', _parse_time)
+sqlite3.register_converter('TIMESTAMP', lambda raw: datetime.fromisoformat(raw.decode()))
+sqlite3.register_converter('DATETIME', lambda raw: datetime.fromisoformat(raw.decode()))
+
+
+@functools.lru_cache(maxsize=512)
+def translate(sql):
+    """Запрос в диалекте MySQL -> SQLite (только конструкции, которые используют репозитории)."""
+    sql = sql.replace('%s', '?')
+    sql = re.sub(r'\s+FOR\s+UPDATE\b', '', sql, flags=re.IGNORECASE)
+    upsert = re.search(r'ON\s+DUPLICATE\s+KEY\s+UPDATE', sql, flags=re.IGNORECASE)
+    if upsert:
+        tail = re.sub(r'VALUES\((\w+)\)', r'excluded.\1', sql[upsert.end():])
+        sql = sql[:upsert.start()] + 'ON CONFLICT DO UPDATE SET' + tail
+    return sql
+
+
+def _lower(value):
+    # Встроенный LOWER в SQLite меняет регистр только у латиницы
+    return value.lower() if isinstance(value, str) else value
+
+
+class SQLiteCursor:
+    """Курсор с интерфейсом mysql.connector: dictionary=True, column_names, контекстный менеджер."""
+
+    def __init__(self, raw, dictionary=False):
+        self._cursor = raw.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, operation, params=()):
+        try:
+            self._cursor.execute(translate(operation), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise Error(f"SQLite: {e}") from e
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def column_names(self):
+        return tuple(column[0] for column in self._cursor.description or ())
+
+    @property
+    def with_rows(self):
+        return self._cursor.description is not None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SQLiteConnection:
+    """Соединение из SQLitePool с тем же набором методов, что db_pool.PooledConnection."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def cursor(self, dictionary=False, buffered=None, prepared=False):
+        if self._raw is None:
+            raise Error("Соединение уже возвращено в пул")
+        return SQLiteCursor(self._raw, dictionary)
+
+    def prepared_cursor(self, name, sql):
+        # SQLite сам кэширует разобранные запросы на соединении (cached_statements)
+        statements = self._pool._prepared.setdefault(id(self._raw), set())
+        reused = name in statements
+        statements.add(name)
+        return self.cursor(), reused
+
+    def forget_prepared(self, name):
+        self._pool._prepared.get(id(self._raw), set()).discard(name)
+
+    def commit(self):
+        try:
+            self._raw.commit()
+        except sqlite3.Error as e:
+            raise Error(f"SQLite: {e}") from e
+        if self._pool.on_commit:
+            self._pool.on_commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def is_connected(self):
+        return self._raw is not None
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw)
+
+    def discard(self):
+        # Соединение SQLite не держит недочитанный результат на сервере — просто возвращаем
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SQLitePool:
+    """
+    Пул соединений SQLite с интерфейсом db_pool.ConnectionPool.
+    path: файл базы или ':memory:' (тогда одно соединение на весь процесс,
+    иначе у каждого соединения была бы своя пустая база)
+    size, timeout: как у ConnectionPool
+    Схема создаётся при первом подключении.
+    """
+
+    dialect = 'sqlite'
+
+    def __init__(self, path=':memory:', size=5, timeout=10, on_commit=None, **_):
+        self.path = path
+        self.size = 1 if path == ':memory:' else size
+        self.timeout = timeout
+        self.on_commit = on_commit
+        self._idle = []
+        self._prepared = {}
+        self._open = 0
+        self._waiting = 0
+        self._created = 0
+        self._timeouts = 0
+        self._cond = threading.Condition()
+        self._schema_ready = False
+
+    def _connect(self):
+        raw = sqlite3.connect(
+            self.path, timeout=self.timeout, check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        raw.create_function('LOWER', 1, _lower, deterministic=True)
+        if self.path != ':memory:':
+            raw.execute('PRAGMA journal_mode=WAL')
+        if not self._schema_ready:
+            raw.executescript(SCHEMA)
+            self._schema_ready = True
+        with self._cond:
+            self._created += 1
+        return raw
+
+    def create_schema(self):
+        conn = self.acquire()
+        try:
+            conn._raw.executescript(SCHEMA)
+            return True
+        finally:
+            conn.close()
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    return SQLiteConnection(self, self._idle.pop())
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolError(f"Нет свободных соединений в пуле за {self.timeout} сек.")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+        try:
+            return SQLiteConnection(self, self._connect())
+        except sqlite3.Error as e:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise Error(f"SQLite: {e}") from e
+
+    def _release(self, raw):
+        if raw.in_transaction:
+            raw.rollback()
+        with self._cond:
+            self._idle.append(raw)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'waiting': self._waiting,
+                'created': self._created,
+                'recycled': 0,
+                'timeouts': self._timeouts,
+            }
+
+    def close_all(self):
+        # База в памяти живёт, пока открыто её соединение, поэтому его не закрываем
+        if self.path == ':memory:':
+            return
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for raw in idle:
+            raw.close()
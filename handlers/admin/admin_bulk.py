@@ -0,0 +1,183 @@
+# handlers/admin/admin_bulk.py
+# Массовая обработка заявок администратором (/bulk):
+# отметить несколько заявок на рассмотрении и назначить их оператору
+# или отменить одним действием. Заявки меняются одной транзакцией
+# (bulk_assign_operator / bulk_update_status) вместе с уведомлениями в очереди outbox.
+
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, CallbackQueryHandler, MessageHandler, filters
+from config import ADMIN_CHAT_ID
+from keyboards.admin.menu import get_bulk_requests_keyboard, get_bulk_operator_keyboard
+from repositories.async_request_repo import (
+    get_pending_requests, bulk_assign_operator, bulk_update_status,
+    STATUS_NEW, STATUS_EDITED, STATUS_DUPLICATED, STATUS_IN_PROGRESS, STATUS_CANCELLED,
+    PENDING_STATUSES, BULK_UPDATED, BULK_SKIPPED, BULK_NOT_FOUND, BULK_FAILED
+)
+from repositories import outbox_repo
+from services import operator_directory, notifier
+
+logger = logging.getLogger(__name__)
+
+BULK_SELECT = 110
+BULK_REASON = 111
+
+BULK_PAGE_SIZE = 20
+
+# Назначение оператора: новая заявка переходит в работу,
+# отредактированная и продублированная сохраняют статус (как при назначении по одной)
+ASSIGN_TRANSITIONS = {
+    STATUS_NEW: STATUS_IN_PROGRESS,
+    STATUS_EDITED: STATUS_EDITED,
+    STATUS_DUPLICATED: STATUS_DUPLICATED,
+}
+
+ASSIGN_USER_MESSAGES = {
+    STATUS_NEW: "Ваша заявка #{id} принята в работу оператором.",
+    STATUS_EDITED: "Ваша заявка #{id} передана оператору.",
+    STATUS_DUPLICATED: "Ваша заявка #{id} продублирована оператору.",
+}
+
+
+def _selected_ids(context):
+    pending = context.user_data.get('bulk_pending', {})
+    return [request_id for request_id in pending if request_id in context.user_data.get('bulk_selected', set())]
+
+
+def _list_text(context):
+    pending = context.user_data.get('bulk_pending', {})
+    return (
+        f"📋 Заявки на рассмотрении: {len(pending)}\n"
+        f"Отмечено: {len(_selected_ids(context))}\n\n"
+        "Отметьте заявки и выберите действие."
+    )
+
+
+def _summary(outcomes, done_label):
+    counts = {}
+    for outcome in outcomes.values():
+        counts[outcome] = counts.get(outcome, 0) + 1
+    lines = [f"✅ {done_label}: {counts.get(BULK_UPDATED, 0)}"]
+    if counts.get(BULK_SKIPPED):
+        lines.append(f"⏭ Пропущено (уже обработаны): {counts[BULK_SKIPPED]}")
+    if counts.get(BULK_NOT_FOUND):
+        lines.append(f"❓ Не найдено: {counts[BULK_NOT_FOUND]}")
+    if counts.get(BULK_FAILED):
+        lines.append(f"❌ Ошибка БД, изменения не применены: {counts[BULK_FAILED]}")
+    return "\n".join(lines)
+
+
+async def bulk_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if str(update.effective_user.id) != str(ADMIN_CHAT_ID):
+        await update.message.reply_text("⛔️ Только администратор может обрабатывать заявки списком.")
+        return ConversationHandler.END
+    requests = await get_pending_requests(BULK_PAGE_SIZE)
+    if not requests:
+        await update.message.reply_text("Нет заявок на рассмотрении.")
+        return ConversationHandler.END
+    context.user_data['bulk_pending'] = {request['id']: request for request in requests}
+    context.user_data['bulk_selected'] = set()
+    await update.message.reply_text(
+        _list_text(context),
+        reply_markup=get_bulk_requests_keyboard(requests, set())
+    )
+    return BULK_SELECT
+
+
+async def bulk_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    data = query.data
+    pending = context.user_data.get('bulk_pending')
+    if pending is None:
+        await query.answer()
+        await query.edit_message_text("Список устарел, откройте его заново: /bulk")
+        return ConversationHandler.END
+    selected = context.user_data.setdefault('bulk_selected', set())
+
+    if data.startswith("bulk_toggle_"):
+        request_id = int(data.split('_')[2])
+        selected.symmetric_difference_update({request_id})
+    elif data == "bulk_all":
+        selected.update(pending)
+    elif data == "bulk_none":
+        selected.clear()
+    elif data == "bulk_close":
+        await query.answer()
+        context.user_data.pop('bulk_pending', None)
+        context.user_data.pop('bulk_selected', None)
+        await query.edit_message_text("Массовая обработка закрыта.")
+        return ConversationHandler.END
+    elif data in ("bulk_assign", "bulk_cancel") and not selected:
+        await query.answer("Сначала отметьте заявки.", show_alert=True)
+        return BULK_SELECT
+    elif data == "bulk_assign":
+        await query.answer()
+        operators = await operator_directory.get_operators()
+        if not operators:
+            await query.edit_message_text("Нет доступных операторов.")
+            return ConversationHandler.END
+        await query.edit_message_text(
+            f"Выберите оператора для заявок ({len(_selected_ids(context))}):",
+            reply_markup=get_bulk_operator_keyboard(operators)
+        )
+        return BULK_SELECT
+    elif data == "bulk_cancel":
+        await query.answer()
+        await query.edit_message_text(f"Введите причину отмены заявок ({len(_selected_ids(context))}):")
+        return BULK_REASON
+    elif data.startswith("bulk_operator_"):
+        await query.answer()
+        return await _apply_assign(query, context, int(data.split('_')[2]))
+
+    # bulk_back и отметки: перерисовать список
+    await query.answer()
+    await query.edit_message_text(
+        _list_text(context),
+        reply_markup=get_bulk_requests_keyboard(list(pending.values()), selected)
+    )
+    return BULK_SELECT
+
+
+async def _apply_assign(query, context, operator_id):
+    request_ids = _selected_ids(context)
+    context.user_data.pop('bulk_pending', None)
+    context.user_data.pop('bulk_selected', None)
+
+    # Текст пользователю — по статусу на момент назначения, а не на момент показа списка
+    def messages(row):
+        return [
+            outbox_repo.request_to_operator(operator_id, row['id']),
+            outbox_repo.message(row['user_id'], ASSIGN_USER_MESSAGES[row['status']].format(id=row['id'])),
+        ]
+
+    outcomes = await bulk_assign_operator(request_ids, operator_id, ASSIGN_TRANSITIONS, outbox=messages)
+    notifier.wake()
+    operator_name = await operator_directory.get_operator_name(operator_id)
+    logger.info(f"[admin_bulk] Назначение оператору {operator_id}: {outcomes}")
+    await query.edit_message_text(f"Оператор: {operator_name}\n" + _summary(outcomes, "Назначено"))
+    return ConversationHandler.END
+
+
+async def bulk_reason(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    reason = update.message.text
+    request_ids = _selected_ids(context)
+    context.user_data.pop('bulk_pending', None)
+    context.user_data.pop('bulk_selected', None)
+    outcomes = await bulk_update_status(
+        request_ids, STATUS_CANCELLED, reason, PENDING_STATUSES,
+        outbox=lambda row: [outbox_repo.message(row['user_id'], f"Ваша заявка #{row['id']} отменена. Причина: {reason}")]
+    )
+    notifier.wake()
+    logger.info(f"[admin_bulk] Отмена заявок: {outcomes}")
+    await update.message.reply_text(_summary(outcomes, "Отменено"))
+    return ConversationHandler.END
+
+
+conv_bulk = ConversationHandler(
+    entry_points=[CommandHandler('bulk', bulk_entry)],
+    states={
+        BULK_SELECT: [CallbackQueryHandler(bulk_select, pattern=r"^bulk_")],
+        BULK_REASON: [MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_reason)],
+    },
+    fallbacks=[]
+)
@@ -2,8 +2,17 @@
 # Административные команды для управления ботом
 
 import logging
+from datetime import datetime, timedelta
 from config import ADMIN_CHAT_ID
-from repositories.request_repo import get_all_users
+from repositories.async_request_repo import get_all_users, iter_users
+from repositories.request_repo import get_request_cache_stats
+from repositories.outbox_repo import get_outbox_counts, OUTBOX_PENDING, OUTBOX_FAILED
+from repositories.event_repo import get_request_history, get_status_change_counts
+from repositories.stats_repo import get_daily_stats
+from utils.date_utils import parse_date
+from db import Database
+from db_async import get_db_executor, run_sync
+from services import operator_directory, notifier, journal
 
 logger = logging.getLogger(__name__)
 
@@ -88,17 +97,11 @@ async def admin_broadcast_command(update, context):
     await update.message.reply_text("📢 Начинаю отправку уведомления всем пользователям...")
     
     try:
-        # Получаем всех пользователей
-        all_users = get_all_users()
-        if not all_users:
-            await update.message.reply_text("❌ Нет пользователей в базе данных.")
-            return
-        
-        # Отправляем сообщение каждому пользователю
+        # Пользователи читаются пачками по мере отправки, а не все сразу
         success_count = 0
         error_count = 0
         
-        for user in all_users:
+        async for user in iter_users():
             try:
                 user_id = user['user_id']
                 await context.bot.send_message(
@@ -112,6 +115,10 @@ async def admin_broadcast_command(update, context):
                 # Логируем ошибку, но продолжаем отправку
                 logger.error(f"Не удалось отправить сообщение пользователю {user_id}: {e}")
         
+        if success_count == 0 and error_count == 0:
+            await update.message.reply_text("❌ Нет пользователей в базе данных.")
+            return
+        
         # Отправляем отчет администратору
         report = f"✅ **Отчет об отправке:**\n\n"
         report += f"📤 Успешно отправлено: {success_count}\n"
@@ -132,7 +139,7 @@ async def show_users_command(update, context):
         return
     
     try:
-        all_users = get_all_users()
+        all_users = await get_all_users()
     except Exception as e:
         await update.message.reply_text(f"Ошибка при получении пользователей: {e}")
         return
@@ -152,13 +159,172 @@ async def refresh_operators_command(update, context):
         await update.message.reply_text("⛔️ Только администратор может обновить список операторов.")
         return
     
-    from handlers.admin.admin_requests import get_operators_async
     try:
-        operators = await get_operators_async()
+        operators = await operator_directory.refresh()
         if operators:
             op_list = "\n".join([f"{op['user_id']}: {op['full_name']} (@{op['username']})" for op in operators])
             await update.message.reply_text(f"✅ Список операторов обновлен:\n{op_list}")
         else:
             await update.message.reply_text("⚠️ Операторы не найдены в базе данных.")
     except Exception as e:
-        await update.message.reply_text(f"❌ Ошибка при обновлении списка операторов: {e}") 
\ No newline at end of file
+        await update.message.reply_text(f"❌ Ошибка при обновлении списка операторов: {e}")
+
+async def db_stats_command(update, context):
+    """Показать состояние пула соединений с БД"""
+    user_id = update.effective_user.id
+    if str(user_id) != str(ADMIN_CHAT_ID):
+        await update.message.reply_text("⛔️ Только администратор может просматривать статистику БД.")
+        return
+    
+    stats = Database.get_pool_stats()
+    text = (
+        "🗄 Пул соединений с БД:\n"
+        f"Размер: {stats['size']}\n"
+        f"Открыто: {stats['open']} (занято: {stats['in_use']}, свободно: {stats['idle']})\n"
+        f"Ожидают соединения: {stats['waiting']}\n"
+        f"Создано: {stats['created']}, пересоздано: {stats['recycled']}\n"
+        f"Таймаутов ожидания: {stats['timeouts']}"
+    )
+    ex = get_db_executor().stats()
+    text += (
+        "\n\n🧵 Потоки запросов к БД:\n"
+        f"Занято: {ex['active']} из {ex['workers']} ({ex['saturation']:.0%})\n"
+        f"В очереди: {ex['queued']} (лимит {ex['max_queue']}, пик {ex['peak_pending']})\n"
+        f"Среднее ожидание потока: {ex['avg_wait_ms']:.1f} мс\n"
+        f"Выполнено: {ex['completed']}, отклонено: {ex['rejected']}, таймаутов: {ex['timeouts']}"
+    )
+    uc = Database.get_user_cache_stats()
+    text += (
+        "\n\n👤 Кэш профилей пользователей:\n"
+        f"Записей: {uc['size']} из {uc['max_size']} (TTL {uc['ttl']} с)\n"
+        f"Попаданий: {uc['hits']}, промахов: {uc['misses']} ({uc['hit_ratio']:.0%})\n"
+        f"Сброшено при изменениях: {uc['invalidations']}, вытеснено: {uc['evictions']}"
+    )
+    rc = get_request_cache_stats()
+    text += (
+        "\n\n📄 Кэш заявок:\n"
+        f"Записей: {rc['size']} из {rc['max_size']} (TTL {rc['ttl']} с)\n"
+        f"Попаданий: {rc['hits']}, промахов: {rc['misses']} ({rc['hit_ratio']:.0%})\n"
+        f"Объединено одновременных запросов: {rc['collapsed']}, сброшено при изменениях: {rc['invalidations']}"
+    )
+    rs = Database.get_replica_stats()
+    if rs:
+        lag = f"{rs['lag']} с" if rs['lag'] is not None else "неизвестно"
+        text += (
+            "\n\n📚 Реплика для чтения:\n"
+            f"Состояние: {'используется' if rs['healthy'] else 'не используется'}, отставание: {lag} (допустимо {rs['max_lag']:g} с)\n"
+            f"Чтений с реплики: {rs['reads_replica']}, с основного после записи: {rs['reads_sticky']}, "
+            f"с основного при недоступной реплике: {rs['reads_fallback']}"
+        )
+    oc = await run_sync(get_outbox_counts)
+    ns = notifier.stats()
+    text += (
+        "\n\n📨 Очередь уведомлений:\n"
+        f"Ожидают отправки: {oc.get(OUTBOX_PENDING, 0)}, не доставлено: {oc.get(OUTBOX_FAILED, 0)}\n"
+        f"С запуска отправлено: {ns['sent']}, повторов: {ns['retried']}, отказов: {ns['failed']}"
+    )
+    js = journal.stats()
+    if js['appended'] or js['segments'] or js['rejected']:
+        text += (
+            "\n\n📓 Журнал без связи с БД:\n"
+            f"Принято записей: {js['appended']} (fsync: {js['fsyncs']}), перенесено в БД: {js['replayed']}\n"
+            f"Ждут переноса сегментов: {js['segments']}, отвергнуто БД (dead.log): {js['rejected']}"
+        )
+    statements = Database.get_statement_stats()
+    if statements:
+        text += "\n\n⚙️ Prepared statements (подготовлено / выполнено):"
+        for name, st in sorted(statements.items()):
+            reuse = 1 - st['prepares'] / st['executions'] if st['executions'] else 0.0
+            text += f"\n{name}: {st['prepares']} / {st['executions']} (повторно: {reuse:.0%})"
+    await update.message.reply_text(text)
+
+def _stats_period(args):
+    """Период для /stats: без аргументов — сегодня, N — последние N дней, две даты — с/по."""
+    today = datetime.now().date()
+    if not args:
+        return today, today
+    if len(args) == 1 and args[0].isdigit() and 0 < int(args[0]) <= 366:
+        return today - timedelta(days=int(args[0]) - 1), today
+    if len(args) == 2:
+        date_from, date_to = parse_date(args[0]), parse_date(args[1])
+        if date_from and date_to and date_from <= date_to:
+            return date_from, date_to
+    return None
+
+def format_daily_stats(rows, date_from, date_to):
+    period = f"{date_from:%d.%m.%Y}" if date_from == date_to else f"{date_from:%d.%m.%Y} — {date_to:%d.%m.%Y}"
+    if not rows:
+        return f"📊 Заявок за {period} нет."
+    by_status, by_checkpoint = {}, {}
+    for row in rows:
+        for totals, key in ((by_status, row['status']), (by_checkpoint, (row['checkpoint'] or 'без пункта', row['direction'] or '—'))):
+            count, people = totals.get(key, (0, 0))
+            totals[key] = (count + row['request_count'], people + row['people_sum'])
+    total = sum(count for count, _ in by_status.values())
+    people = sum(people for _, people in by_status.values())
+    lines = [f"📊 Заявки за {period}: {total}, людей: {people}", "", "По статусам:"]
+    for status, (count, status_people) in sorted(by_status.items(), key=lambda item: -item[1][0]):
+        lines.append(f"{status}: {count} (людей: {status_people})")
+    lines += ["", "По пунктам пропуска:"]
+    for (checkpoint, direction), (count, checkpoint_people) in sorted(by_checkpoint.items(), key=lambda item: -item[1][0]):
+        lines.append(f"{checkpoint} ({direction}): {count} (людей: {checkpoint_people})")
+    return "\n".join(lines)
+
+async def stats_command(update, context):
+    """Сводка заявок по дням из request_daily_stats: /stats, /stats 7, /stats 01.10.2026 15.10.2026"""
+    user_id = update.effective_user.id
+    if str(user_id) != str(ADMIN_CHAT_ID):
+        await update.message.reply_text("⛔️ Только администратор может просматривать статистику заявок.")
+        return
+    period = _stats_period(context.args)
+    if period is None:
+        await update.message.reply_text(
+            "Использование:\n/stats — за сегодня\n/stats 7 — за последние 7 дней\n"
+            "/stats 01.10.2026 15.10.2026 — за период"
+        )
+        return
+    rows = await run_sync(get_daily_stats, *period)
+    if rows is None:
+        await update.message.reply_text("Ошибка при получении статистики, попробуйте позже.")
+        return
+    text = format_daily_stats(rows, *period)
+    await update.message.reply_text(text[:4000])
+
+async def history_command(update, context):
+    """История заявки (/history N) или смены статусов за сутки (/history)"""
+    user_id = update.effective_user.id
+    if str(user_id) != str(ADMIN_CHAT_ID):
+        await update.message.reply_text("⛔️ Только администратор может просматривать историю заявок.")
+        return
+
+    if not context.args:
+        now = datetime.now()
+        counts = await run_sync(get_status_change_counts, now - timedelta(days=1), now)
+        if not counts:
+            await update.message.reply_text("За последние сутки статусы заявок не менялись.\nИстория заявки: /history <номер>")
+            return
+        lines = [f"{status}: {count}" for status, count in sorted(counts.items(), key=lambda item: -item[1])]
+        await update.message.reply_text("🕓 Смены статусов за сутки:\n" + "\n".join(lines))
+        return
+
+    if not context.args[0].isdigit():
+        await update.message.reply_text("Использование: /history <номер заявки>")
+        return
+    request_id = int(context.args[0])
+    events = await run_sync(get_request_history, request_id)
+    if not events:
+        await update.message.reply_text(f"История заявки #{request_id} не найдена.")
+        return
+    lines = [f"🕓 История заявки #{request_id}:"]
+    for event in events:
+        if event['from_status'] is None:
+            change = f"создана ({event['to_status']})"
+        elif event['from_status'] != event['to_status']:
+            change = f"{event['from_status']} → {event['to_status']}"
+        else:
+            change = event['to_status']
+        if event['changed_fields']:
+            change += f", изменено: {event['changed_fields']}"
+        who = event['full_name'] or event['actor'] or "система"
+        lines.append(f"{event['ts']:%d.%m.%Y %H:%M} — {change} ({who})")
+    await update.message.reply_text("\n".join(lines))
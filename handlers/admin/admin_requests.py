@@ -3,11 +3,12 @@
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
-from repositories.request_repo import get_request_full, update_request_status, STATUS_ON_CLARIFICATION, STATUS_CANCELLED, STATUS_IN_PROGRESS, STATUS_DUPLICATED, assign_operator
+from repositories.async_request_repo import get_request_full, update_request_status, STATUS_ON_CLARIFICATION, STATUS_CANCELLED, STATUS_IN_PROGRESS, STATUS_DUPLICATED, assign_operator, is_free_form
+from repositories import outbox_repo
 import asyncio
-from handlers.operator.operator_requests import send_request_to_operator
+from services import journal, notifier
 from utils.date_utils import format_date_for_display, format_time_for_display
-from db import Database
+from services import operator_directory
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,55 +17,9 @@ ADMIN_REQUEST_ACTION = 100
 ADMIN_OPERATOR_SELECT = 101
 ADMIN_REQUEST_REASON = 102
 
-async def get_operators_async():
-    """
-    Получить список операторов с принудительным обновлением данных из БД.
-    Использует прямое соединение с БД для избежания проблем с кэшированием.
-    """
-    import mysql.connector
-    from config import DB_CONFIG, ROLE_OPERATOR
-    
-    logger.info("[get_operators_async] Начинаем получение операторов...")
-    logger.info(f"[get_operators_async] DB_CONFIG: {DB_CONFIG}")
-    logger.info(f"[get_operators_async] ROLE_OPERATOR: {ROLE_OPERATOR}")
-    
-    conn = None
-    try:
-        # Принудительно создаем новое соединение
-        logger.info("[get_operators_async] Создаем новое соединение с БД...")
-        conn = mysql.connector.connect(**DB_CONFIG)
-        if not conn:
-            logger.error("[get_operators_async] Нет соединения с БД")
-            return []
-        
-        logger.info("[get_operators_async] Соединение с БД установлено")
-        
-        with conn.cursor(dictionary=True) as cursor:
-            query = "SELECT user_id, username, full_name FROM users WHERE role = %s ORDER BY user_id"
-            logger.info(f"[get_operators_async] Выполняем запрос: {query} с параметром {ROLE_OPERATOR}")
-            
-            cursor.execute(query, (ROLE_OPERATOR,))
-            operators = cursor.fetchall()
-            
-            logger.info(f"[get_operators_async] Получено операторов: {len(operators)}")
-            for op in operators:
-                logger.info(f"[get_operators_async] Оператор: {op['user_id']} - "
-                           f"{op['full_name']} (@{op['username']})")
-            
-            return operators
-    except Exception as e:
-        logger.error(f"[get_operators_async] Ошибка: {e}")
-        import traceback
-        logger.error(f"[get_operators_async] Traceback: {traceback.format_exc()}")
-        return []
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
-            logger.info("[get_operators_async] Соединение с БД закрыто")
-
 async def get_admin_request_text_and_keyboard(request, show_operators=False):
     # ВСЕГДА получаем актуальные данные заявки из базы
-    request = get_request_full(request['id']) if isinstance(request, dict) and 'id' in request else request
+    request = await get_request_full(request['id']) if isinstance(request, dict) and 'id' in request else request
     # Получаем список изменённых полей (edited_fields)
     edited_fields = request.get('edited_fields', [])
     if edited_fields is None:
@@ -76,13 +31,7 @@ async def get_admin_request_text_and_keyboard(request, show_operators=False):
     def format_line(field, label, value):
         return highlight(f"{label}: {value}") if field in edited_fields else f"{label}: {value}"
     # Определяем свободная форма или по образцу
-    template_fields = [
-        'division', 'direction', 'checkpoint', 'date_start', 'date_end',
-        'time_start', 'time_end', 'car_brand', 'people_count',
-        'leader_name', 'cargo'
-    ]
-    is_free_form = all(not request.get(f) for f in template_fields) and request.get('purpose')
-    if is_free_form:
+    if is_free_form(request):
         text = (
             f"📄 Заявка #{request['id']}: Статус: {request['status']}\n"
             f"{request.get('purpose', '')}\n" # Текст свободной формы
@@ -92,13 +41,9 @@ async def get_admin_request_text_and_keyboard(request, show_operators=False):
         if request['status'] == "Продублировать":
             # Для свободной формы при show_operators=True показываем выбор оператора
             if show_operators:
-                operators = await get_operators_async()
-                keyboard = [
-                    [InlineKeyboardButton(f"{op['full_name']} (@{op['username']})", callback_data=f"duplicate_operator_{op['user_id']}_{request['id']}")]
-                    for op in operators
-                ]
+                keyboard = await operator_directory.get_operator_keyboard("duplicate_operator_", request['id'])
 #                keyboard.append([InlineKeyboardButton("❌ Отменить", callback_data=f"duplicate_cancel_{request['id']}")])
-                return text, InlineKeyboardMarkup(keyboard)
+                return text, keyboard or InlineKeyboardMarkup([])
             else:
                 keyboard = InlineKeyboardMarkup([
                     [InlineKeyboardButton("🔄 Продублировать", callback_data=f"duplicate_request_{request['id']}")],
@@ -129,13 +74,9 @@ async def get_admin_request_text_and_keyboard(request, show_operators=False):
         )
         if request['status'] == "Продублировать":
             if show_operators:
-                operators = await get_operators_async()
-                keyboard = [
-                    [InlineKeyboardButton(f"{op['full_name']} (@{op['username']})", callback_data=f"duplicate_operator_{op['user_id']}_{request['id']}")]
-                    for op in operators
-                ]
+                keyboard = await operator_directory.get_operator_keyboard("duplicate_operator_", request['id'])
                # keyboard.append([InlineKeyboardButton("Отменить", callback_data=f"duplicate_cancel_{request['id']}")])
-                return text, InlineKeyboardMarkup(keyboard)
+                return text, keyboard or InlineKeyboardMarkup([])
             else:
                 keyboard = InlineKeyboardMarkup([
                     [InlineKeyboardButton("🔄 Продублировать", callback_data=f"duplicate_request_{request['id']}")],
@@ -176,7 +117,7 @@ async def admin_requests_entry(update: Update, context: ContextTypes.DEFAULT_TYP
     elif 'request_id' in context.user_data:
         request_id = context.user_data['request_id']
     if request_id:
-        request = get_request_full(request_id)
+        request = await get_request_full(request_id)
         if request:
             context.user_data['request_data'] = request
         else:
@@ -209,23 +150,13 @@ async def admin_request_action(update, context):
     logger.info(f"[admin_request_action] User ID: {update.effective_user.id}")
     logger.info(f"[admin_request_action] Chat ID: {update.effective_chat.id}")
     
-    # Принудительно очищаем кэш операторов при каждом вызове
-    if hasattr(context, 'operators_cache'):
-        delattr(context, 'operators_cache')
-        logger.info("[admin_request_action] Очищен context.operators_cache")
-    
-    # Принудительно очищаем user_data кэш операторов
-    if 'operators_cache' in context.user_data:
-        del context.user_data['operators_cache']
-        logger.info("[admin_request_action] Очищен context.user_data['operators_cache']")
-    
     if data.startswith("approve_"):
         logger.info(f"[admin_request_action] === ОБРАБОТКА APPROVE ===")
         request_id = int(data.split('_')[1])
         logger.info(f"[admin_request_action] Обрабатываем approve для заявки {request_id}")
         
         # Получаем заявку из БД
-        request = get_request_full(request_id)
+        request = await get_request_full(request_id)
         if not request:
             logger.error(f"[admin_request_action] Заявка {request_id} не найдена в БД")
             await query.edit_message_text("Заявка не найдена в базе данных.")
@@ -234,10 +165,9 @@ async def admin_request_action(update, context):
         logger.info(f"[admin_request_action] Заявка {request_id} найдена, статус: {request.get('status')}")
         context.user_data['request_data'] = request
         
-        # Принудительно получаем свежих операторов
-        logger.info("[admin_request_action] Начинаем получение операторов...")
-        operators = await get_operators_async()
-        logger.info(f"[admin_request_action] Получено операторов: {len(operators)}")
+        # Справочник операторов перечитывается сам при смене ролей
+        operators = await operator_directory.get_operators()
+        logger.info(f"[admin_request_action] Операторов в справочнике: {len(operators)}")
         
         if not operators:
             logger.warning("[admin_request_action] Нет доступных операторов")
@@ -248,17 +178,10 @@ async def admin_request_action(update, context):
         op_list = "\n".join([f"{op['full_name']} (@{op['username']})" for op in operators])
         msg = f"Выберите оператора для назначения заявки:\n\nНайдено операторов: {len(operators)}\n{op_list}"
         
-        # Создаем клавиатуру
-        keyboard = []
-        for op in operators:
-            callback_data = f"operator_{op['user_id']}_{request_id}"
-            logger.info(f"[admin_request_action] Создаем кнопку для оператора {op['user_id']} с callback_data: {callback_data}")
-            keyboard.append([InlineKeyboardButton(f"{op['full_name']} (@{op['username']})", callback_data=callback_data)])
-        
-        logger.info(f"[admin_request_action] Создана клавиатура с {len(keyboard)} кнопками")
+        keyboard = await operator_directory.get_operator_keyboard("operator_", request_id)
         
         try:
-            await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard))
+            await query.edit_message_text(msg, reply_markup=keyboard)
             logger.info("[admin_request_action] Сообщение успешно обновлено")
             return ADMIN_OPERATOR_SELECT
         except Exception as e:
@@ -267,28 +190,24 @@ async def admin_request_action(update, context):
             return ConversationHandler.END
     elif data.startswith("edited_approve_"):
         request_id = int(data.split('_')[2])
-        request = get_request_full(request_id)
+        request = await get_request_full(request_id)
         context.user_data['request_data'] = request
-        operators = await get_operators_async()
-        if not operators:
+        keyboard = await operator_directory.get_operator_keyboard("edited_operator_", request_id)
+        if not keyboard:
             await query.edit_message_text("Нет доступных операторов.")
             return ConversationHandler.END
-        keyboard = [
-            [InlineKeyboardButton(f"{op['full_name']} (@{op['username']})", callback_data=f"edited_operator_{op['user_id']}_{request_id}")]
-            for op in operators
-        ]
-        await query.edit_message_text("Выберите оператора для назначения заявки:", reply_markup=InlineKeyboardMarkup(keyboard))
+        await query.edit_message_text("Выберите оператора для назначения заявки:", reply_markup=keyboard)
         return ADMIN_OPERATOR_SELECT
     elif data.startswith("clarify_"):
         request_id = int(data.split('_')[1])
-        request = get_request_full(request_id)
+        request = await get_request_full(request_id)
         context.user_data['request_data'] = request
         context.user_data['reason_type'] = STATUS_ON_CLARIFICATION
         await query.edit_message_text("Введите причину уточнения заявки:")
         return ADMIN_REQUEST_REASON
     elif data.startswith("cancel_"):
         request_id = int(data.split('_')[1])
-        request = get_request_full(request_id)
+        request = await get_request_full(request_id)
         context.user_data['request_data'] = request
         context.user_data['reason_type'] = STATUS_CANCELLED
         await query.edit_message_text("Введите причину отмены заявки:")
@@ -297,21 +216,20 @@ async def admin_request_action(update, context):
         parts = data.split('_')
         operator_id = int(parts[2])
         request_id = int(parts[3])
-        assign_operator(request_id, operator_id)
+        request = await get_request_full(request_id)
+        if not request:
+            await query.edit_message_text("Заявка не найдена.")
+            return ConversationHandler.END
         # Статус заявки остается 'Отредактированная'
-        request = get_request_full(request_id)
-        user_id = request.get('user_id')
-        operators = await get_operators_async()
-        operator = next((op for op in operators if op['user_id'] == operator_id), None)
-        operator_name = operator['full_name'] if operator else f"Оператор {operator_id}"
-        await send_request_to_operator(context, operator_id, request_id)
-        await context.bot.send_message(chat_id=user_id, text=f"Ваша заявка #{request_id} передана оператору.")
-#        await context.bot.send_message(chat_id=user_id, text=f"Ваша заявка #{request_id} передана оператору: {operator_name}.")
+        if not await assign_and_notify(request, operator_id, None, f"Ваша заявка #{request_id} передана оператору."):
+            await query.edit_message_text("Не удалось назначить оператора, попробуйте ещё раз.")
+            return ConversationHandler.END
+        operator_name = await operator_directory.get_operator_name(operator_id)
         await query.edit_message_text(f"Заявка отправлена оператору: {operator_name}.")
         return ConversationHandler.END
     elif data.startswith("duplicate_request_"):
         request_id = int(data.split('_')[2])
-        request = get_request_full(request_id)
+        request = await get_request_full(request_id)
         context.user_data['request_data'] = request
         # Показываем подменю операторов
         text, keyboard = await get_admin_request_text_and_keyboard(request, show_operators=True)
@@ -321,29 +239,26 @@ async def admin_request_action(update, context):
         parts = data.split('_')
         operator_id = int(parts[2])
         request_id = int(parts[3])
-        assign_operator(request_id, operator_id)
-        update_request_status(request_id, "Продублировать")
-        # После назначения оператора, всегда брать заявку из базы
-        request = get_request_full(request_id)
-        user_id = request.get('user_id')
-        operators = await get_operators_async()
-        operator = next((op for op in operators if op['user_id'] == operator_id), None)
-        operator_name = operator['full_name'] if operator else f"Оператор {operator_id}"
-        await send_request_to_operator(context, operator_id, request_id)
-        await context.bot.send_message(chat_id=user_id, text=f"Ваша заявка #{request_id} продублирована оператору.")
-#        await context.bot.send_message(chat_id=user_id, text=f"Ваша заявка #{request_id} продублирована оператору: {operator_name}.")
+        request = await get_request_full(request_id)
+        if not request:
+            await query.edit_message_text("Заявка не найдена.")
+            return ConversationHandler.END
+        if not await assign_and_notify(request, operator_id, STATUS_DUPLICATED, f"Ваша заявка #{request_id} продублирована оператору."):
+            await query.edit_message_text("Не удалось назначить оператора, попробуйте ещё раз.")
+            return ConversationHandler.END
+        operator_name = await operator_directory.get_operator_name(operator_id)
         await query.edit_message_text(f"Заявка отправлена оператору: {operator_name}.")
         return ConversationHandler.END
     elif data.startswith("duplicate_cancel_"):
         request_id = int(data.split('_')[2])
-        request = get_request_full(request_id)
+        request = await get_request_full(request_id)
         context.user_data['request_data'] = request
         await query.edit_message_text("Введите причину отмены продублированной заявки:")
         context.user_data['reason_type'] = STATUS_CANCELLED
         return ADMIN_REQUEST_REASON
     elif data.startswith("edited_cancel_"):
         request_id = int(data.split('_')[2])
-        request = get_request_full(request_id)
+        request = await get_request_full(request_id)
         context.user_data['request_data'] = request
         context.user_data['reason_type'] = STATUS_CANCELLED
         await query.edit_message_text("Введите причину отмены отредактированной заявки:")
@@ -351,6 +266,19 @@ async def admin_request_action(update, context):
     await query.edit_message_text("Ошибка выбора действия.")
     return ConversationHandler.END
 
+async def assign_and_notify(request, operator_id, new_status, user_text):
+    """
+    Назначить оператора (и сменить статус) одной транзакцией с уведомлениями
+    оператору и пользователю; отправит их services.notifier.
+    """
+    saved = await assign_operator(request['id'], operator_id, new_status, outbox=[
+        outbox_repo.request_to_operator(operator_id, request['id']),
+        outbox_repo.message(request['user_id'], user_text),
+    ])
+    if saved:
+        notifier.wake()
+    return saved
+
 async def admin_operator_select(update, context):
     query = update.callback_query
     await query.answer()
@@ -371,7 +299,7 @@ async def admin_operator_select(update, context):
             request_id = int(parts[2])
             logger.info(f"[admin_operator_select] Operator ID: {operator_id}, Request ID: {request_id}")
             
-            request = get_request_full(request_id)
+            request = await get_request_full(request_id)
             if not request:
                 logger.error(f"[admin_operator_select] Заявка {request_id} не найдена")
                 await query.edit_message_text("Заявка не найдена.")
@@ -380,19 +308,16 @@ async def admin_operator_select(update, context):
             user_id = request.get('user_id')
             logger.info(f"[admin_operator_select] User ID: {user_id}")
             
-            assign_operator(request_id, operator_id)
-            update_request_status(request_id, STATUS_IN_PROGRESS)
+            # Заявка оператору со всеми полями и сообщение пользователю уходят через очередь
+            if not await assign_and_notify(request, operator_id, STATUS_IN_PROGRESS, f"Ваша заявка #{request_id} принята в работу оператором."):
+                logger.error(f"[admin_operator_select] Не удалось назначить оператора заявке {request_id}")
+                await query.edit_message_text("Не удалось назначить оператора, попробуйте ещё раз.")
+                return ConversationHandler.END
             
-            operators = await get_operators_async()
-            operator = next((op for op in operators if op['user_id'] == operator_id), None)
-            operator_name = operator['full_name'] if operator else f"Оператор {operator_id}"
+            operator_name = await operator_directory.get_operator_name(operator_id)
             logger.info(f"[admin_operator_select] Оператор: {operator_name}")
-            
-            # Отправляем заявку оператору со всеми полями
-            await send_request_to_operator(context, operator_id, request_id)
-            await context.bot.send_message(chat_id=user_id, text=f"Ваша заявка #{request_id} принята в работу оператором.")
             await query.edit_message_text(f"Заявка отправлена оператору: {operator_name}.")
-            logger.info(f"[admin_operator_select] Заявка успешно отправлена оператору")
+            logger.info(f"[admin_operator_select] Заявка поставлена в очередь отправки оператору")
             return ConversationHandler.END
         else:
             logger.error(f"[admin_operator_select] Неверный формат callback: {data}")
@@ -403,16 +328,15 @@ async def admin_operator_select(update, context):
         if len(parts) == 4 and parts[2].isdigit() and parts[3].isdigit():
             operator_id = int(parts[2])
             request_id = int(parts[3])
-            assign_operator(request_id, operator_id)
+            request = await get_request_full(request_id)
+            if not request:
+                await query.edit_message_text("Заявка не найдена.")
+                return ConversationHandler.END
             # Статус заявки остается 'Отредактированная'
-            request = get_request_full(request_id)
-            user_id = request.get('user_id')
-            operators = await get_operators_async()
-            operator = next((op for op in operators if op['user_id'] == operator_id), None)
-            operator_name = operator['full_name'] if operator else f"Оператор {operator_id}"
-            await send_request_to_operator(context, operator_id, request_id)
-            await context.bot.send_message(chat_id=user_id, text=f"Ваша заявка #{request_id} передана оператору.")
-#            await context.bot.send_message(chat_id=user_id, text=f"Ваша заявка #{request_id} передана оператору: {operator_name}.")
+            if not await assign_and_notify(request, operator_id, None, f"Ваша заявка #{request_id} передана оператору."):
+                await query.edit_message_text("Не удалось назначить оператора, попробуйте ещё раз.")
+                return ConversationHandler.END
+            operator_name = await operator_directory.get_operator_name(operator_id)
             await query.edit_message_text(f"Заявка отправлена оператору: {operator_name}.")
             return ConversationHandler.END
         else:
@@ -425,21 +349,26 @@ async def admin_request_reason(update, context):
     request = context.user_data.get('request_data')
     user_id = request.get('user_id')
     reason_type = context.user_data.get('reason_type')
-    update_request_status(request['id'], reason_type, reason)
     if reason_type == STATUS_ON_CLARIFICATION:
         from handlers.edit_request import format_request_text
         text = f"Ваша заявка #{request['id']} отправлена на уточнение.\nПричина: {reason}\n\n" + format_request_text(request)
-        await context.bot.send_message(chat_id=user_id, text=text, parse_mode="HTML")
+        message = outbox_repo.message(user_id, text, parse_mode="HTML")
+    else:
+        message = outbox_repo.message(user_id, f"Ваша заявка #{request['id']} отменена. Причина: {reason}")
+    if await update_request_status(request['id'], reason_type, reason, outbox=[message]):
+        notifier.wake()
+        await update.message.reply_text("Причина отправлена пользователю.")
+    elif await journal.change_status(request['id'], reason_type, reason, outbox=[message]):
+        await update.message.reply_text("Нет связи с БД: статус сохранится и причина будет отправлена пользователю автоматически.")
     else:
-        await context.bot.send_message(chat_id=user_id, text=f"Ваша заявка #{request['id']} отменена. Причина: {reason}")
-    await update.message.reply_text("Причина отправлена пользователю.")
+        await update.message.reply_text("Ошибка: не удалось обновить статус заявки.")
     return ConversationHandler.END
 
 async def notify_admins_about_duplicate(context, request_id, admin_ids):
     """
     Отправляет заявку со статусом 'Продублировать' всем администраторам с inline-кнопками.
     """
-    request = get_request_full(request_id)
+    request = await get_request_full(request_id)
     text, keyboard = await get_admin_request_text_and_keyboard(request)
     for admin_id in admin_ids:
         await context.bot.send_message(chat_id=admin_id, text=text, reply_markup=keyboard, parse_mode="HTML")
@@ -448,7 +377,7 @@ async def notify_admins_about_edited(context, request_id, admin_ids):
     """
     Отправляет заявку со статусом 'Отредактированная' всем администраторам с inline-кнопками.
     """
-    request = get_request_full(request_id)
+    request = await get_request_full(request_id)
     text, keyboard = await get_admin_request_text_and_keyboard(request)
     for admin_id in admin_ids:
         await context.bot.send_message(chat_id=admin_id, text=text, reply_markup=keyboard, parse_mode="HTML")
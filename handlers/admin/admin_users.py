@@ -3,7 +3,7 @@
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
-from db import Database
+from db_async import AsyncDatabase
 from config import ROLE_USER, ROLE_ADMIN, ROLE_OPERATOR
 from handlers.admin.states import ADMIN_USER_ID, ADMIN_USER_ACTION, ADMIN_ROLE_SELECT, ADMIN_MAIN
 from keyboards.admin.menu import get_admin_main_menu  # Импорт правильной функции
@@ -14,7 +14,7 @@ async def admin_users_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def admin_user_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.text.strip()
-    user_info = Database.get_user_info(user_id)
+    user_info = await AsyncDatabase.get_user_info(user_id)
     context.user_data['manage_user_id'] = user_id
     context.user_data['manage_user_info'] = user_info
     text = f"Пользователь: {user_info['username']}\nРоль: {user_info['role']}\nСтатус: {'Заблокирован' if user_info.get('blocked') else 'Активен'}"
@@ -49,7 +49,7 @@ async def admin_user_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ADMIN_ROLE_SELECT
     elif data == "block":
-        Database.block_user(user_id)
+        await AsyncDatabase.block_user(user_id)
         await query.edit_message_text("Пользователь заблокирован.")
         try:
             await context.bot.send_message(chat_id=user_id, text="Вы заблокированы администратором.")
@@ -57,7 +57,7 @@ async def admin_user_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
             pass
         return ADMIN_USER_ACTION
     elif data == "unblock":
-        Database.unblock_user(user_id)
+        await AsyncDatabase.unblock_user(user_id)
         await query.edit_message_text("Пользователь разблокирован.")
         return ADMIN_USER_ACTION
     elif data == "back":
@@ -70,13 +70,13 @@ async def admin_role_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = context.user_data['manage_user_id']
     data = query.data
     if data == "role_user":
-        Database.set_user_role(user_id, ROLE_USER)
+        await AsyncDatabase.set_user_role(user_id, ROLE_USER)
         await query.edit_message_text("Роль пользователя изменена на 'Пользователь'.")
     elif data == "role_admin":
-        Database.set_user_role(user_id, ROLE_ADMIN)
+        await AsyncDatabase.set_user_role(user_id, ROLE_ADMIN)
         await query.edit_message_text("Роль пользователя изменена на 'Администратор'.")
     elif data == "role_operator":
-        Database.set_user_role(user_id, ROLE_OPERATOR)
+        await AsyncDatabase.set_user_role(user_id, ROLE_OPERATOR)
         await query.edit_message_text("Роль пользователя изменена на 'Оператор'.")
     elif data == "back":
         await query.edit_message_text("Главное меню администратора.")
@@ -90,7 +90,7 @@ async def admin_role_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # Проверка блокировки пользователя для всех пользовательских команд
 async def check_blocked(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    user_info = Database.get_user_info(user.id)
+    user_info = await AsyncDatabase.get_user_info(user.id)
     if user_info.get('blocked'):
         await update.message.reply_text("Вы заблокированы администратором.")
         return True
@@ -10,7 +10,8 @@ from keyboards.checkpoint import get_checkpoint_keyboard, get_checkpoint_names
 from keyboards.people_count import get_people_count_keyboard
 from keyboards.dates import get_dates_keyboard
 from time_picker import TimePicker
-from repositories.request_repo import get_request_full, update_request_fields, update_request_status, STATUS_EDITED, STATUS_DUPLICATED, STATUS_CANCELLED
+from repositories.async_request_repo import get_request_full, update_request_status, STATUS_EDITED, STATUS_DUPLICATED, STATUS_CANCELLED, is_free_form
+from services import edit_buffer
 from config import DIVISION, DIRECTION, CHECKPOINT, DATE_START, DATE_END, TIME_START, TIME_END, CAR_BRAND, PEOPLE_COUNT, LEADER_NAME, CARGO, PURPOSE, ADMIN_CHAT_ID
 from keyboards.main_menu import get_user_reply_keyboard
 from handlers.new_request import get_edit_fields_keyboard
@@ -48,12 +49,7 @@ def highlight(text):
     return f"<b><u>{text}</u></b>"
 
 def is_free_form_request(request):
-    template_fields = [
-        'division', 'direction', 'checkpoint', 'date_start', 'date_end',
-        'time_start', 'time_end', 'car_brand', 'people_count',
-        'leader_name', 'cargo'
-    ]
-    return all(not request.get(f) for f in template_fields) and request.get('purpose')
+    return is_free_form(request)
 
 def format_free_form_request(request, request_id=None):
     rid = request_id or request.get('id', '')
@@ -105,7 +101,7 @@ async def show_request_status(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("Некорректный номер заявки. Введите число.")
         return STATUS_ACTION
     request_id = int(request_id)
-    request = get_request_full(request_id)
+    request = await edit_buffer.get_request(request_id)
     if not request:
         await update.message.reply_text(
             f"Заявка с номером {request_id} не найдена.",
@@ -182,11 +178,10 @@ async def after_free_form_edit(update: Update, context: ContextTypes.DEFAULT_TYP
     if update.message:
         new_text = update.message.text
         context.user_data['request_data']['purpose'] = new_text
-        # Сохраняем в БД
+        # Правка копится в буфере, в БД записывается при подтверждении
         request_id = context.user_data.get('status_request_id')
         if request_id:
-            data_to_save = context.user_data['request_data'].copy()
-            update_request_fields(request_id, data_to_save)
+            edit_buffer.stage(request_id, {'purpose': new_text})
         keyboard = [
             [InlineKeyboardButton("✅ Подтвердить", callback_data="confirm_edit")],
             [InlineKeyboardButton("✏️ Редактировать", callback_data="edit_request")]
@@ -270,16 +265,14 @@ async def after_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if field not in context.user_data["edited_fields"]:
             context.user_data["edited_fields"].append(field)
         context.user_data["edited_fields"] = list(dict.fromkeys(context.user_data["edited_fields"]))
-        # Sохраняем изменения в БД, включая edited_fields как строку
-        data_to_save = context.user_data['request_data'].copy()
-        data_to_save['edited_fields'] = ','.join(context.user_data['edited_fields'])
     # Проверка времени для редактирования
     if not is_allowed_request_time():
         await update.message.reply_text(
             f"Редактирование заявок возможно только {get_time_limits_str()}.")
         return ConversationHandler.END
     if isinstance(field, str):
-        update_request_fields(context.user_data['status_request_id'], data_to_save)
+        # Правка копится в буфере вместе с edited_fields, в БД записывается при подтверждении
+        edit_buffer.stage(context.user_data['status_request_id'], {field: context.user_data['request_data'].get(field)}, context.user_data['edited_fields'])
     keyboard = [
         [InlineKeyboardButton("✅ Подтвердить", callback_data="confirm_edit")],
         [InlineKeyboardButton("✏️ Редактировать", callback_data="edit_request")]
@@ -299,13 +292,21 @@ async def after_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Если нет status_request_id, значит создаем новую заявку
         return "AWAIT_CONFIRM"
 
+async def report_flush_failed(query):
+    # Правки остаются в буфере и черновике; диалог остаётся в том же состоянии (None),
+    # пользователь может повторить действие кнопкой того же сообщения
+    await query.message.reply_text("⚠️ Не удалось сохранить изменения заявки. Попробуйте ещё раз чуть позже.")
+    return None
+
 # --- 6. ✅ Подтвердить изменения ---
 async def confirm_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     request_id = context.user_data['status_request_id']
-    update_request_status(request_id, STATUS_EDITED)
-    request = get_request_full(request_id)
+    if not await edit_buffer.flush(request_id):
+        return await report_flush_failed(query)
+    await update_request_status(request_id, STATUS_EDITED)
+    request = await get_request_full(request_id)
     admin_message = format_request_text(request, context.user_data.get('edited_fields', []))
     # Удалено обычное сообщение админу, оставлен только вызов notify_admins_about_edited
     from handlers.admin.admin_requests import notify_admins_about_edited
@@ -325,12 +326,14 @@ async def duplicate_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"Дублирование заявок возможно только {get_time_limits_str()}.")
         return ConversationHandler.END
     request_id = context.user_data['status_request_id']
-    request = get_request_full(request_id)
+    if not await edit_buffer.flush(request_id):
+        return await report_flush_failed(query)
+    request = await get_request_full(request_id)
     if not request:
         await query.edit_message_text("Ошибка: заявка не найдена.")
         return ConversationHandler.END
     user_id = query.from_user.id
-    update_request_status(request_id, STATUS_DUPLICATED)
+    await update_request_status(request_id, STATUS_DUPLICATED)
     # Получаем список администраторов (замените на реальный список, если их несколько)
     admin_ids = [ADMIN_CHAT_ID]
     await notify_admins_about_duplicate(context, request_id, admin_ids)
@@ -348,8 +351,10 @@ async def cancel_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"Отмена заявок возможна только {get_time_limits_str()}.")
         return ConversationHandler.END
     request_id = context.user_data['status_request_id']
-    update_request_status(request_id, STATUS_CANCELLED)
-    request = get_request_full(request_id)
+    if not await edit_buffer.flush(request_id):
+        return await report_flush_failed(query)
+    await update_request_status(request_id, STATUS_CANCELLED)
+    request = await get_request_full(request_id)
     if not request:
         await query.edit_message_text("Ошибка: заявка не найдена.")
         return ConversationHandler.END
@@ -400,18 +405,20 @@ async def back_to_actions(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="HTML")
     return SELECT_ACTIONS
 
-# --- Служебная функция для синхронизации edited_fields с БД ---
+# --- Служебная функция для синхронизации edited_fields с заявкой ---
 def sync_edited_fields(context):
     if "edited_fields" not in context.user_data:
         context.user_data["edited_fields"] = []
     request_id = context.user_data.get('status_request_id')
     if request_id:
-        request = get_request_full(request_id)
+        # Заявка уже загружена в request_data, а несохранённые правки лежат
+        # в edit_buffer, поэтому повторно читать её из БД на каждом шаге не нужно
+        request = context.user_data.get('request_data')
         db_edited = request.get('edited_fields', '') if request else ''
         if db_edited is None:
             db_edited = ''
         if isinstance(db_edited, str):
-            db_edited = [f.strip() for f in db_edited.split('.') if f.strip()]
+            db_edited = [f.strip() for f in db_edited.split(',') if f.strip()]
         for f in db_edited:
             if f not in context.user_data["edited_fields"]:
                 context.user_data["edited_fields"].append(f)
@@ -435,7 +442,7 @@ async def direction_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if 'request_data' not in context.user_data or not context.user_data['request_data']:
         request_id = context.user_data.get('status_request_id')
         if request_id:
-            request = get_request_full(request_id)
+            request = await edit_buffer.get_request(request_id)
             if request:
                 context.user_data['request_data'] = request
             else:
@@ -458,9 +465,7 @@ async def direction_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["edited_fields"] = list(dict.fromkeys(context.user_data["edited_fields"]))
         request_id = context.user_data.get('status_request_id')
         if request_id:
-            data_to_save = context.user_data['request_data'].copy()
-            data_to_save['edited_fields'] = ','.join(context.user_data['edited_fields'])
-            update_request_fields(request_id, data_to_save)
+            edit_buffer.stage(request_id, {field: context.user_data['request_data'][field]}, context.user_data['edited_fields'])
         keyboard = [
             [InlineKeyboardButton("✅ Подтвердить", callback_data="confirm_edit")],
             [InlineKeyboardButton("✏️ Редактировать", callback_data="edit_request")],
@@ -479,7 +484,7 @@ async def checkpoint_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if 'request_data' not in context.user_data or not context.user_data['request_data']:
         request_id = context.user_data.get('status_request_id')
         if request_id:
-            request = get_request_full(request_id)
+            request = await edit_buffer.get_request(request_id)
             if request:
                 context.user_data['request_data'] = request
             else:
@@ -501,9 +506,7 @@ async def checkpoint_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["edited_fields"] = list(dict.fromkeys(context.user_data["edited_fields"]))
     request_id = context.user_data.get('status_request_id')
     if request_id:
-        data_to_save = context.user_data['request_data'].copy()
-        data_to_save['edited_fields'] = ','.join(context.user_data['edited_fields'])
-        update_request_fields(request_id, data_to_save)
+        edit_buffer.stage(request_id, {field: context.user_data['request_data'][field]}, context.user_data['edited_fields'])
     keyboard = [
         [InlineKeyboardButton("✅ Подтвердить", callback_data="confirm_edit")],
         [InlineKeyboardButton("✏️ Редактировать", callback_data="edit_request")],
@@ -519,7 +522,7 @@ async def date_start_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if 'request_data' not in context.user_data or not context.user_data['request_data']:
         request_id = context.user_data.get('status_request_id')
         if request_id:
-            request = get_request_full(request_id)
+            request = await edit_buffer.get_request(request_id)
             if request:
                 context.user_data['request_data'] = request
             else:
@@ -539,9 +542,7 @@ async def date_start_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["edited_fields"] = list(dict.fromkeys(context.user_data["edited_fields"]))
     request_id = context.user_data.get('status_request_id')
     if request_id:
-        data_to_save = context.user_data['request_data'].copy()
-        data_to_save['edited_fields'] = ','.join(context.user_data['edited_fields'])
-        update_request_fields(request_id, data_to_save)
+        edit_buffer.stage(request_id, {field: context.user_data['request_data'][field]}, context.user_data['edited_fields'])
     keyboard = [
         [InlineKeyboardButton("✅ Подтвердить", callback_data="confirm_edit")],
         [InlineKeyboardButton("✏️ Редактировать", callback_data="edit_request")],
@@ -557,7 +558,7 @@ async def date_end_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if 'request_data' not in context.user_data or not context.user_data['request_data']:
         request_id = context.user_data.get('status_request_id')
         if request_id:
-            request = get_request_full(request_id)
+            request = await edit_buffer.get_request(request_id)
             if request:
                 context.user_data['request_data'] = request
             else:
@@ -577,9 +578,7 @@ async def date_end_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["edited_fields"] = list(dict.fromkeys(context.user_data["edited_fields"]))
     request_id = context.user_data.get('status_request_id')
     if request_id:
-        data_to_save = context.user_data['request_data'].copy()
-        data_to_save['edited_fields'] = ','.join(context.user_data['edited_fields'])
-        update_request_fields(request_id, data_to_save)
+        edit_buffer.stage(request_id, {field: context.user_data['request_data'][field]}, context.user_data['edited_fields'])
     keyboard = [
         [InlineKeyboardButton("✅ Подтвердить", callback_data="confirm_edit")],
         [InlineKeyboardButton("✏️ Редактировать", callback_data="edit_request")],
@@ -596,7 +595,7 @@ async def time_start_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         request_id = context.user_data.get('status_request_id'
         )
         if request_id:
-            request = get_request_full(request_id)
+            request = await edit_buffer.get_request(request_id)
             if request:
                 context.user_data['request_data'] = request
             else:
@@ -637,9 +636,7 @@ async def time_start_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data["edited_fields"] = list(dict.fromkeys(context.user_data["edited_fields"]))
             request_id = context.user_data.get('status_request_id')
             if request_id:
-                data_to_save = context.user_data['request_data'].copy()
-                data_to_save['edited_fields'] = ','.join(context.user_data['edited_fields'])
-                update_request_fields(request_id, data_to_save)
+                edit_buffer.stage(request_id, {field: context.user_data['request_data'][field]}, context.user_data['edited_fields'])
             keyboard = [
                 [InlineKeyboardButton("✅ Подтвердить", callback_data="confirm_edit")],
                 [InlineKeyboardButton("✏️ Редактировать", callback_data="edit_request")],
@@ -669,7 +666,7 @@ async def time_end_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         request_id = context.user_data.get('status_request_id'
         )
         if request_id:
-            request = get_request_full(request_id)
+            request = await edit_buffer.get_request(request_id)
             if request:
                 context.user_data['request_data'] = request
             else:
@@ -710,9 +707,7 @@ async def time_end_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data["edited_fields"] = list(dict.fromkeys(context.user_data["edited_fields"]))
             request_id = context.user_data.get('status_request_id')
             if request_id:
-                data_to_save = context.user_data['request_data'].copy()
-                data_to_save['edited_fields'] = ','.join(context.user_data['edited_fields'])
-                update_request_fields(request_id, data_to_save)
+                edit_buffer.stage(request_id, {field: context.user_data['request_data'][field]}, context.user_data['edited_fields'])
             keyboard = [
                 [InlineKeyboardButton("✅ Подтвердить", callback_data="confirm_edit")],
                 [InlineKeyboardButton("✏️ Редактировать", callback_data="edit_request")],
@@ -742,7 +737,7 @@ async def people_count_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if 'request_data' not in context.user_data or not context.user_data['request_data']:
             request_id = context.user_data.get('status_request_id')
             if request_id:
-                request = get_request_full(request_id)
+                request = await edit_buffer.get_request(request_id)
                 if request:
                     context.user_data['request_data'] = request
                 else:
@@ -767,9 +762,7 @@ async def people_count_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
             request_id = context.user_data.get('status_request_id'
             )
             if request_id:
-                data_to_save = context.user_data['request_data'].copy()
-                data_to_save['edited_fields'] = ','.join(context.user_data['edited_fields'])
-                update_request_fields(request_id, data_to_save)
+                edit_buffer.stage(request_id, {field: context.user_data['request_data'][field]}, context.user_data['edited_fields'])
             keyboard = [
                 [InlineKeyboardButton("✅ Подтвердить", callback_data="confirm_edit")],
                 [InlineKeyboardButton("✏️ Редактировать", callback_data="edit_request")],
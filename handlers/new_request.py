@@ -10,16 +10,24 @@ from keyboards.checkpoint import get_checkpoint_keyboard, get_checkpoint_names
 from keyboards.people_count import get_people_count_keyboard
 from keyboards.dates import get_dates_keyboard
 from time_picker import TimePicker
-from repositories.request_repo import save_request, STATUS_NEW, get_request_full
+from repositories.async_request_repo import save_request, STATUS_NEW, get_request_full
 from config import DIVISION, DIRECTION, CHECKPOINT, DATE_START, DATE_END, TIME_START, TIME_END, CAR_BRAND, PEOPLE_COUNT, LEADER_NAME, CARGO, PURPOSE, ADMIN_CHAT_ID, MENU
 from keyboards.main_menu import get_user_reply_keyboard
 from config import ROLE_USER
 from handlers.admin.admin_users import check_blocked
 from handlers.admin.admin_requests import admin_requests_entry, get_admin_request_text_and_keyboard
 from utils.request_time import is_allowed_request_time, get_time_limits_str
+from services import journal
 
 EDIT_FIELD = "EDIT_FIELD"
 
+# Ответ пользователю, если заявка принята в локальный журнал (БД недоступна)
+JOURNALED_TEXT = (
+    "📄 Ваша заявка принята.\n"
+    "Сейчас нет связи с базой данных: заявка будет зарегистрирована автоматически, "
+    "номер придёт отдельным сообщением."
+)
+
 # Кнопки для выбора поля
 def get_edit_fields_keyboard():
     fields = [
@@ -430,11 +438,14 @@ async def confirm_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text(
             f"Приём заявок возможен только {get_time_limits_str()}.")
         return ConversationHandler.END
-    request_id = save_request(context.user_data, query.from_user.id, status=STATUS_NEW)
+    request_id = await save_request(context.user_data, query.from_user.id, status=STATUS_NEW)
     if not request_id:
+        if await journal.submit_request(context.user_data, query.from_user.id, STATUS_NEW):
+            await query.edit_message_text(JOURNALED_TEXT)
+            return ConversationHandler.END
         await query.edit_message_text("Ошибка при сохранении заявки. Попробуйте позже.")
         return ConversationHandler.END
-    request = get_request_full(request_id)
+    request = await get_request_full(request_id)
     context.user_data['request_data'] = request
     # Формируем текст и клавиатуру через функцию
     text, keyboard = await get_admin_request_text_and_keyboard(request)
@@ -493,7 +504,9 @@ async def edit_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Если редактируем существующую заявку, подгружаем данные
     request_id = context.user_data.get('status_request_id')
     if request_id:
-        request = get_request_full(request_id)
+        from services import edit_buffer
+        # Вместе с правками, ещё не записанными в БД
+        request = await edit_buffer.get_request(request_id)
         if request:
             # Заполняем user_data для редактирования
             for k in ['division','direction','checkpoint','date_start','date_end','time_start','time_end','car_brand','people_count','leader_name','cargo','purpose']:
@@ -588,11 +601,11 @@ async def after_edit(update, context):
     # Добавляем поле, если его нет в списке
     if field and field not in context.user_data["edited_fields"]:
         context.user_data["edited_fields"].append(field)
-    # --- Сохраняем изменения сразу в БД, если редактируется существующая заявка ---
+    # --- Правка существующей заявки копится в буфере и записывается при подтверждении ---
     request_id = context.user_data.get('status_request_id')
-    if request_id:
-        from repositories.request_repo import update_request_fields
-        update_request_fields(request_id, context.user_data)
+    if request_id and field:
+        from services import edit_buffer
+        edit_buffer.stage(request_id, {field: context.user_data.get(field)}, context.user_data["edited_fields"])
     # --- конец блока сохранения ---
     keyboard = [
         [InlineKeyboardButton("✅ Подтвердить", callback_data="confirm_request")],
@@ -690,12 +703,15 @@ async def confirm_free_form(update: Update, context: ContextTypes.DEFAULT_TYPE):
         'cargo': '',
         'purpose': text
     }
-    request_id = save_request(user_data, user_id, status=STATUS_NEW)
+    request_id = await save_request(user_data, user_id, status=STATUS_NEW)
     if not request_id:
+        if await journal.submit_request(user_data, user_id, STATUS_NEW):
+            await query.edit_message_text(JOURNALED_TEXT)
+            return ConversationHandler.END
         await query.edit_message_text("Ошибка при сохранении заявки. Попробуйте позже.")
         return ConversationHandler.END
     # Формируем текст и inline-кнопки для администратора
-    request = get_request_full(request_id)
+    request = await get_request_full(request_id)
     text_admin, keyboard = await get_admin_request_text_and_keyboard(request)
     await context.bot.send_message(chat_id=ADMIN_CHAT_ID, text=text_admin, reply_markup=keyboard)
     # Отправляем главное меню новым сообщением
@@ -720,13 +736,15 @@ async def new_request_entry(update, context):
     # Получаем id заявки из user_data (например, context.user_data['status_request_id'])
     request_id = context.user_data.get('status_request_id')
     if request_id:
-        from repositories.request_repo import get_request_full
-        request = get_request_full(request_id)
+        from services import edit_buffer
+        # Вместе с правками, ещё не записанными в БД
+        request = await edit_buffer.get_request(request_id)
         if request:
             # Заполняем user_data для редактирования
             for k in ['division','direction','checkpoint','date_start','date_end','time_start','time_end','car_brand','people_count','leader_name','cargo','purpose']:
                 context.user_data[k] = request.get(k)
-            context.user_data['edited_fields'] = []
+            # Уже отредактированные поля, чтобы подсветка не терялась при следующих правках
+            context.user_data['edited_fields'] = request.get('edited_fields', '').split(',') if request.get('edited_fields') else []
             await query.edit_message_text(
                 "Выберите поле для редактирования:",
                 reply_markup=get_edit_fields_keyboard()
@@ -748,7 +766,7 @@ async def ask_request_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_request_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     request_id = update.message.text.strip()
-    request = get_request_full(request_id)
+    request = await get_request_full(request_id)
     if not request:
         await update.message.reply_text(
             f"Заявка с номером {request_id} не найдена.",
@@ -1,9 +1,11 @@
 ﻿from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
-from repositories.request_repo import get_request_full, update_request_status, STATUS_COMPLETED, STATUS_CANCELLED, get_requests_for_operator_by_date_range
+from repositories.async_request_repo import get_request_full, update_request_status, STATUS_COMPLETED, STATUS_CANCELLED, get_operator_requests_page, search_requests_by_leader, get_request_for_viewer, is_free_form, is_archived
+from repositories import outbox_repo
+from services import journal, notifier
 from config import ADMIN_CHAT_ID
 from datetime import datetime, timedelta
-from keyboards.operator.menu import get_operator_reply_keyboard, get_operator_view_inline_keyboard
+from keyboards.operator.menu import get_operator_reply_keyboard, get_operator_view_inline_keyboard, get_operator_feed_keyboard
 from utils.date_utils import format_date_for_display, format_time_for_display
 
 OPERATOR_REQUEST_ACTION = 400
@@ -12,14 +14,12 @@ OPERATOR_VIEW_MENU = 410
 OPERATOR_VIEW_LEADER = 411
 OPERATOR_VIEW_ID = 412
 
+# Лента заявок оператора: заявок на странице и запас до лимита Telegram (4096 символов)
+OPERATOR_FEED_PAGE_SIZE = 5
+OPERATOR_FEED_TEXT_LIMIT = 3900
+
 def format_operator_request_text(request):
-    template_fields = [
-        'division', 'direction', 'checkpoint', 'date_start', 'date_end',
-        'time_start', 'time_end', 'car_brand', 'people_count',
-        'leader_name', 'cargo'
-    ]
-    is_free_form = all(not request.get(f) for f in template_fields) and request.get('purpose')
-    if is_free_form:
+    if is_free_form(request):
         return f"Заявка #{request['id']} (Статус: {request.get('status', '')})\n{request.get('purpose', '')}"
     edited_fields = request.get('edited_fields', [])
     if isinstance(edited_fields, str):
@@ -49,7 +49,10 @@ def format_operator_request_text(request):
     return "\n".join(lines)
 
 async def send_request_to_operator(context, operator_id, request_id):
-    request = get_request_full(request_id)
+    """Отправить оператору карточку заявки. False — заявку не удалось прочитать."""
+    request = await get_request_full(request_id)
+    if not request:
+        return False
     text = format_operator_request_text(request)
     # Если заявка в статусе Продублировать, показываем специальную кнопку и обязательно показываем все поля заявки
     if request.get('status') == 'Продублировать':
@@ -63,44 +66,56 @@ async def send_request_to_operator(context, operator_id, request_id):
             [InlineKeyboardButton("❌ Отменить", callback_data=f"operator_cancel_{request_id}")]
         ]
         await context.bot.send_message(chat_id=operator_id, text=text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="HTML")
+    return True
 
 def log_and_return_false(msg):
     return False
 
+async def complete_request(query, request_id, done_text):
+    """
+    Исполнение заявки оператором: статус и уведомления пользователю и администратору
+    сохраняются одной транзакцией, отправляет их services.notifier.
+    """
+    request = await get_request_full(request_id)
+    if not request and not await journal.db_unavailable():
+        await query.edit_message_text(f"Ошибка: заявка не найдена.")
+        return ConversationHandler.END
+    if request and is_archived(request):
+        await query.edit_message_text(f"Заявка #{request_id} закрыта и перенесена в архив, изменить её нельзя.")
+        return ConversationHandler.END
+    # Без связи с БД заявку не прочитать: chat_id None — пользователь заявки, определится при переносе журнала
+    messages = [
+        outbox_repo.message(request['user_id'] if request else None, f"Ваша заявка #{request_id} {done_text} оператором."),
+        outbox_repo.message(ADMIN_CHAT_ID, f"Заявка #{request_id} {done_text} оператором."),
+    ]
+    note = ""
+    if request and await update_request_status(request_id, STATUS_COMPLETED, outbox=messages):
+        notifier.wake()
+    elif await journal.change_status(request_id, STATUS_COMPLETED, outbox=messages):
+        note = "\n(нет связи с БД: статус сохранится автоматически)"
+    else:
+        await query.edit_message_text("Ошибка: не удалось обновить статус заявки.")
+        return ConversationHandler.END
+    try:
+        text = ""
+        if request:
+            request['status'] = STATUS_COMPLETED
+            text = "\n\n" + format_operator_request_text(request)
+        await query.edit_message_text(f"Заявка #{request_id} {done_text}.{note}{text}", parse_mode="HTML")
+    except Exception:
+        pass
+    return ConversationHandler.END
+
 async def operator_request_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     data = query.data
     if data.startswith("operator_confirm_"):
         request_id = int(data.split('_')[2])
-        result = update_request_status(request_id, STATUS_COMPLETED)
-        request = get_request_full(request_id)
-        if not request:
-            await query.edit_message_text(f"Ошибка: заявка не найдена.")
-            return ConversationHandler.END
-        try:
-            text = format_operator_request_text(request)
-            await query.edit_message_text(f"Заявка #{request_id} исполнена.\n\n{text}", parse_mode="HTML")
-            await context.bot.send_message(chat_id=request['user_id'], text=f"Ваша заявка #{request_id} исполнена оператором.")
-            await context.bot.send_message(chat_id=ADMIN_CHAT_ID, text=f"Заявка #{request_id} исполнена оператором.")
-        except Exception:
-            pass
-        return ConversationHandler.END
+        return await complete_request(query, request_id, "исполнена")
     elif data.startswith("operator_duplicate_"):
         request_id = int(data.split('_')[2])
-        result = update_request_status(request_id, STATUS_COMPLETED)
-        request = get_request_full(request_id)
-        if not request:
-            await query.edit_message_text(f"Ошибка: заявка не найдена.")
-            return ConversationHandler.END
-        try:
-            text = format_operator_request_text(request)
-            await query.edit_message_text(f"Заявка #{request_id} продублирована и исполнена.\n\n{text}", parse_mode="HTML")
-            await context.bot.send_message(chat_id=request['user_id'], text=f"Ваша заявка #{request_id} продублирована и исполнена оператором.")
-            await context.bot.send_message(chat_id=ADMIN_CHAT_ID, text=f"Заявка #{request_id} продублирована и исполнена оператором.")
-        except Exception:
-            pass
-        return ConversationHandler.END
+        return await complete_request(query, request_id, "продублирована и исполнена")
     elif data.startswith("operator_cancel_"):
         request_id = int(data.split('_')[2])
         context.user_data['operator_cancel_request_id'] = request_id
@@ -120,22 +135,26 @@ async def operator_request_reason(update: Update, context: ContextTypes.DEFAULT_
         return ConversationHandler.END
 
     reason = update.message.text
-    request = get_request_full(request_id)
-    if not request:
+    request = await get_request_full(request_id)
+    if not request and not await journal.db_unavailable():
         await update.message.reply_text("Ошибка: заявка не найдена.")
         return ConversationHandler.END
-
-    result = update_request_status(request_id, STATUS_CANCELLED)
-    if not result:
-        await update.message.reply_text("Ошибка: не удалось обновить статус заявки.")
+    if request and is_archived(request):
+        await update.message.reply_text(f"Заявка #{request_id} закрыта и перенесена в архив, изменить её нельзя.")
         return ConversationHandler.END
 
-    try:
-        await context.bot.send_message(chat_id=request['user_id'], text=f"Ваша заявка #{request_id} отменена оператором. Причина: {reason}")
-        await context.bot.send_message(chat_id=ADMIN_CHAT_ID, text=f"Заявка #{request_id} отменена оператором. Причина: {reason}")
+    # Без связи с БД заявку не прочитать: chat_id None — пользователь заявки, определится при переносе журнала
+    messages = [
+        outbox_repo.message(request['user_id'] if request else None, f"Ваша заявка #{request_id} отменена оператором. Причина: {reason}"),
+        outbox_repo.message(ADMIN_CHAT_ID, f"Заявка #{request_id} отменена оператором. Причина: {reason}"),
+    ]
+    if request and await update_request_status(request_id, STATUS_CANCELLED, outbox=messages):
+        notifier.wake()
         await update.message.reply_text("Причина отмены отправлена.")
-    except Exception as e:
-        await update.message.reply_text(f"Ошибка при отправке уведомлений: {e}")
+    elif await journal.change_status(request_id, STATUS_CANCELLED, outbox=messages):
+        await update.message.reply_text("Отмена принята. Нет связи с БД: статус сохранится и причина будет отправлена автоматически.")
+    else:
+        await update.message.reply_text("Ошибка: не удалось обновить статус заявки.")
 
     return ConversationHandler.END
 
@@ -157,34 +176,94 @@ async def operator_view_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await query.edit_message_text("Введите номер заявки:")
         return OPERATOR_VIEW_ID
     elif data == "view_all_period":
-        operator_id = query.from_user.id
         today = datetime.now().date()
         date_from = (today - timedelta(days=1)).strftime("%Y-%m-%d")
         date_to = (today + timedelta(days=1)).strftime("%Y-%m-%d")
-        requests = get_requests_for_operator_by_date_range(operator_id, date_from, date_to)
+        # Период запоминается, чтобы листание не сдвигалось после полуночи
+        context.user_data['operator_feed_period'] = (date_from, date_to)
+        requests, has_next = await get_operator_requests_page(date_from, date_to, limit=OPERATOR_FEED_PAGE_SIZE)
         if not requests:
             await query.edit_message_text("Заявок за последние 2 дня и на 2 дня вперед не найдено.", reply_markup=get_operator_reply_keyboard())
             return ConversationHandler.END
-        for req in requests:
-            text = format_operator_request_text(req)
-            await query.message.reply_text(text, parse_mode="HTML")
-        await query.message.reply_text("Вы вернулись в меню оператора.", reply_markup=get_operator_reply_keyboard())
+        text, keyboard = build_operator_feed_page(requests, has_prev=False, has_next=has_next)
+        await query.edit_message_text(text, reply_markup=keyboard, parse_mode="HTML")
         return ConversationHandler.END
 
+def build_operator_feed_page(requests, has_prev, has_next, backward=False, prefix="opfeed"):
+    """
+    Текст одной страницы ленты и клавиатура навигации.
+    Если карточки не помещаются в сообщение, лишние переносятся на соседнюю
+    страницу: при листании назад отбрасываются самые ранние, вперёд — самые поздние.
+    """
+    cards = []
+    length = 0
+    ordered = list(reversed(requests)) if backward else list(requests)
+    shown = []
+    for req in ordered:
+        card = format_operator_request_text(req)[:OPERATOR_FEED_TEXT_LIMIT]
+        if shown and length + len(card) + 2 > OPERATOR_FEED_TEXT_LIMIT:
+            if backward:
+                has_prev = True
+            else:
+                has_next = True
+            break
+        shown.append(req)
+        cards.append(card)
+        length += len(card) + 2
+    if backward:
+        shown.reverse()
+        cards.reverse()
+    keyboard = get_operator_feed_keyboard(shown[0]['id'], shown[-1]['id'], has_prev, has_next, prefix)
+    return "\n\n".join(cards), keyboard
+
+async def _fetch_operator_page(prefix, context, after_id=None, before_id=None):
+    if prefix == "oplead":
+        search = context.user_data.get('operator_leader_search')
+        if not search:
+            return [], False
+        date_from, date_to = search['period']
+        return await search_requests_by_leader(search['leader'], date_from, date_to, after_id=after_id,
+                                               before_id=before_id, limit=OPERATOR_FEED_PAGE_SIZE)
+    period = context.user_data.get('operator_feed_period')
+    if not period:
+        today = datetime.now().date()
+        period = ((today - timedelta(days=1)).strftime("%Y-%m-%d"), (today + timedelta(days=1)).strftime("%Y-%m-%d"))
+    date_from, date_to = period
+    return await get_operator_requests_page(date_from, date_to, after_id=after_id, before_id=before_id,
+                                            limit=OPERATOR_FEED_PAGE_SIZE)
+
+async def operator_feed_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листание ленты заявок и результатов поиска (кнопки «Назад»/«Вперёд»): редактируется то же сообщение."""
+    query = update.callback_query
+    prefix, direction, boundary = query.data.split('_')
+    boundary = int(boundary)
+    backward = direction == 'prev'
+    if backward:
+        requests, has_prev = await _fetch_operator_page(prefix, context, before_id=boundary)
+        has_next = True
+    else:
+        requests, has_next = await _fetch_operator_page(prefix, context, after_id=boundary)
+        has_prev = True
+    if not requests:
+        await query.answer("Больше заявок нет.")
+        return
+    await query.answer()
+    text, keyboard = build_operator_feed_page(requests, has_prev, has_next, backward=backward, prefix=prefix)
+    await query.edit_message_text(text, reply_markup=keyboard, parse_mode="HTML")
+
 async def operator_view_leader(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    operator_id = update.effective_user.id
     leader = update.message.text.strip().lower()
     today = datetime.now().date()
     date_from = (today - timedelta(days=30)).strftime("%Y-%m-%d")
     date_to = (today + timedelta(days=30)).strftime("%Y-%m-%d")
-    requests = get_requests_for_operator_by_date_range(operator_id, date_from, date_to)
-    filtered = [r for r in requests if leader in (r.get('leader_name') or '').lower()]
-    if not filtered:
+    # Поиск выполняется в БД, сюда приходит только страница найденных заявок
+    context.user_data['operator_leader_search'] = {'leader': leader, 'period': (date_from, date_to)}
+    requests, has_next = await search_requests_by_leader(leader, date_from, date_to, limit=OPERATOR_FEED_PAGE_SIZE)
+    if not requests:
         await update.message.reply_text("Заявки по данному старшему не найдены.", reply_markup=get_operator_reply_keyboard())
         return ConversationHandler.END
-    for req in filtered:
-        text = format_operator_request_text(req)
-        await update.message.reply_text(text, parse_mode="HTML")
+    text, keyboard = build_operator_feed_page(requests, has_prev=False, has_next=has_next, prefix="oplead")
+    await update.message.reply_text(text, reply_markup=keyboard, parse_mode="HTML")
     await update.message.reply_text("Вы вернулись в меню оператора.", reply_markup=get_operator_reply_keyboard())
     return ConversationHandler.END
 
@@ -197,13 +276,12 @@ async def operator_view_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
     today = datetime.now().date()
     date_from = (today - timedelta(days=30)).strftime("%Y-%m-%d")
     date_to = (today + timedelta(days=30)).strftime("%Y-%m-%d")
-    requests = get_requests_for_operator_by_date_range(operator_id, date_from, date_to)
-    filtered = [r for r in requests if str(r['id']) == req_id]
-    if not filtered:
+    # Заявка видна оператору, если назначена ему или попадает в период ±30 дней
+    request = await get_request_for_viewer(int(req_id), operator_id=operator_id, date_from=date_from, date_to=date_to)
+    if not request:
         await update.message.reply_text("Заявка с таким номером не найдена.", reply_markup=get_operator_reply_keyboard())
         return ConversationHandler.END
-    for req in filtered:
-        text = format_operator_request_text(req)
-        await update.message.reply_text(text, parse_mode="HTML")
+    text = format_operator_request_text(request)
+    await update.message.reply_text(text, parse_mode="HTML")
     await update.message.reply_text("Вы вернулись в меню оператора.", reply_markup=get_operator_reply_keyboard())
     return ConversationHandler.END
@@ -4,7 +4,7 @@
 
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
-from db import Database
+from db_async import AsyncDatabase
 from keyboards.main_menu import get_user_reply_keyboard, get_user_main_menu
 from keyboards.admin.menu import get_admin_main_menu
 from keyboards.operator.menu import get_operator_reply_keyboard
@@ -18,15 +18,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
 
     user = update.effective_user
-    # Получаем текущую роль из БД
-    current_role = Database.get_user_role(user.id)
-    if current_role == 'user':
-        # Если пользователь новый, добавляем с ролью user
-        Database.set_user(user.id, user.username, user.full_name or user.mention_html(), role=ROLE_USER)
-    else:
-        # Если пользователь уже есть, не меняем роль!
-        Database.set_user(user.id, user.username, user.full_name or user.mention_html(), role=current_role)
-    role = Database.get_user_role(user.id)
+    # Новый пользователь добавляется с ролью user, у существующего роль не меняется
+    profile = await AsyncDatabase.register_or_touch_user(user.id, user.username, user.full_name or user.mention_html())
+    role = profile['role']
     context.user_data['role'] = role
 
     # Открываем меню в зависимости от роли
@@ -4,7 +4,7 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ConversationHandler, ContextTypes, CallbackQueryHandler
 from db import Database
-from repositories.request_repo import get_request_status, get_request_full, update_request_status, STATUS_EDITED, STATUS_DUPLICATED, STATUS_CANCELLED
+from repositories.async_request_repo import get_request_status, get_request_full, get_request_for_viewer, update_request_status, STATUS_EDITED, STATUS_DUPLICATED, STATUS_CANCELLED
 from keyboards.main_menu import get_user_reply_keyboard
 from utils.date_utils import format_date_for_display, format_time_for_display
 from handlers.admin.admin_users import check_blocked
@@ -12,21 +12,6 @@ from handlers.admin.admin_users import check_blocked
 STATUS_REQUEST_ID = "STATUS_REQUEST_ID"
 STATUS_ACTION = "STATUS_ACTION"
 
-def is_free_form_request(request):
-    template_fields = [
-        'division','direction','checkpoint','date_start','date_end',
-        'time_start','time_end','car_brand','people_count','leader_name','cargo'
-    ]
-    for k in template_fields:
-        v = request.get(k)
-        if k == 'people_count':
-            if v not in [None, '', '-', 0, '0']:
-                return False
-        else:
-            if v not in [None, '', '-']:
-                return False
-    return bool(request.get('purpose'))
-
 async def ask_request_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if await check_blocked(update, context):
         return ConversationHandler.END
@@ -43,22 +28,16 @@ async def show_request_status(update: Update, context: ContextTypes.DEFAULT_TYPE
         reply_markup=get_user_reply_keyboard()
         return ConversationHandler.END
     request_id = int(request_id)
-    request = get_request_full(request_id)
     user_id = update.effective_user.id  # Получаем user_id пользователя
+    # Пользователь может просматривать только свои заявки: проверка выполняется в запросе
+    request = await get_request_for_viewer(request_id, user_id=user_id)
     if not request:
         await update.message.reply_text(
-            f"Заявка с номером {request_id} не найдена.\n"
+            f"Заявка с номером {request_id} не найдена среди ваших заявок.\n"
             f"Вы вернулись в главное меню.\n",
             reply_markup=get_user_reply_keyboard()
         )
         return ConversationHandler.END
-    # Проверка: пользователь может просматривать только свои заявки
-    if str(request.get('user_id')) != str(user_id):
-        await update.message.reply_text(
-            "Вы можете просматривать только свои заявки.\nВы вернулись в главное меню.",
-            reply_markup=get_user_reply_keyboard()
-        )
-        return ConversationHandler.END
     context.user_data['status_request_id'] = request_id
     context.user_data['request_data'] = request
     from handlers.edit_request import is_free_form_request, format_free_form_request
@@ -111,7 +90,7 @@ async def status_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     request_id = context.user_data.get('status_request_id')
-    request = context.user_data.get('request_data') or get_request_full(request_id)
+    request = context.user_data.get('request_data') or await get_request_full(request_id)
     from handlers.edit_request import is_free_form_request, format_free_form_request
     if query.data == "select_request":
         if request and is_free_form_request(request):
@@ -157,11 +136,11 @@ async def status_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
         from handlers.new_request import edit_request
         return await edit_request(update, context)
     elif query.data == "duplicate_request":
-        update_request_status(request_id, STATUS_DUPLICATED)
+        await update_request_status(request_id, STATUS_DUPLICATED)
         await query.edit_message_text(f"Заявка #{request_id} переведена в статус 'Продублированная'.")
         return ConversationHandler.END
     elif query.data == "cancel_request":
-        update_request_status(request_id, STATUS_CANCELLED)
+        await update_request_status(request_id, STATUS_CANCELLED)
         await query.edit_message_text(f"Заявка #{request_id} отменена.")
         return ConversationHandler.END
     else:
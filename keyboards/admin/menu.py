@@ -1,7 +1,7 @@
 ﻿# keyboards/admin/menu.py
 # Клавиатура для главного меню администратора.
 
-from telegram import ReplyKeyboardMarkup
+from telegram import ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 
 def get_admin_main_menu():
     return ReplyKeyboardMarkup([
@@ -35,3 +35,32 @@ def get_admin_export_menu():
         ["За период"],
         ["↩️ Назад"]
     ], resize_keyboard=True)
+
+# Клавиатура массовой обработки заявок: отметки заявок и действия над отмеченными
+def get_bulk_requests_keyboard(requests, selected):
+    rows = []
+    for request in requests:
+        mark = "☑️" if request['id'] in selected else "⬜️"
+        label = f"{mark} #{request['id']} {request['status']}"
+        if request.get('leader_name'):
+            label += f" · {request['leader_name']}"
+        rows.append([InlineKeyboardButton(label, callback_data=f"bulk_toggle_{request['id']}")])
+    rows.append([
+        InlineKeyboardButton("Выбрать все", callback_data="bulk_all"),
+        InlineKeyboardButton("Снять все", callback_data="bulk_none"),
+    ])
+    rows.append([
+        InlineKeyboardButton(f"👤 Назначить оператору ({len(selected)})", callback_data="bulk_assign"),
+        InlineKeyboardButton(f"❌ Отменить ({len(selected)})", callback_data="bulk_cancel"),
+    ])
+    rows.append([InlineKeyboardButton("✖️ Закрыть", callback_data="bulk_close")])
+    return InlineKeyboardMarkup(rows)
+
+# Выбор оператора для отмеченных заявок
+def get_bulk_operator_keyboard(operators):
+    rows = [
+        [InlineKeyboardButton(f"{op['full_name']} (@{op['username']})", callback_data=f"bulk_operator_{op['user_id']}")]
+        for op in operators
+    ]
+    rows.append([InlineKeyboardButton("↩️ Назад", callback_data="bulk_back")])
+    return InlineKeyboardMarkup(rows)
@@ -5,6 +5,16 @@ def get_operator_reply_keyboard():
         ["🔍 Просмотр заявок"]
     ], resize_keyboard=True)
 
+def get_operator_feed_keyboard(first_id, last_id, has_prev, has_next, prefix="opfeed"):
+    # Навигация по ленте заявок: в callback_data граница текущей страницы
+    # prefix: opfeed — заявки за период, oplead — поиск по старшему
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"{prefix}_prev_{first_id}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton("Вперёд ➡️", callback_data=f"{prefix}_next_{last_id}"))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
 def get_operator_view_inline_keyboard():
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("👤 По старшему", callback_data="view_by_leader")],
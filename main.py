@@ -3,7 +3,8 @@
 # Здесь настраиваются обработчики команд, диалогов и запускается polling.
 
 import logging
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, filters
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, TypeHandler, filters
 from config import TOKEN, MENU, DIVISION, DIRECTION, CHECKPOINT, DATE_START, DATE_END, TIME_START, TIME_END, CAR_BRAND, PEOPLE_COUNT, LEADER_NAME, CARGO, PURPOSE, ADMIN_CHAT_ID
 from handlers.start import start, cancel, user_menu_create_request
 from handlers.new_request import new_request, date_start, date_end, handle_time, car_brand, people_count, manual_people_count, leader_name, cargo, purpose, free_form_request, confirm_request, edit_request, confirm_free_form, edit_free_form, edit_field, after_edit as after_edit_new, EDIT_FIELD, division_create, direction_create, checkpoint_create, cancel_request as cancel_new_request
@@ -12,20 +13,29 @@ from handlers.status import ask_request_id, show_request_status
 from handlers.new_request import new_request_entry
 from keyboards.main_menu import handle_back
 from handlers.admin.conv_admin import conv_admin
+from handlers.admin.admin_bulk import conv_bulk
+from services import archiver, edit_buffer, journal, notifier
+import db
 from handlers.admin.admin_requests import admin_request_action, admin_operator_select, admin_request_reason, ADMIN_REQUEST_ACTION, ADMIN_OPERATOR_SELECT, ADMIN_REQUEST_REASON
 from handlers.admin.admin_commands import (
     admin_restart_command, admin_hard_restart_command, 
-    admin_broadcast_command, show_users_command, refresh_operators_command
+    admin_broadcast_command, show_users_command, refresh_operators_command,
+    db_stats_command, history_command, stats_command
 )
 from handlers.operator.operator_requests import (
     operator_request_action, operator_request_reason,
     operator_view_requests, operator_view_menu,
-    operator_view_leader, operator_view_id,
+    operator_view_leader, operator_view_id, operator_feed_page,
     OPERATOR_REQUEST_ACTION, OPERATOR_REQUEST_REASON, OPERATOR_VIEW_MENU, OPERATOR_VIEW_LEADER, OPERATOR_VIEW_ID
 )
 
 logger = logging.getLogger(__name__)
 
+# Запоминаем пользователя апдейта для запросов к БД: после своей записи
+# он читает с основного сервера, а не с реплики (см. Database.get_read_connection)
+async def set_db_actor(update, context):
+    db.current_actor.set(update.effective_user.id if update.effective_user else None)
+
 # Обработчик выбора способа создания заявки
 async def menu_choice(update, context):
     text = update.message.text
@@ -61,7 +71,25 @@ async def menu_choice(update, context):
 # Точка входа: настройка приложения и запуск polling
 def main():
     logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
-    app = Application.builder().token(TOKEN).build()
+    # Правки заявок, не записанные в БД до остановки бота
+    edit_buffer.recover()
+
+    async def post_init(application):
+        # Отправка уведомлений из очереди outbox, в том числе оставшихся с прошлого запуска
+        await notifier.start(application)
+        # Перенос в БД заявок и смен статуса, принятых без связи с БД
+        await journal.start(application)
+        # Перенос старых закрытых заявок в архив (если задан ARCHIVE_AFTER_MONTHS)
+        await archiver.start(application)
+
+    async def post_shutdown(application):
+        await notifier.stop()
+        await journal.stop()
+        await archiver.stop()
+        await edit_buffer.flush_all()
+
+    app = Application.builder().token(TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
+    app.add_handler(TypeHandler(Update, set_db_actor), group=-1)
     app.add_handler(CommandHandler('start', start))
     app.add_handler(CommandHandler('cancel', cancel))
     app.add_handler(CommandHandler('restart', admin_restart_command))
@@ -69,6 +97,13 @@ def main():
     app.add_handler(CommandHandler('broadcast', admin_broadcast_command))
     app.add_handler(CommandHandler('show_users', show_users_command))
     app.add_handler(CommandHandler('refresh_operators', refresh_operators_command))
+    app.add_handler(CommandHandler('db_stats', db_stats_command))
+    app.add_handler(CommandHandler('history', history_command))
+    app.add_handler(CommandHandler('stats', stats_command))
+    # Листание ленты заявок оператора и поиска по старшему; граница страницы передаётся в callback_data
+    app.add_handler(CallbackQueryHandler(operator_feed_page, pattern=r"^(opfeed|oplead)_(next|prev)_\d+$"))
+    # Массовая обработка заявок администратором (/bulk)
+    app.add_handler(conv_bulk)
     
     # ConversationHandler для обработки действий оператора (подтвердить/отменить/продублировать)
     conv_operator_action = ConversationHandler(
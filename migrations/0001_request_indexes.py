@@ -0,0 +1,35 @@
+# migrations/0001_request_indexes.py
+# Вторичные индексы для основных запросов к заявкам и пользователям.
+# Существующие индексы не пересоздаются, поэтому миграцию можно запустить снова после сбоя.
+
+import logging
+
+logger = logging.getLogger('db')
+
+# (таблица, индекс, колонки)
+INDEXES = (
+    # Выборка заявок оператора по диапазону дат
+    ('requests', 'idx_requests_date_start', 'date_start'),
+    # Поиск заявок по статусу с сортировкой по дате создания
+    ('requests', 'idx_requests_status_created', 'status, created_at'),
+    # Заявки конкретного пользователя
+    ('requests', 'idx_requests_user_id', 'user_id'),
+    # Заявки, назначенные оператору
+    ('requests', 'idx_requests_operator_id', 'operator_id'),
+    # Список операторов (WHERE role = ...)
+    ('users', 'idx_users_role', 'role'),
+)
+
+
+def upgrade(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT DISTINCT TABLE_NAME, INDEX_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ('requests', 'users')
+        """)
+        existing = {(row[0], row[1]) for row in cursor.fetchall()}
+        for table, name, columns in INDEXES:
+            if (table, name) not in existing:
+                logger.info(f"[0001] Создаём индекс {name}")
+                cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    conn.commit()
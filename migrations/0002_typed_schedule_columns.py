@@ -0,0 +1,144 @@
+# migrations/0002_typed_schedule_columns.py
+# Перевод date_start/date_end в DATE и time_start/time_end в TIME.
+# Старые строковые значения ('дд.мм', 'YYYY-MM-DD', 'ЧЧ:ММ') переносятся пачками
+# по правилам utils.date_utils на момент миграции (копия ниже — миграция не зависит
+# от текущего кода), затем строковые колонки заменяются типизированными.
+# Базы, созданные из дампа (колонки уже DATE/TIME), не изменяются.
+
+import logging
+from datetime import datetime, date, timedelta
+
+logger = logging.getLogger('db')
+
+BATCH_SIZE = 1000
+
+
+def parse_date(value, reference=None):
+    # 'YYYY-MM-DD', 'дд.мм.гггг', 'дд.мм.гг'; для 'дд.мм' год — от reference (дня подачи),
+    # дата больше чем на полгода в прошлом — следующий год
+    if value is None or value == '':
+        return None
+    text = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d.%m.%Y", "%d.%m.%y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    try:
+        day_month = datetime.strptime(text, "%d.%m")
+    except ValueError:
+        return None
+    reference = reference or date.today()
+    if isinstance(reference, datetime):
+        reference = reference.date()
+    try:
+        result = day_month.replace(year=reference.year).date()
+        if result < reference - timedelta(days=183):
+            result = result.replace(year=reference.year + 1)
+    except ValueError:
+        # 29.02 в невисокосном году
+        return None
+    return result
+
+
+def parse_time(value):
+    # 'ЧЧ:ММ' или 'ЧЧ:ММ:СС'
+    if value is None or value == '':
+        return None
+    text = str(value).strip()
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            return datetime.strptime(text, fmt).time()
+        except ValueError:
+            pass
+    return None
+
+
+COLUMNS = {
+    'date_start': ('DATE', parse_date),
+    'date_end': ('DATE', parse_date),
+    'time_start': ('TIME', parse_time),
+    'time_end': ('TIME', parse_time),
+}
+
+
+def _column_types(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'requests'
+        """)
+        return {name: data_type.lower() for name, data_type in cursor.fetchall()}
+
+
+def _has_index(conn, name):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT 1 FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'requests' AND INDEX_NAME = %s
+        """, (name,))
+        return bool(cursor.fetchall())
+
+
+def _copy_values(conn, pending):
+    # Перенос значений пачками по первичному ключу, чтобы не держать
+    # длинную транзакцию и блокировки на всей таблице
+    last_id = 0
+    converted = failed = 0
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, created_at, {', '.join(pending)} FROM requests WHERE id > %s ORDER BY id LIMIT %s",
+                (last_id, BATCH_SIZE))
+            rows = cursor.fetchall()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            row_id, created_at, raw_values = row[0], row[1], row[2:]
+            values = []
+            for column, raw in zip(pending, raw_values):
+                parser = COLUMNS[column][1]
+                value = parser(raw, created_at) if parser is parse_date else parser(raw)
+                if value is None and raw not in (None, ''):
+                    failed += 1
+                    logger.warning(f"[0002] Заявка #{row_id}: не удалось распознать {column}={raw!r}")
+                values.append(value)
+            updates.append((*values, row_id))
+            converted += 1
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE requests SET {', '.join(f'{c}_typed = %s' for c in pending)} WHERE id = %s",
+                updates)
+        conn.commit()
+        last_id = rows[-1][0]
+    logger.info(f"[0002] Перенесено заявок: {converted}, нераспознанных значений: {failed}")
+
+
+def upgrade(conn):
+    # Каждый шаг смотрит на текущее состояние колонок, поэтому миграцию,
+    # прерванную посередине, можно просто запустить снова
+    types = _column_types(conn)
+    pending = [c for c, (sql_type, _) in COLUMNS.items() if c in types and types[c] != sql_type.lower()]
+    to_add = [c for c in pending if f"{c}_typed" not in types]
+    if to_add:
+        with conn.cursor() as cursor:
+            cursor.execute("ALTER TABLE requests " + ", ".join(
+                f"ADD COLUMN {c}_typed {COLUMNS[c][0]} NULL" for c in to_add))
+    if pending:
+        # Значения переносятся заново целиком: после сбоя перенос мог остаться неполным
+        _copy_values(conn, pending)
+        with conn.cursor() as cursor:
+            cursor.execute("ALTER TABLE requests " + ", ".join(f"DROP COLUMN {c}" for c in pending))
+    # Строковая колонка уже удалена, а типизированная ещё не переименована
+    to_rename = [c for c in COLUMNS if f"{c}_typed" in _column_types(conn)]
+    if to_rename:
+        with conn.cursor() as cursor:
+            cursor.execute("ALTER TABLE requests " + ", ".join(
+                f"CHANGE COLUMN {c}_typed {c} {COLUMNS[c][0]} NULL" for c in to_rename))
+    if not pending and not to_rename:
+        logger.info("[0002] Колонки дат и времени уже типизированы")
+    if not _has_index(conn, 'idx_requests_date_start'):
+        # Индекс из 0001 удалён вместе со строковой колонкой
+        with conn.cursor() as cursor:
+            cursor.execute("CREATE INDEX idx_requests_date_start ON requests (date_start)")
@@ -0,0 +1,32 @@
+# migrations/0003_request_version.py
+# Колонки version и updated_at в requests: по ним видно, какую редакцию заявки
+# держит кэш, и когда заявка менялась последний раз.
+# Базы, где колонки уже есть (созданы create_tables), не изменяются.
+
+import logging
+
+logger = logging.getLogger('db')
+
+COLUMNS = {
+    'version': "INT NOT NULL DEFAULT 0",
+    'updated_at': "TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP",
+}
+
+
+def upgrade(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'requests'
+        """)
+        existing = {row[0] for row in cursor.fetchall()}
+        pending = [c for c in COLUMNS if c not in existing]
+        if not pending:
+            logger.info("[0003] Колонки version/updated_at уже есть")
+            return
+        cursor.execute("ALTER TABLE requests " + ", ".join(
+            f"ADD COLUMN {c} {COLUMNS[c]}" for c in pending))
+        if 'updated_at' in pending:
+            # Для существующих заявок точкой отсчёта считается дата создания
+            cursor.execute("UPDATE requests SET updated_at = created_at")
+    conn.commit()
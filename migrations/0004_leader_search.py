@@ -0,0 +1,37 @@
+# migrations/0004_leader_search.py
+# Поиск заявок по позывному старшего на стороне БД:
+# leader_name_norm — нормализованная копия leader_name (нижний регистр, без крайних
+# пробелов), вычисляется самой БД; по ней обычный индекс для поиска по началу строки.
+# FULLTEXT по leader_name — для поиска по началу любого слова в позывном.
+# Существующие колонки и индексы не пересоздаются.
+
+import logging
+
+logger = logging.getLogger('db')
+
+NORM_COLUMN = "leader_name_norm VARCHAR(255) AS (LOWER(TRIM(leader_name))) STORED"
+INDEXES = {
+    'idx_requests_leader_norm': "CREATE INDEX idx_requests_leader_norm ON requests (leader_name_norm)",
+    'ft_requests_leader_name': "CREATE FULLTEXT INDEX ft_requests_leader_name ON requests (leader_name)",
+}
+
+
+def upgrade(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'requests'
+        """)
+        columns = {row[0] for row in cursor.fetchall()}
+        if 'leader_name_norm' not in columns:
+            cursor.execute(f"ALTER TABLE requests ADD COLUMN {NORM_COLUMN}")
+        cursor.execute("""
+            SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'requests'
+        """)
+        indexes = {row[0] for row in cursor.fetchall()}
+        for name, ddl in INDEXES.items():
+            if name not in indexes:
+                logger.info(f"[0004] Создаём индекс {name}")
+                cursor.execute(ddl)
+    conn.commit()
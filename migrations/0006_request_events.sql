@@ -0,0 +1,14 @@
+-- История изменений заявок: одна строка на каждое изменение (repositories/event_repo.py)
+-- idx_request_events_request — история заявки N, idx_request_events_ts — события за период
+
+CREATE TABLE IF NOT EXISTS request_events (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    request_id INT NOT NULL,
+    from_status VARCHAR(32) NULL,
+    to_status VARCHAR(32) NOT NULL,
+    actor BIGINT NULL,
+    changed_fields VARCHAR(255) NULL,
+    ts DATETIME NOT NULL,
+    INDEX idx_request_events_request (request_id, id),
+    INDEX idx_request_events_ts (ts, to_status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
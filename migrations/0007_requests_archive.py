@@ -0,0 +1,62 @@
+# migrations/0007_requests_archive.py
+# Архив закрытых заявок requests_archive (repositories/archive_repo.py).
+# Колонки как у requests, плюс archived_at; первичный ключ (id, created_at),
+# потому что в MySQL колонка секционирования должна входить в каждый уникальный ключ.
+# Секции по месяцу created_at: p_old — всё до первого месяца заявок, дальше
+# p_YYYYMM (добавляет archive_repo.ensure_partitions) и pmax.
+
+import logging
+from datetime import date
+
+logger = logging.getLogger('db')
+
+
+def month_start(day, months_back=0):
+    # Копия archive_repo.month_start на момент миграции: миграция не зависит от текущего кода
+    index = day.year * 12 + day.month - 1 - months_back
+    return date(index // 12, index % 12 + 1, 1)
+
+
+TABLE = """
+    CREATE TABLE IF NOT EXISTS requests_archive (
+        id INT NOT NULL,
+        user_id BIGINT NOT NULL,
+        division VARCHAR(255),
+        direction VARCHAR(255),
+        checkpoint VARCHAR(255),
+        date_start DATE,
+        date_end DATE,
+        time_start TIME,
+        time_end TIME,
+        car_brand VARCHAR(255),
+        people_count INT,
+        leader_name VARCHAR(255),
+        cargo TEXT,
+        purpose TEXT,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NULL,
+        status VARCHAR(32) NOT NULL,
+        edited_fields TEXT,
+        reason TEXT,
+        operator_id BIGINT,
+        version INT NOT NULL DEFAULT 0,
+        archived_at DATETIME NOT NULL,
+        PRIMARY KEY (id, created_at),
+        INDEX idx_requests_archive_user_id (user_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    PARTITION BY RANGE COLUMNS (created_at) (
+        PARTITION p_old VALUES LESS THAN ('{first:%Y-%m-%d}'),
+        PARTITION p_{first:%Y%m} VALUES LESS THAN ('{second:%Y-%m-%d}'),
+        PARTITION pmax VALUES LESS THAN (MAXVALUE)
+    )
+"""
+
+
+def upgrade(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT MIN(created_at) FROM requests")
+        oldest = cursor.fetchone()[0]
+        first = month_start(oldest.date() if oldest else date.today())
+        logger.info(f"[0007] Создаём requests_archive, секции с {first:%Y-%m}")
+        cursor.execute(TABLE.format(first=first, second=month_start(first, -1)))
+    conn.commit()
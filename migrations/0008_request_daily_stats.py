@@ -0,0 +1,46 @@
+# migrations/0008_request_daily_stats.py
+# Сводка заявок по дням request_daily_stats (repositories/stats_repo.py)
+# и её первоначальное заполнение по requests и requests_archive.
+# Дальше сводку поддерживают функции request_repo при каждом изменении заявки.
+
+import logging
+
+logger = logging.getLogger('db')
+
+TABLE = """
+    CREATE TABLE IF NOT EXISTS request_daily_stats (
+        stat_date DATE NOT NULL,
+        checkpoint VARCHAR(255) NOT NULL DEFAULT '',
+        direction VARCHAR(255) NOT NULL DEFAULT '',
+        status VARCHAR(32) NOT NULL,
+        request_count INT NOT NULL DEFAULT 0,
+        people_sum INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (stat_date, checkpoint, direction, status)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+# Заполнение, как stats_repo.rebuild на момент миграции: день — date_start,
+# для заявок без него — день подачи
+FILL = """
+    INSERT INTO request_daily_stats (stat_date, checkpoint, direction, status, request_count, people_sum)
+    SELECT COALESCE(date_start, DATE(created_at)), COALESCE(checkpoint, ''), COALESCE(direction, ''), status,
+           COUNT(*), SUM(COALESCE(people_count, 0))
+    FROM (
+        SELECT date_start, created_at, checkpoint, direction, status, people_count FROM requests
+        UNION ALL
+        SELECT date_start, created_at, checkpoint, direction, status, people_count FROM requests_archive
+    ) AS all_requests
+    GROUP BY 1, 2, 3, 4
+    ON DUPLICATE KEY UPDATE
+        request_count = request_count + VALUES(request_count),
+        people_sum = people_sum + VALUES(people_sum)
+"""
+
+
+def upgrade(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(TABLE)
+    logger.info("[0008] Заполняем сводку заявок по дням")
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM request_daily_stats")
+        cursor.execute(FILL)
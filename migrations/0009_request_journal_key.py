@@ -0,0 +1,24 @@
+# migrations/0009_request_journal_key.py
+# journal_key — ключ записи локального журнала (services/journal.py), по которому
+# заявка, принятая без связи с БД, сохраняется ровно один раз при воспроизведении.
+# У заявок, поданных при доступной БД, колонка NULL (уникальность NULL не ограничивает).
+
+import logging
+
+logger = logging.getLogger('db')
+
+
+def upgrade(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'requests'
+        """)
+        columns = {row[0] for row in cursor.fetchall()}
+        if 'journal_key' not in columns:
+            logger.info("[0009] Добавляем requests.journal_key")
+            cursor.execute(
+                "ALTER TABLE requests ADD COLUMN journal_key CHAR(36) NULL, "
+                "ADD UNIQUE INDEX uq_requests_journal_key (journal_key)"
+            )
+    conn.commit()
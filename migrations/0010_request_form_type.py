@@ -0,0 +1,77 @@
+# migrations/0010_request_form_type.py
+# form_type — вид заявки: 'template' (по образцу) или 'free' (свободная форма, только purpose).
+# Раньше вид определялся по пустым полям образца при каждом чтении, и лента оператора
+# выбирала все заявки в свободной форме за всё время. Теперь он задаётся при сохранении
+# (request_repo.detect_form_type), а заявки в свободной форме отбираются по created_at
+# через индекс (form_type, created_at).
+# Существующие заявки (и архив) размечаются пачками по первичному ключу по тому же правилу.
+
+import logging
+
+logger = logging.getLogger('db')
+
+# Правило request_repo.detect_form_type на момент миграции
+FORM_FREE = 'free'
+TEMPLATE_FIELDS = (
+    'division', 'direction', 'checkpoint', 'date_start', 'date_end',
+    'time_start', 'time_end', 'car_brand', 'people_count', 'leader_name', 'cargo'
+)
+
+BATCH_SIZE = 1000
+COLUMN = "form_type VARCHAR(16) NOT NULL DEFAULT 'template'"
+INDEX = "CREATE INDEX idx_requests_form_created ON requests (form_type, created_at)"
+
+
+def _columns(conn, table):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,))
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _backfill(conn, table):
+    # Помечаются только заявки в свободной форме, остальные — по образцу (значение по умолчанию)
+    last_id = 0
+    marked = 0
+    while True:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(
+                f"SELECT id, purpose, {', '.join(TEMPLATE_FIELDS)} FROM {table} "
+                f"WHERE id > %s ORDER BY id LIMIT %s",
+                (last_id, BATCH_SIZE))
+            rows = cursor.fetchall()
+        if not rows:
+            break
+        free_ids = [
+            row['id'] for row in rows
+            if row['purpose'] and not any(row[field] for field in TEMPLATE_FIELDS)
+        ]
+        if free_ids:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {table} SET form_type = %s WHERE id IN ({', '.join(['%s'] * len(free_ids))})",
+                    (FORM_FREE, *free_ids))
+        conn.commit()
+        marked += len(free_ids)
+        last_id = rows[-1]['id']
+    logger.info(f"[0010] {table}: заявок в свободной форме: {marked}")
+
+
+def upgrade(conn):
+    for table in ('requests', 'requests_archive'):
+        if 'form_type' not in _columns(conn, table):
+            logger.info(f"[0010] Добавляем {table}.form_type")
+            with conn.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {COLUMN}")
+        _backfill(conn, table)
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'requests'
+        """)
+        if 'idx_requests_form_created' not in {row[0] for row in cursor.fetchall()}:
+            logger.info("[0010] Создаём индекс idx_requests_form_created")
+            cursor.execute(INDEX)
+    conn.commit()
@@ -0,0 +1,32 @@
+# migrations/0011_widen_checkpoint_columns.py
+# direction и checkpoint в requests_archive (0007) и request_daily_stats (0008) были
+# созданы уже, чем в рабочей requests (varchar(255)): более длинное значение
+# останавливало перенос в архив и обновление сводки. Колонки расширяются до 255,
+# если они уже; базы, где 0007/0008 применены с новыми размерами, не изменяются.
+
+import logging
+
+logger = logging.getLogger('db')
+
+WIDTH = 255
+COLUMNS = {
+    'requests_archive': {'direction': 'NULL', 'checkpoint': 'NULL'},
+    'request_daily_stats': {'direction': "NOT NULL DEFAULT ''", 'checkpoint': "NOT NULL DEFAULT ''"},
+}
+
+
+def upgrade(conn):
+    with conn.cursor() as cursor:
+        for table, columns in COLUMNS.items():
+            cursor.execute("""
+                SELECT COLUMN_NAME, CHARACTER_MAXIMUM_LENGTH FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            """, (table,))
+            widths = dict(cursor.fetchall())
+            narrow = [c for c in columns if c in widths and widths[c] < WIDTH]
+            if not narrow:
+                continue
+            logger.info(f"[0011] Расширяем {table}: {', '.join(narrow)} до VARCHAR({WIDTH})")
+            cursor.execute(f"ALTER TABLE {table} " + ", ".join(
+                f"MODIFY COLUMN {c} VARCHAR({WIDTH}) {columns[c]}" for c in narrow))
+    conn.commit()
@@ -0,0 +1,97 @@
+# migrations/__init__.py
+# Версионные миграции схемы БД.
+# Файлы миграций лежат в этом каталоге и называются NNNN_описание.sql или NNNN_описание.py,
+# применяются строго по возрастанию номера, применённые версии хранятся в таблице schema_version.
+# В .py-миграции должна быть функция upgrade(conn).
+
+import importlib.util
+import logging
+import os
+import re
+from db import Database
+
+logger = logging.getLogger('db')
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+_FILE_RE = re.compile(r'^(\d{4})_(\w+)\.(sql|py)$')
+
+
+def list_migrations():
+    """Список (version, name, path) всех файлов миграций по возрастанию версии."""
+    found = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        m = _FILE_RE.match(filename)
+        if m:
+            found.append((int(m.group(1)), m.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    found.sort()
+    versions = [v for v, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Повторяющиеся номера миграций: {versions}")
+    return found
+
+
+def split_sql(text):
+    """Разбивает SQL-файл на отдельные запросы, отбрасывая комментарии '--'."""
+    lines = [line for line in text.splitlines() if not line.strip().startswith('--')]
+    return [stmt.strip() for stmt in '\n'.join(lines).split(';') if stmt.strip()]
+
+
+def _run_migration(conn, path):
+    if path.endswith('.sql'):
+        with open(path, encoding='utf-8') as f:
+            statements = split_sql(f.read())
+        with conn.cursor() as cursor:
+            for stmt in statements:
+                cursor.execute(stmt)
+    else:
+        spec = importlib.util.spec_from_file_location(f"migration_{os.path.basename(path)[:-3]}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(conn)
+
+
+def get_applied_versions(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT version FROM schema_version")
+        versions = {row[0] for row in cursor.fetchall()}
+    conn.commit()
+    return versions
+
+
+def apply_migrations():
+    """
+    Применяет все ещё не применённые миграции по порядку.
+    Возвращает список применённых версий или None при ошибке.
+    Миграция, завершившаяся ошибкой, не записывается в schema_version
+    и останавливает применение следующих.
+    """
+    conn = None
+    applied_now = []
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return None
+        applied = get_applied_versions(conn)
+        for version, name, path in list_migrations():
+            if version in applied:
+                continue
+            logger.info(f"Применяем миграцию {version:04d}_{name}")
+            _run_migration(conn, path)
+            with conn.cursor() as cursor:
+                cursor.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            applied_now.append(version)
+        return applied_now
+    except Exception as e:
+        logger.error(f"Ошибка при применении миграций (применены: {applied_now}): {e}")
+        return None
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
@@ -0,0 +1,34 @@
+# migrations/__main__.py
+# Запуск из командной строки:
+#   python -m migrations          — применить новые миграции
+#   python -m migrations check    — проверить планы основных запросов (код выхода 1 при деградации)
+
+import logging
+import sys
+from migrations import apply_migrations
+from migrations.explain_check import check_query_plans
+
+
+def main(argv):
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    if argv and argv[0] == 'check':
+        problems = check_query_plans()
+        if problems is None:
+            print("❌ Нет соединения с БД")
+            return 1
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            return 1
+        print("✅ Все основные запросы используют индексы")
+        return 0
+    applied = apply_migrations()
+    if applied is None:
+        print("❌ Ошибка при применении миграций, подробности в логе")
+        return 1
+    print(f"✅ Применено миграций: {len(applied)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
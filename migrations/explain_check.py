@@ -0,0 +1,113 @@
+# migrations/explain_check.py
+# Проверка планов выполнения основных запросов через EXPLAIN.
+# Для каждого запроса задано, какими индексами должна читаться каждая таблица.
+# Запрос считается деградировавшим, если MySQL читает таблицу полностью (type = ALL)
+# или выбирает другой индекс — в том числе когда подходящий индекс есть в possible_keys,
+# но оптимизатор его не берёт (типично для условий с OR).
+# На почти пустой таблице оптимизатор предпочитает полное чтение, поэтому проверку
+# запускают на базе с рабочим объёмом данных.
+
+import logging
+from datetime import date, timedelta
+from db import Database
+from config import ROLE_OPERATOR
+
+logger = logging.getLogger('db')
+
+# Заявки за период: ветки OR читаются по своим индексам (index_merge)
+PERIOD_KEYS = {'idx_requests_date_start', 'idx_requests_form_created'}
+
+
+def _hot_queries():
+    today = date.today()
+    date_from = today - timedelta(days=1)
+    date_to = today + timedelta(days=1)
+    return [
+        ("заявка по номеру", """
+            SELECT r.*, u.full_name
+            FROM requests r
+            LEFT JOIN users u ON r.user_id = u.user_id
+            WHERE r.id = %s
+        """, (1,), {'r': {'PRIMARY'}, 'u': {'PRIMARY'}}),
+        ("заявки оператора за период", """
+            SELECT * FROM requests
+            WHERE (
+                    date_start BETWEEN %s AND %s
+                    OR (form_type = 'free' AND created_at >= %s AND created_at < %s)
+                )
+            ORDER BY id ASC
+        """, (date_from, date_to, date_from, date_to + timedelta(days=1)), {'requests': PERIOD_KEYS}),
+        ("лента заявок оператора", """
+            SELECT id FROM requests
+            WHERE (
+                    date_start BETWEEN %s AND %s
+                    OR (form_type = 'free' AND created_at >= %s AND created_at < %s)
+                )
+                AND id > %s
+            ORDER BY id ASC
+            LIMIT 6
+        """, (date_from, date_to, date_from, date_to + timedelta(days=1), 0), {'requests': PERIOD_KEYS | {'PRIMARY'}}),
+        ("поиск по старшему", """
+            SELECT id FROM requests
+            WHERE MATCH(leader_name) AGAINST (%s IN BOOLEAN MODE)
+                AND (leader_name_norm LIKE %s ESCAPE '!' OR leader_name_norm LIKE %s ESCAPE '!')
+                AND date_start BETWEEN %s AND %s
+                AND id > %s
+            ORDER BY id ASC
+            LIMIT 6
+        """, ('+иван*', 'иван%', '% иван%', date_from, date_to, 0), {'requests': {'ft_requests_leader_name'}}),
+        ("поиск по началу слова позывного", """
+            SELECT id FROM requests
+            WHERE (leader_name_norm LIKE %s ESCAPE '!' OR leader_name_norm LIKE %s ESCAPE '!')
+                AND date_start BETWEEN %s AND %s
+            ORDER BY id ASC
+            LIMIT 6
+        """, ('ив%', '% ив%', date_from, date_to), {'requests': {'idx_requests_leader_norm', 'idx_requests_date_start'}}),
+        ("заявки по статусу", "SELECT id FROM requests WHERE status = %s ORDER BY created_at", ('Новая',),
+         {'requests': {'idx_requests_status_created'}}),
+        ("заявки пользователя", "SELECT id, status FROM requests WHERE user_id = %s", (0,),
+         {'requests': {'idx_requests_user_id'}}),
+        ("заявки оператора", "SELECT id, status FROM requests WHERE operator_id = %s", (0,),
+         {'requests': {'idx_requests_operator_id'}}),
+        ("список операторов", "SELECT user_id, username, full_name FROM users WHERE role = %s ORDER BY user_id", (ROLE_OPERATOR,),
+         {'users': {'idx_users_role'}}),
+        ("история заявки", "SELECT id, to_status FROM request_events WHERE request_id = %s ORDER BY id DESC LIMIT 50", (1,),
+         {'request_events': {'idx_request_events_request'}}),
+        ("смены статуса за период", """
+            SELECT to_status, COUNT(*) FROM request_events
+            WHERE ts >= %s AND ts < %s
+            GROUP BY to_status
+        """, (date_from, date_to), {'request_events': {'idx_request_events_ts'}}),
+    ]
+
+
+def check_query_plans():
+    """
+    Выполняет EXPLAIN для основных запросов.
+    Возвращает список описаний проблем (пустой, если всё в порядке)
+    или None, если нет соединения с БД.
+    """
+    conn = None
+    problems = []
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return None
+        with conn.cursor(dictionary=True) as cursor:
+            for name, query, params, expected in _hot_queries():
+                cursor.execute("EXPLAIN " + query, params)
+                for row in cursor.fetchall():
+                    table, key = row.get('table'), row.get('key')
+                    used = set(key.split(',')) if key else set()
+                    if row.get('type') == 'ALL':
+                        problems.append(f"{name}: полное чтение таблицы {table} "
+                                        f"(possible_keys={row.get('possible_keys')})")
+                    elif table in expected and not used <= expected[table]:
+                        problems.append(f"{name}: таблица {table} читается по key={key}, "
+                                        f"ожидается {', '.join(sorted(expected[table]))}")
+                    logger.info(f"[explain] {name}: table={row.get('table')} type={row.get('type')} "
+                                f"key={row.get('key')} rows={row.get('rows')}")
+        return problems
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
@@ -0,0 +1,162 @@
+# repositories/archive_repo.py
+# Архив закрытых заявок (таблица requests_archive).
+# Исполненные и отменённые заявки старше нескольких месяцев переносятся из requests
+# пачками: INSERT ... SELECT и DELETE одной транзакцией на пачку. Рабочая таблица
+# остаётся небольшой, а заявка по номеру ищется и в архиве (см. find_archived).
+# В MySQL архив разбит на секции по месяцу created_at (p_YYYYMM), новые секции
+# добавляются перед переносом (ensure_partitions). Саму requests так не разбить:
+# секционированные таблицы InnoDB не поддерживают FULLTEXT, а первичный ключ
+# пришлось бы расширить колонкой секционирования.
+
+import logging
+from datetime import date, datetime
+from db import Database
+
+logger = logging.getLogger(__name__)
+
+# Колонки, которые переносятся в архив (leader_name_norm вычисляется и в архиве не нужен)
+ARCHIVE_COLUMNS = (
+    'id', 'user_id', 'division', 'direction', 'checkpoint', 'date_start', 'date_end',
+    'time_start', 'time_end', 'car_brand', 'people_count', 'leader_name', 'cargo', 'purpose',
+    'created_at', 'updated_at', 'status', 'edited_fields', 'reason', 'operator_id', 'version',
+    'form_type'
+)
+
+
+def month_start(day, months_back=0):
+    """Первое число месяца, отстоящего от day на months_back месяцев назад."""
+    index = day.year * 12 + day.month - 1 - months_back
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(month):
+    return f"p_{month:%Y%m}"
+
+
+def ensure_partitions(conn, up_to_month):
+    """
+    Добавить в requests_archive секции по месяцам до up_to_month включительно
+    (секция pmax делится командой REORGANIZE; пока архив пишется только в прошлые
+    месяцы, она пуста, и деление ничего не копирует). DDL коммитит транзакцию,
+    поэтому вызывать до переноса. Для SQLite и несекционированной таблицы ничего не делает.
+    Возвращает список добавленных секций.
+    """
+    if Database.get_dialect() != 'mysql':
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'requests_archive'
+              AND PARTITION_NAME IS NOT NULL
+        """)
+        names = {row[0] for row in cursor.fetchall()}
+        months = sorted(name for name in names if name.startswith('p_') and name != 'p_old')
+        if 'pmax' not in names or not months:
+            return []
+        last = datetime.strptime(months[-1], 'p_%Y%m').date()
+        added = []
+        month = month_start(last, -1)
+        while month <= up_to_month:
+            added.append(month)
+            month = month_start(month, -1)
+        if not added:
+            return []
+        parts = [
+            f"PARTITION {_partition_name(month)} VALUES LESS THAN ('{month_start(month, -1):%Y-%m-%d}')"
+            for month in added
+        ]
+        cursor.execute(
+            f"ALTER TABLE requests_archive REORGANIZE PARTITION pmax INTO "
+            f"({', '.join(parts)}, PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+        )
+    logger.info(f"[archive] Добавлены секции архива: {[_partition_name(month) for month in added]}")
+    return [_partition_name(month) for month in added]
+
+
+def archive_batch(statuses, before, batch_size=500):
+    """
+    Перенести в архив одну пачку заявок в статусах statuses, созданных раньше before.
+    Возвращает число перенесённых заявок (0 — переносить больше нечего), None при ошибке.
+    """
+    conn = None
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return None
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT id FROM requests
+                WHERE status IN ({', '.join(['%s'] * len(statuses))}) AND created_at < %s
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE
+            """, (*statuses, before, batch_size))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                conn.rollback()
+                return 0
+            placeholders = ', '.join(['%s'] * len(ids))
+            columns = ', '.join(ARCHIVE_COLUMNS)
+            cursor.execute(
+                f"INSERT INTO requests_archive ({columns}, archived_at) "
+                f"SELECT {columns}, %s FROM requests WHERE id IN ({placeholders})",
+                (datetime.now(), *ids)
+            )
+            cursor.execute(f"DELETE FROM requests WHERE id IN ({placeholders})", ids)
+        conn.commit()
+        return len(ids)
+    except Exception as e:
+        logger.error(f"[archive] Ошибка при переносе заявок в архив: {e}")
+        return None
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def prepare_archive(before):
+    """Секции архива для месяцев до before (см. ensure_partitions); True, если архив готов к переносу."""
+    conn = None
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return False
+        ensure_partitions(conn, month_start(before, 1))
+        return True
+    except Exception as e:
+        logger.error(f"[archive] Ошибка при подготовке секций архива: {e}")
+        return False
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def find_archived(conn, request_id, conditions=("r.id = %s",), params=None):
+    """
+    Заявка из архива в том же виде, что SELECT r.*, u.full_name из requests.
+    conditions/params — условия по псевдониму r, как в request_repo.get_request_for_viewer.
+    """
+    with conn.cursor(dictionary=True) as cursor:
+        cursor.execute(f"""
+            SELECT r.*, u.full_name
+            FROM requests_archive r
+            LEFT JOIN users u ON r.user_id = u.user_id
+            WHERE {' AND '.join(conditions)}
+        """, tuple(params) if params is not None else (request_id,))
+        return cursor.fetchone()
+
+
+def get_archive_count():
+    conn = None
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return None
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM requests_archive")
+            return cursor.fetchone()[0]
+    except Exception as e:
+        logger.error(f"[archive] Ошибка при подсчёте архива: {e}")
+        return None
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
@@ -0,0 +1,89 @@
+# repositories/async_request_repo.py
+# Асинхронные версии функций request_repo для использования в обработчиках.
+# Каждая функция выполняет соответствующий синхронный запрос вне цикла событий.
+# Потоковые iter_all_users / iter_requests_by_date_range здесь не оборачиваются:
+# их целиком выполняют в потоке (run_sync(функция_выгрузки, ...)), не прерываясь на await.
+
+from db_async import run_sync
+from repositories import request_repo
+from repositories.request_repo import (
+    STATUS_NEW, STATUS_ON_REVIEW, STATUS_ON_CLARIFICATION, STATUS_COMPLETED,
+    STATUS_CANCELLED, STATUS_EDITED, STATUS_DUPLICATED, STATUS_IN_PROGRESS, ALL_STATUSES,
+    PENDING_STATUSES, BULK_UPDATED, BULK_SKIPPED, BULK_NOT_FOUND, BULK_FAILED,
+    FORM_TEMPLATE, FORM_FREE, is_free_form, is_archived
+)
+
+
+async def save_request(user_data, user_id, status=STATUS_NEW, journal_key=None, outbox=None):
+    return await run_sync(request_repo.save_request, user_data, user_id, status, journal_key, outbox)
+
+
+async def update_request_status(request_id, new_status, reason=None, outbox=None):
+    return await run_sync(request_repo.update_request_status, request_id, new_status, reason, outbox)
+
+
+async def get_request_status(request_id):
+    return await run_sync(request_repo.get_request_status, request_id)
+
+
+async def get_request_full(request_id):
+    return await run_sync(request_repo.get_request_full, request_id)
+
+
+async def get_request_for_viewer(request_id, user_id=None, operator_id=None, date_from=None, date_to=None):
+    return await run_sync(request_repo.get_request_for_viewer, request_id, user_id, operator_id, date_from, date_to)
+
+
+async def update_request_changes(request_id, changes):
+    return await run_sync(request_repo.update_request_changes, request_id, changes)
+
+
+async def get_all_users():
+    return await run_sync(request_repo.get_all_users)
+
+
+async def get_users_page(after_id=None, limit=500):
+    return await run_sync(request_repo.get_users_page, after_id, limit)
+
+
+async def iter_users(batch_size=500):
+    """
+    Все пользователи по одному для рассылки: пачки читаются отдельными
+    запросами, в памяти не больше batch_size пользователей.
+    """
+    after_id = None
+    while True:
+        users = await get_users_page(after_id, batch_size)
+        for user in users:
+            yield user
+        if len(users) < batch_size:
+            return
+        after_id = users[-1]['user_id']
+
+
+async def assign_operator(request_id, operator_id, new_status=None, outbox=None):
+    return await run_sync(request_repo.assign_operator, request_id, operator_id, new_status, outbox)
+
+
+async def bulk_update_status(request_ids, new_status, reason=None, from_statuses=None, outbox=None):
+    return await run_sync(request_repo.bulk_update_status, request_ids, new_status, reason, from_statuses, outbox)
+
+
+async def bulk_assign_operator(request_ids, operator_id, transitions=None, outbox=None):
+    return await run_sync(request_repo.bulk_assign_operator, request_ids, operator_id, transitions, outbox)
+
+
+async def get_pending_requests(limit=20):
+    return await run_sync(request_repo.get_pending_requests, limit)
+
+
+async def get_operator_requests_page(date_from, date_to, after_id=None, before_id=None, limit=5):
+    return await run_sync(request_repo.get_operator_requests_page, date_from, date_to, after_id, before_id, limit)
+
+
+async def search_requests_by_leader(leader, date_from, date_to, after_id=None, before_id=None, limit=5):
+    return await run_sync(request_repo.search_requests_by_leader, leader, date_from, date_to, after_id, before_id, limit)
+
+
+async def get_requests_for_operator_by_date_range(operator_id, date_from, date_to):
+    return await run_sync(request_repo.get_requests_for_operator_by_date_range, operator_id, date_from, date_to)
@@ -0,0 +1,113 @@
+# repositories/event_repo.py
+# История изменений заявок (таблица request_events, только добавление).
+# Событие пишут функции request_repo в той же транзакции, что и изменение заявки:
+# из какого статуса в какой, какие поля менялись, кто (db.current_actor) и когда.
+# Индексы: (request_id, id) — история заявки, (ts, to_status) — события за период.
+
+import logging
+from datetime import datetime
+from db import Database, current_actor
+
+logger = logging.getLogger(__name__)
+
+
+def _fields(changed_fields):
+    if not changed_fields:
+        return None
+    if isinstance(changed_fields, str):
+        return changed_fields[:255]
+    return ','.join(changed_fields)[:255]
+
+
+def record_before_update(conn, request_ids, to_status=None, changed_fields=None):
+    """
+    Записать события для заявок request_ids на соединении conn, без commit.
+    Вызывается ДО UPDATE: старый статус берётся из самой заявки, строки
+    блокируются до конца транзакции. to_status=None — статус не меняется.
+    """
+    if not request_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(request_ids))
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO request_events (request_id, from_status, to_status, actor, changed_fields, ts)
+            SELECT id, status, COALESCE(%s, status), %s, %s, %s
+            FROM requests WHERE id IN ({placeholders})
+            FOR UPDATE
+        """, (to_status, current_actor.get(), _fields(changed_fields), datetime.now(), *request_ids))
+
+
+def record(conn, events, ts=None):
+    """
+    Записать события с известными статусами, без commit.
+    events: список (request_id, from_status, to_status, changed_fields)
+    ts: время событий (по умолчанию — сейчас; для записей журнала — время из журнала)
+    """
+    if not events:
+        return
+    actor, now = current_actor.get(), ts or datetime.now()
+    with conn.cursor() as cursor:
+        for request_id, from_status, to_status, changed_fields in events:
+            cursor.execute(
+                "INSERT INTO request_events (request_id, from_status, to_status, actor, changed_fields, ts) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                (request_id, from_status, to_status, actor, _fields(changed_fields), now)
+            )
+
+
+def get_request_history(request_id, limit=50):
+    """События заявки от старых к новым (последние limit) с именем того, кто менял."""
+    def query(conn):
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute("""
+                SELECT e.id, e.from_status, e.to_status, e.actor, e.changed_fields, e.ts, u.full_name
+                FROM request_events e
+                LEFT JOIN users u ON u.user_id = e.actor
+                WHERE e.request_id = %s
+                ORDER BY e.id DESC
+                LIMIT %s
+            """, (request_id, limit))
+            return cursor.fetchall()
+    try:
+        rows = Database.run_read(query)
+        rows.reverse()
+        return rows
+    except Exception as e:
+        logger.error(f"Ошибка при получении истории заявки #{request_id}: {e}")
+        return []
+
+
+def get_status_change_counts(ts_from, ts_to):
+    """
+    Сколько раз заявки переходили в каждый статус за период [ts_from, ts_to):
+    {статус: число}. Правки без смены статуса не считаются.
+    """
+    def query(conn):
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute("""
+                SELECT to_status, COUNT(*) AS cnt
+                FROM request_events
+                WHERE ts >= %s AND ts < %s
+                  AND (from_status IS NULL OR from_status <> to_status)
+                GROUP BY to_status
+            """, (ts_from, ts_to))
+            return {row['to_status']: row['cnt'] for row in cursor.fetchall()}
+    try:
+        return Database.run_read(query)
+    except Exception as e:
+        logger.error(f"Ошибка при подсчёте смен статуса за период: {e}")
+        return {}
+
+
+def iter_events(ts_from, ts_to, batch_size=500):
+    """
+    Все события за период [ts_from, ts_to) по времени, по одному, без загрузки
+    в память (для отчётов). Генератор нужно дочитать без долгих пауз (см. Database.stream_rows).
+    """
+    for rows in Database.stream_rows("""
+        SELECT id, request_id, from_status, to_status, actor, changed_fields, ts
+        FROM request_events
+        WHERE ts >= %s AND ts < %s
+        ORDER BY ts, id
+    """, (ts_from, ts_to), batch_size):
+        yield from rows
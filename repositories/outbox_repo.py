@@ -0,0 +1,170 @@
+# repositories/outbox_repo.py
+# Очередь исходящих уведомлений (таблица outbox).
+# Уведомления записываются в той же транзакции, что и изменение заявки (enqueue),
+# поэтому сообщение уходит тогда и только тогда, когда изменение сохранено.
+# Отправляет их services.notifier в фоне, с повторами при ошибках.
+
+import json
+import logging
+from datetime import datetime, timedelta
+from db import Database
+
+logger = logging.getLogger(__name__)
+
+KIND_MESSAGE = 'message'                        # текст в чат
+KIND_REQUEST_TO_OPERATOR = 'request_to_operator'  # карточка заявки с кнопками оператору
+KIND_REQUEST_TO_ADMIN = 'request_to_admin'        # карточка новой заявки с кнопками администратору
+
+OUTBOX_PENDING = 'pending'
+OUTBOX_SENT = 'sent'
+OUTBOX_FAILED = 'failed'   # попытки исчерпаны или чат недоступен
+
+
+def message(chat_id, text, parse_mode=None):
+    return {'kind': KIND_MESSAGE, 'chat_id': chat_id, 'payload': {'text': text, 'parse_mode': parse_mode}}
+
+
+def request_to_operator(operator_id, request_id):
+    return {'kind': KIND_REQUEST_TO_OPERATOR, 'chat_id': operator_id, 'payload': {'request_id': int(request_id)}}
+
+
+def request_to_admin(admin_chat_id, request_id):
+    return {'kind': KIND_REQUEST_TO_ADMIN, 'chat_id': admin_chat_id, 'payload': {'request_id': int(request_id)}}
+
+
+def enqueue(conn, messages):
+    """
+    Добавить уведомления в очередь на соединении conn, без commit:
+    вызывающий коммитит их вместе со своим изменением.
+    """
+    if not messages:
+        return
+    now = datetime.now()
+    with conn.cursor() as cursor:
+        for item in messages:
+            cursor.execute(
+                "INSERT INTO outbox (kind, chat_id, payload, status, next_attempt_at) VALUES (%s, %s, %s, %s, %s)",
+                (item['kind'], item['chat_id'], json.dumps(item['payload'], ensure_ascii=False), OUTBOX_PENDING, now)
+            )
+
+
+def fetch_due(limit=50):
+    """Уведомления, которые пора отправить (по возрастанию id)."""
+    conn = None
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return []
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute("""
+                SELECT id, kind, chat_id, payload, attempts FROM outbox
+                WHERE status = %s AND next_attempt_at <= %s
+                ORDER BY id
+                LIMIT %s
+            """, (OUTBOX_PENDING, datetime.now(), limit))
+            rows = cursor.fetchall()
+        for row in rows:
+            row['payload'] = json.loads(row['payload'])
+        return rows
+    except Exception as e:
+        logger.error(f"Ошибка при чтении очереди уведомлений: {e}")
+        return []
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def mark_sent(outbox_ids):
+    if not outbox_ids:
+        return True
+    conn = None
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return False
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE outbox SET status = %s, sent_at = %s, attempts = attempts + 1 "
+                f"WHERE id IN ({', '.join(['%s'] * len(outbox_ids))})",
+                (OUTBOX_SENT, datetime.now(), *outbox_ids)
+            )
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при отметке отправленных уведомлений: {e}")
+        return False
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def mark_failed(outbox_id, error, retry_in=None):
+    """
+    Неудачная попытка отправки. retry_in: через сколько секунд повторить;
+    None — больше не пытаться (статус failed).
+    """
+    conn = None
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return False
+        with conn.cursor() as cursor:
+            if retry_in is None:
+                cursor.execute(
+                    "UPDATE outbox SET status = %s, attempts = attempts + 1, last_error = %s WHERE id = %s",
+                    (OUTBOX_FAILED, str(error)[:1000], outbox_id)
+                )
+            else:
+                cursor.execute(
+                    "UPDATE outbox SET attempts = attempts + 1, last_error = %s, next_attempt_at = %s WHERE id = %s",
+                    (str(error)[:1000], datetime.now() + timedelta(seconds=retry_in), outbox_id)
+                )
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при отметке неотправленного уведомления #{outbox_id}: {e}")
+        return False
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def purge_sent(older_than_days=7):
+    """Удалить отправленные уведомления старше older_than_days дней."""
+    conn = None
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return 0
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM outbox WHERE status = %s AND sent_at < %s",
+                (OUTBOX_SENT, datetime.now() - timedelta(days=older_than_days))
+            )
+            deleted = cursor.rowcount
+        conn.commit()
+        return deleted
+    except Exception as e:
+        logger.error(f"Ошибка при очистке очереди уведомлений: {e}")
+        return 0
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def get_outbox_counts():
+    """Число уведомлений по статусам: {'pending': n, 'sent': n, 'failed': n}."""
+    conn = None
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return {}
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute("SELECT status, COUNT(*) AS cnt FROM outbox GROUP BY status")
+            return {row['status']: row['cnt'] for row in cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"Ошибка при подсчёте очереди уведомлений: {e}")
+        return {}
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
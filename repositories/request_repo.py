@@ -1,14 +1,40 @@
 ﻿# repositories/request_repo.py
 # Модуль для работы с заявлениями (CRUD).
+# Каждое изменение заявки записывает событие в историю (event_repo) и обновляет
+# сводку по дням (stats_repo) той же транзакцией.
 # Сохраняет заявку в базу данных и возвращает её ID.
 # Добавлена поддержка статусов заявки.
+# Ленты, поиск и списки читают через Database.run_read (реплика, если настроена);
+# заявка по номеру для кэша и все изменения — через основной сервер.
+# Заявка по номеру ищется и в архиве закрытых заявок (archive_repo).
+# Вид заявки (form_type: по образцу / в свободной форме) определяется один раз при сохранении.
+# У заявок в свободной форме поля образца заполняются из текста, если он уверенно
+# разобран (utils.free_form), — такие заявки находятся теми же запросами, что и по образцу.
 
 import logging
-from db import Database
-from datetime import datetime
+import re
+from datetime import datetime, time, timedelta
+from cache import TTLCache
+from config import REQUEST_CACHE_CONFIG
+from db import Database, register_statement, on_pool_change
+from repositories import archive_repo, event_repo, outbox_repo, stats_repo
+from utils.date_utils import parse_date, parse_time
+from utils.free_form import parse_free_form
 
 logger = logging.getLogger(__name__)
 
+# Заявки по номеру: get_request_full вызывается на каждом шаге обработки заявки.
+# Любое изменение заявки через функции этого модуля сбрасывает её из кэша.
+_request_cache = TTLCache(**REQUEST_CACHE_CONFIG)
+on_pool_change(_request_cache.clear)
+
+def _request_key(request_id):
+    # Номер приходит и числом, и строкой из callback_data
+    try:
+        return int(request_id)
+    except (TypeError, ValueError):
+        return None
+
 # Статусы заявки
 STATUS_NEW = 'Новая'
 STATUS_ON_REVIEW = 'На проверке'
@@ -19,15 +45,99 @@ STATUS_EDITED = 'Отредактированная'
 STATUS_DUPLICATED = 'Продублировать'
 STATUS_IN_PROGRESS = 'В работе'
 ALL_STATUSES = [STATUS_NEW, STATUS_ON_REVIEW, STATUS_ON_CLARIFICATION, STATUS_COMPLETED, STATUS_CANCELLED, STATUS_EDITED, STATUS_DUPLICATED, STATUS_IN_PROGRESS]
+# Заявки, ожидающие решения администратора
+PENDING_STATUSES = (STATUS_NEW, STATUS_EDITED, STATUS_DUPLICATED)
+
+# Результаты массовых операций по каждой заявке
+BULK_UPDATED = 'updated'
+BULK_SKIPPED = 'skipped'      # статус заявки уже изменился, операция к ней не применима
+BULK_NOT_FOUND = 'not_found'
+BULK_FAILED = 'failed'        # ошибка БД, транзакция откачена целиком
+
+# Вид заявки (колонка form_type)
+FORM_TEMPLATE = 'template'
+FORM_FREE = 'free'       # только текст в purpose, без полей образца
+
+# Поля заявки по образцу
+TEMPLATE_FIELDS = (
+    'division', 'direction', 'checkpoint', 'date_start', 'date_end',
+    'time_start', 'time_end', 'car_brand', 'people_count', 'leader_name', 'cargo'
+)
+
+def detect_form_type(data):
+    """Вид заявки по заполненным полям: без полей образца, но с purpose — свободная форма."""
+    if not any(data.get(field) for field in TEMPLATE_FIELDS) and data.get('purpose'):
+        return FORM_FREE
+    return FORM_TEMPLATE
+
+def is_free_form(request):
+    """Заявка в свободной форме: по сохранённому form_type, для данных без него — по полям."""
+    return (request.get('form_type') or detect_form_type(request)) == FORM_FREE
+
+def is_archived(request):
+    """Заявка прочитана из архива (archive_repo.find_archived): она закрыта и не изменяется."""
+    return request.get('archived_at') is not None
+
+# Заявки периода: по образцу — по date_start, в свободной форме (date_start пуст) —
+# по дню подачи. Каждая ветка OR читается по своему индексу:
+# idx_requests_date_start и idx_requests_form_created (form_type, created_at).
+_PERIOD_CONDITION = (
+    "({p}date_start BETWEEN %s AND %s"
+    " OR ({p}form_type = %s AND {p}created_at >= %s AND {p}created_at < %s))"
+)
+
+def _period_condition(date_from, date_to, prefix=''):
+    """Условие «заявка относится к периоду [date_from, date_to]» и его параметры."""
+    return _PERIOD_CONDITION.format(p=prefix), [
+        date_from, date_to, FORM_FREE,
+        datetime.combine(date_from, time.min), datetime.combine(date_to + timedelta(days=1), time.min)
+    ]
+
+# Часто выполняемые запросы: готовятся один раз на соединение пула (db.register_statement)
+REQUEST_FULL_STATEMENT = register_statement('request_full', """
+    SELECT r.*, u.full_name
+    FROM requests r
+    LEFT JOIN users u ON r.user_id = u.user_id
+    WHERE r.id = %s
+""")
+REQUEST_STATUS_STATEMENT = register_statement(
+    'request_status', "SELECT status FROM requests WHERE id = %s"
+)
+UPDATE_STATUS_STATEMENT = register_statement(
+    'request_update_status', "UPDATE requests SET status = %s, version = version + 1 WHERE id = %s"
+)
+UPDATE_STATUS_REASON_STATEMENT = register_statement(
+    'request_update_status_reason',
+    "UPDATE requests SET status = %s, reason = %s, version = version + 1 WHERE id = %s"
+)
+
+def normalize_schedule(user_data):
+    """
+    Приводит даты и время заявки к значениям для колонок DATE/TIME.
+    Нераспознанные значения записываются как NULL (с предупреждением в логе).
+    """
+    values = []
+    for field, parser in (('date_start', parse_date), ('date_end', parse_date),
+                          ('time_start', parse_time), ('time_end', parse_time)):
+        raw = user_data.get(field)
+        parsed = parser(raw)
+        if parsed is None and raw not in (None, ''):
+            logger.warning(f"Не удалось распознать {field}: {raw!r}, сохраняется NULL")
+        values.append(parsed)
+    return tuple(values)
 
 # Сохраняет заявку с указанным статусом
 
-def save_request(user_data, user_id, status=STATUS_NEW):
+def save_request(user_data, user_id, status=STATUS_NEW, journal_key=None, outbox=None, created_at=None):
     """
     Сохраняет заявку в БД. Возвращает ID новой заявки.
     user_data: dict с данными заявки
     user_id: Telegram ID пользователя
     status: статус заявки
+    journal_key: ключ записи журнала (services/journal); заявка с этим ключом
+    сохраняется один раз, повторный вызов возвращает ID уже сохранённой
+    outbox: функция ID новой заявки -> уведомления, записываемые той же транзакцией
+    created_at: время подачи (для заявок из журнала — когда заявка была принята), по умолчанию сейчас
     """
     conn = None
     try:
@@ -35,44 +145,43 @@ def save_request(user_data, user_id, status=STATUS_NEW):
         if not conn:
             return None
         with conn.cursor() as cursor:
-            # Преобразуем даты к формату YYYY-MM-DD
-            date_start = user_data.get('date_start')
-            date_end = user_data.get('date_end')
-            def parse_date(date_str):
-                try:
-                    # Поддержка форматов 'дд.мм' и 'YYYY-MM-DD'
-                    if not date_str:
-                        return None
-                    if len(date_str) == 5 and '.' in date_str:
-                        return datetime.strptime(date_str, "%d.%m").replace(year=datetime.now().year).strftime("%Y-%m-%d")
-                    elif len(date_str) == 10 and '-' in date_str:
-                        # Уже в формате YYYY-MM-DD
-                        return date_str
-                    else:
-                        return date_str if date_str else None
-                except Exception:
-                    return date_str if date_str else None
-            date_start_fmt = parse_date(date_start) if date_start else None
-            date_end_fmt = parse_date(date_end) if date_end else None
+            if journal_key is not None:
+                cursor.execute("SELECT id FROM requests WHERE journal_key = %s", (journal_key,))
+                row = cursor.fetchone()
+                if row:
+                    return row[0]
+            form_type = detect_form_type(user_data)
+            if form_type == FORM_FREE:
+                user_data = {**user_data, **(parse_free_form(user_data.get('purpose')) or {})}
+            # Даты и время приводятся к типам колонок DATE/TIME
+            date_start_fmt, date_end_fmt, time_start_fmt, time_end_fmt = normalize_schedule(user_data)
             # edited_fields всегда пустой при создании новой заявки
             edited_fields = ''
             query = """
                 INSERT INTO requests (
                     user_id, division, direction, checkpoint,
                     date_start, date_end, time_start, time_end,
-                    car_brand, people_count, leader_name, cargo, purpose, status, edited_fields
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    car_brand, people_count, leader_name, cargo, purpose, status, edited_fields, journal_key,
+                    form_type, created_at
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+                          COALESCE(%s, CURRENT_TIMESTAMP))
             """
             values = (
                 user_id,
                 user_data.get('division'), user_data.get('direction'), user_data.get('checkpoint'),
-                date_start_fmt, date_end_fmt, user_data.get('time_start'), user_data.get('time_end'),
+                date_start_fmt, date_end_fmt, time_start_fmt, time_end_fmt,
                 user_data.get('car_brand'), user_data.get('people_count'), user_data.get('leader_name'),
-                user_data.get('cargo'), user_data.get('purpose'), status, edited_fields
+                user_data.get('cargo'), user_data.get('purpose'), status, edited_fields, journal_key,
+                form_type, created_at
             )
             cursor.execute(query, values)
+            request_id = cursor.lastrowid
+            event_repo.record(conn, [(request_id, None, status, None)], created_at)
+            stats_repo.apply_change(conn, [request_id])
+            if outbox:
+                outbox_repo.enqueue(conn, outbox(request_id))
             conn.commit()
-            return cursor.lastrowid
+            return request_id
     except Exception as e:
         logger.error(f"Ошибка при сохранении заявки: {e}")
         return None
@@ -82,9 +191,11 @@ def save_request(user_data, user_id, status=STATUS_NEW):
 
 # Функция для смены статуса заявки
 
-def update_request_status(request_id, new_status, reason=None):
+def update_request_status(request_id, new_status, reason=None, outbox=None):
     """
     Обновляет статус заявки по её ID. Если указана причина отмены, сохраняет её.
+    outbox: уведомления (outbox_repo.message / request_to_operator), которые
+    записываются в очередь той же транзакцией, что и статус.
     """
     if new_status not in ALL_STATUSES:
         raise ValueError(f"Недопустимый статус: {new_status}")
@@ -93,13 +204,22 @@ def update_request_status(request_id, new_status, reason=None):
         conn = Database.get_connection()
         if not conn:
             return False
-        with conn.cursor() as cursor:
-            if reason is not None:
-                cursor.execute("UPDATE requests SET status = %s, reason = %s WHERE id = %s", (new_status, reason, request_id))
-            else:
-                cursor.execute("UPDATE requests SET status = %s WHERE id = %s", (new_status, request_id))
-            conn.commit()
-            return True
+        event_repo.record_before_update(conn, [request_id], new_status, ['reason'] if reason is not None else None)
+        stats_before = stats_repo.snapshot(conn, [request_id])
+        if reason is not None:
+            updated = Database.execute_statement(conn, UPDATE_STATUS_REASON_STATEMENT, (new_status, reason, request_id))
+        else:
+            updated = Database.execute_statement(conn, UPDATE_STATUS_STATEMENT, (new_status, request_id))
+        if not updated:
+            # Заявки нет в requests (например, перенесена в архив): уведомлять не о чем
+            conn.rollback()
+            logger.warning(f"Заявка #{request_id} не найдена среди действующих, статус не изменён")
+            return False
+        stats_repo.apply_change(conn, [request_id], stats_before)
+        outbox_repo.enqueue(conn, outbox)
+        conn.commit()
+        _request_cache.invalidate(_request_key(request_id))
+        return True
     except Exception as e:
         logger.error(f"Ошибка при обновлении статуса заявки: {e}")
         return False
@@ -107,6 +227,56 @@ def update_request_status(request_id, new_status, reason=None):
         if conn and conn.is_connected():
             conn.close()
 
+def apply_journaled_status(request_id, new_status, reason, ts, outbox=None):
+    """
+    Смена статуса, принятая в журнал (services/journal) при недоступной БД.
+    Применяется, только если заявку не меняли начиная с ts — времени записи в журнал
+    (повторный перенос того же журнала тоже пропускается); событие истории пишется с временем ts.
+    outbox: уведомления; chat_id None — пользователю заявки (при записи в журнал он мог быть неизвестен).
+    Возвращает BULK_UPDATED, BULK_SKIPPED, BULK_NOT_FOUND или BULK_FAILED.
+    """
+    if new_status not in ALL_STATUSES:
+        raise ValueError(f"Недопустимый статус: {new_status}")
+    conn = None
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return BULK_FAILED
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute("SELECT id, user_id, status FROM requests WHERE id = %s FOR UPDATE", (request_id,))
+            row = cursor.fetchone()
+            if not row:
+                conn.rollback()
+                return BULK_NOT_FOUND
+            cursor.execute("SELECT MAX(ts) AS last_ts FROM request_events WHERE request_id = %s", (request_id,))
+            last_ts = cursor.fetchone()['last_ts']
+            if isinstance(last_ts, str):
+                last_ts = datetime.fromisoformat(last_ts)
+            if last_ts is not None and last_ts >= ts:
+                conn.rollback()
+                return BULK_SKIPPED
+        event_repo.record(conn, [(request_id, row['status'], new_status, ['reason'] if reason is not None else None)], ts)
+        stats_before = stats_repo.snapshot(conn, [request_id])
+        if reason is not None:
+            Database.execute_statement(conn, UPDATE_STATUS_REASON_STATEMENT, (new_status, reason, request_id))
+        else:
+            Database.execute_statement(conn, UPDATE_STATUS_STATEMENT, (new_status, request_id))
+        stats_repo.apply_change(conn, [request_id], stats_before)
+        if outbox:
+            outbox_repo.enqueue(conn, [
+                dict(item, chat_id=row['user_id'] if item['chat_id'] is None else item['chat_id'])
+                for item in outbox
+            ])
+        conn.commit()
+        _request_cache.invalidate(_request_key(request_id))
+        return BULK_UPDATED
+    except Exception as e:
+        logger.error(f"Ошибка при переносе смены статуса заявки #{request_id} из журнала: {e}")
+        return BULK_FAILED
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
 # Функция для получения статуса заявки
 
 def get_request_status(request_id):
@@ -115,10 +285,11 @@ def get_request_status(request_id):
         conn = Database.get_connection()
         if not conn:
             return None
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT status FROM requests WHERE id = %s", (request_id,))
-            row = cursor.fetchone()
-            return row['status'] if row else None
+        rows = Database.execute_statement(conn, REQUEST_STATUS_STATEMENT, (request_id,))
+        if rows:
+            return rows[0]['status']
+        archived = archive_repo.find_archived(conn, request_id)
+        return archived['status'] if archived else None
     except Exception as e:
         logger.error(f"Ошибка при получении статуса заявки: {e}")
         return None
@@ -127,85 +298,135 @@ def get_request_status(request_id):
             conn.close()
 
 def get_request_full(request_id):
+    """
+    Заявка со всеми полями и именем пользователя.
+    Результат кэшируется (REQUEST_CACHE_TTL); одновременные запросы одной
+    заявки выполняются одним запросом к БД. Возвращается копия записи.
+    """
+    key = _request_key(request_id)
+    if key is None:
+        return None
+    row = _request_cache.get_or_load(key, lambda: _load_request_full(key))
+    return dict(row) if row else None
+
+def get_request_cache_stats():
+    return _request_cache.stats()
+
+def _load_request_full(request_id):
     conn = None
     try:
         conn = Database.get_connection()
         if not conn:
             return None
+        rows = Database.execute_statement(conn, REQUEST_FULL_STATEMENT, (request_id,))
+        if rows:
+            return rows[0]
+        # Закрытые старые заявки перенесены в архив (archive_repo)
+        return archive_repo.find_archived(conn, request_id)
+    except Exception as e:
+        logger.error(f"Ошибка при получении заявки: {e}")
+        return None
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+def get_request_for_viewer(request_id, user_id=None, operator_id=None, date_from=None, date_to=None):
+    """
+    Заявка по номеру (как get_request_full), если она видна запрашивающему.
+    Правило видимости проверяется в самом запросе по первичному ключу:
+    user_id — заявка принадлежит пользователю;
+    operator_id — заявка назначена оператору, а если задан период [date_from, date_to],
+    то видны и все заявки периода (и заявки в свободной форме), как в ленте оператора.
+    Без ограничений — для администратора.
+    Возвращает None, если заявки нет или она не видна.
+    """
+    conditions, params = ["r.id = %s"], [request_id]
+    if user_id is not None:
+        conditions.append("r.user_id = %s")
+        params.append(user_id)
+    if operator_id is not None:
+        if date_from is not None and date_to is not None:
+            date_from, date_to = parse_date(date_from), parse_date(date_to)
+            if date_from is None or date_to is None:
+                raise ValueError("Некорректный диапазон дат")
+            period, period_params = _period_condition(date_from, date_to, 'r.')
+            conditions.append(f"(r.operator_id = %s OR {period})")
+            params.extend([operator_id, *period_params])
+        else:
+            conditions.append("r.operator_id = %s")
+            params.append(operator_id)
+    def query(conn):
         with conn.cursor(dictionary=True) as cursor:
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT r.*, u.full_name
                 FROM requests r
                 LEFT JOIN users u ON r.user_id = u.user_id
-                WHERE r.id = %s
-            """, (request_id,))
+                WHERE {' AND '.join(conditions)}
+            """, tuple(params))
             row = cursor.fetchone()
-            return row
+        return row or archive_repo.find_archived(conn, request_id, conditions, params)
+    try:
+        return Database.run_read(query)
     except Exception as e:
-        logger.error(f"Ошибка при получении заявки: {e}")
+        logger.error(f"Ошибка при получении заявки #{request_id}: {e}")
         return None
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
 
-def update_request_fields(request_id, user_data):
+# Поля заявки, которые пользователь может менять при редактировании
+EDITABLE_FIELDS = (
+    'division', 'direction', 'checkpoint', 'date_start', 'date_end', 'time_start', 'time_end',
+    'car_brand', 'people_count', 'leader_name', 'cargo', 'purpose', 'edited_fields'
+)
+
+def update_request_changes(request_id, changes):
     """
-    Обновляет все поля заявки по её ID.
-    user_data: dict с новыми данными заявки
+    Обновляет только переданные поля заявки одним UPDATE.
+    changes: dict {поле: значение}, поля из EDITABLE_FIELDS
+    У заявки в свободной форме при смене текста поля образца разбираются заново.
     """
+    unknown = set(changes) - set(EDITABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Недопустимые поля заявки: {sorted(unknown)}")
+    if not changes:
+        return True
     conn = None
     try:
         conn = Database.get_connection()
         if not conn:
             return False
+        if 'purpose' in changes and not any(field in changes for field in TEMPLATE_FIELDS):
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT form_type, date_start FROM requests WHERE id = %s FOR UPDATE", (request_id,))
+                row = cursor.fetchone()
+            if row and row[0] == FORM_FREE:
+                parsed = parse_free_form(changes['purpose'])
+                if parsed is None and row[1] is not None:
+                    # Поля, разобранные из прежнего текста, больше ему не соответствуют
+                    parsed = dict.fromkeys(TEMPLATE_FIELDS)
+                changes = {**(parsed or {}), **changes}
+        columns, values = [], []
+        for field in EDITABLE_FIELDS:
+            if field not in changes:
+                continue
+            value = changes[field]
+            if field in ('date_start', 'date_end'):
+                value = parse_date(value)
+            elif field in ('time_start', 'time_end'):
+                value = parse_time(value)
+            columns.append(f"{field} = %s")
+            values.append(value)
+        event_repo.record_before_update(conn, [request_id], changed_fields=[f for f in EDITABLE_FIELDS if f in changes and f != 'edited_fields'])
+        restat = [request_id] if stats_repo.touches_stats(changes) else []
+        stats_before = stats_repo.snapshot(conn, restat)
         with conn.cursor() as cursor:
-            # Преобразуем даты к формату YYYY-MM-DD
-            date_start = user_data.get('date_start')
-            date_end = user_data.get('date_end')
-            def parse_date(date_str):
-                try:
-                    # Поддержка форматов 'дд.мм' и 'YYYY-MM-DD'
-                    if not date_str:
-                        return None
-                    if len(date_str) == 5 and '.' in date_str:
-                        return datetime.strptime(date_str, "%d.%m").replace(year=datetime.now().year).strftime("%Y-%m-%d")
-                    elif len(date_str) == 10 and '-' in date_str:
-                        # Уже в формате YYYY-MM-DD
-                        return date_str
-                    else:
-                        return date_str if date_str else None
-                except Exception:
-                    return date_str if date_str else None
-            date_start_fmt = parse_date(date_start) if date_start else None
-            date_end_fmt = parse_date(date_end) if date_end else None
-            edited_fields = ''.join(user_data.get('edited_fields', [])) if user_data.get('edited_fields') else None
-            query = """
-                UPDATE requests SET
-                    division = %s,
-                    direction = %s,
-                    checkpoint = %s,
-                    date_start = %s,
-                    date_end = %s,
-                    time_start = %s,
-                    time_end = %s,
-                    car_brand = %s,
-                    people_count = %s,
-                    leader_name = %s,
-                    cargo = %s,
-                    purpose = %s,
-                    edited_fields = %s
-                WHERE id = %s
-            """
-            values = (
-                user_data.get('division'), user_data.get('direction'), user_data.get('checkpoint'),
-                date_start_fmt, date_end_fmt, user_data.get('time_start'), user_data.get('time_end'),
-                user_data.get('car_brand'), user_data.get('people_count'), user_data.get('leader_name'), user_data.get('cargo'), user_data.get('purpose'), edited_fields, request_id
-            )
-            cursor.execute(query, values)
-            conn.commit()
-            return True
+            cursor.execute(
+                f"UPDATE requests SET {', '.join(columns)}, version = version + 1 WHERE id = %s",
+                (*values, request_id))
+        stats_repo.apply_change(conn, restat, stats_before)
+        conn.commit()
+        _request_cache.invalidate(_request_key(request_id))
+        return True
     except Exception as e:
-        logger.error(f"Ошибка при обновлении заявки: {e}")
+        logger.error(f"Ошибка при обновлении полей заявки: {e}")
         return False
     finally:
         if conn and conn.is_connected():
@@ -216,36 +437,83 @@ def get_all_users():
     Получить список всех пользователей.
     Возвращает список словарей с user_id, username, full_name, role.
     """
-    conn = None
-    try:
-        conn = Database.get_connection()
-        if not conn:
-            logger.error("[get_all_users] Нет соединения с БД")
-            return []
+    def query(conn):
         with conn.cursor(dictionary=True) as cursor:
             cursor.execute("SELECT user_id, username, full_name, role FROM users ORDER BY user_id")
-            users = cursor.fetchall()
-            logger.info(f"[get_all_users] Получено пользователей: {len(users)}")
-            for user in users:
-                logger.info(f"[get_all_users] Пользователь: {user['user_id']} - "
-                           f"{user['full_name']} (@{user['username']}) - {user['role']}")
-            return users
+            return cursor.fetchall()
+    try:
+        users = Database.run_read(query)
+        logger.info(f"[get_all_users] Получено пользователей: {len(users)}")
+        for user in users:
+            logger.info(f"[get_all_users] Пользователь: {user['user_id']} - "
+                       f"{user['full_name']} (@{user['username']}) - {user['role']}")
+        return users
     except Exception as e:
         logger.error(f"Ошибка при получении списка пользователей: {e}")
         return []
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
 
-def assign_operator(request_id, operator_id):
+def iter_all_users(batch_size=500):
+    """
+    Все пользователи по одному (user_id, username, full_name, role) без загрузки
+    таблицы в память: строки читаются пачками из небуферизованного курсора.
+    Для выгрузок и отчётов; генератор нужно дочитать без долгих пауз (см. Database.stream_rows).
+    """
+    for rows in Database.stream_rows(
+        "SELECT user_id, username, full_name, role FROM users ORDER BY user_id", (), batch_size
+    ):
+        yield from rows
+
+def get_users_page(after_id=None, limit=500):
+    """
+    Следующая пачка пользователей после user_id = after_id (по возрастанию user_id).
+    Каждая пачка — отдельный короткий запрос, поэтому между пачками можно
+    долго ждать (рассылка), не удерживая соединение.
+    """
+    def query(conn):
+        with conn.cursor(dictionary=True) as cursor:
+            if after_id is None:
+                cursor.execute(
+                    "SELECT user_id, username, full_name, role FROM users ORDER BY user_id LIMIT %s",
+                    (limit,)
+                )
+            else:
+                cursor.execute(
+                    "SELECT user_id, username, full_name, role FROM users WHERE user_id > %s ORDER BY user_id LIMIT %s",
+                    (after_id, limit)
+                )
+            return cursor.fetchall()
+    try:
+        return Database.run_read(query)
+    except Exception as e:
+        logger.error(f"Ошибка при получении пачки пользователей: {e}")
+        return []
+
+def assign_operator(request_id, operator_id, new_status=None, outbox=None):
+    """
+    Назначает заявке оператора; new_status — сменить статус тем же UPDATE.
+    outbox: уведомления, записываемые в очередь той же транзакцией.
+    """
+    if new_status is not None and new_status not in ALL_STATUSES:
+        raise ValueError(f"Недопустимый статус: {new_status}")
     conn = None
     try:
         conn = Database.get_connection()
         if not conn:
             return False
+        event_repo.record_before_update(conn, [request_id], new_status, ['operator_id'])
         with conn.cursor() as cursor:
-            cursor.execute("UPDATE requests SET operator_id = %s WHERE id = %s", (operator_id, request_id))
+            if new_status is not None:
+                stats_before = stats_repo.snapshot(conn, [request_id])
+                cursor.execute(
+                    "UPDATE requests SET operator_id = %s, status = %s, version = version + 1 WHERE id = %s",
+                    (operator_id, new_status, request_id)
+                )
+                stats_repo.apply_change(conn, [request_id], stats_before)
+            else:
+                cursor.execute("UPDATE requests SET operator_id = %s, version = version + 1 WHERE id = %s", (operator_id, request_id))
+            outbox_repo.enqueue(conn, outbox)
             conn.commit()
+            _request_cache.invalidate(_request_key(request_id))
             return True
     except Exception as e:
         logger.error(f'Ошибка при назначении оператора: {e}')
@@ -254,32 +522,336 @@ def assign_operator(request_id, operator_id):
         if conn and conn.is_connected():
             conn.close()
 
-def get_requests_for_operator_by_date_range(operator_id, date_from, date_to):
+def _bulk_update(request_ids, assignments, allowed_statuses=None, transitions=None, outbox=None):
     """
-    Получить ВСЕ заявки с датой date_start в диапазоне [date_from, date_to],
-    включая заявки, исполненные другими операторами.
-    Также возвращает все заявки в свободной форме 
-    (где date_start is NULL и есть purpose).
+    Общая часть массовых операций: одна транзакция на весь список.
+    Строки блокируются SELECT ... FOR UPDATE, чтобы проверка статуса и UPDATE
+    видели одно и то же состояние; затем один UPDATE по всем подходящим id.
+    assignments: {колонка: значение}, одинаковые для всех заявок
+    allowed_statuses: заявки в других статусах пропускаются (BULK_SKIPPED)
+    transitions: {текущий статус: новый статус}, статус меняется в том же UPDATE
+    outbox: функция (строка id, user_id, status до изменения) -> уведомления;
+    вызывается для изменённых заявок, уведомления пишутся той же транзакцией
+    Возвращает {id: BULK_*}.
     """
+    ids = []
+    for request_id in request_ids:
+        key = _request_key(request_id)
+        if key is not None and key not in ids:
+            ids.append(key)
+    if not ids:
+        return {}
+    if transitions:
+        allowed = set(transitions)
+        if allowed_statuses is not None:
+            allowed &= set(allowed_statuses)
+        allowed_statuses = allowed
+    outcomes = {request_id: BULK_NOT_FOUND for request_id in ids}
     conn = None
     try:
         conn = Database.get_connection()
         if not conn:
-            return []
+            return {request_id: BULK_FAILED for request_id in ids}
         with conn.cursor(dictionary=True) as cursor:
-            query = """
-                SELECT * FROM requests
-                WHERE (
-                        (date_start >= %s AND date_start <= %s)
-                        OR (date_start IS NULL AND purpose IS NOT NULL)
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(f"SELECT id, user_id, status FROM requests WHERE id IN ({placeholders}) FOR UPDATE", ids)
+            target = []
+            messages = []
+            events = []
+            changed = [column for column in assignments if column != 'status']
+            for row in cursor.fetchall():
+                if allowed_statuses is not None and row['status'] not in allowed_statuses:
+                    outcomes[row['id']] = BULK_SKIPPED
+                else:
+                    target.append(row['id'])
+                    new_status = (transitions or {}).get(row['status'], assignments.get('status', row['status']))
+                    events.append((row['id'], row['status'], new_status, changed))
+                    if outbox:
+                        messages += outbox(row)
+            if target:
+                set_parts = [f"{column} = %s" for column in assignments]
+                params = list(assignments.values())
+                if transitions:
+                    set_parts.append(
+                        "status = CASE status " + ' '.join(['WHEN %s THEN %s'] * len(transitions)) + " ELSE status END"
                     )
+                    for old_status, new_status in transitions.items():
+                        params += [old_status, new_status]
+                set_parts.append("version = version + 1")
+                # В сводке пересчитываются только заявки, у которых меняется статус
+                restat = [request_id for request_id, old_status, new_status, _ in events if old_status != new_status]
+                stats_before = stats_repo.snapshot(conn, restat)
+                cursor.execute(
+                    f"UPDATE requests SET {', '.join(set_parts)} WHERE id IN ({', '.join(['%s'] * len(target))})",
+                    params + target
+                )
+                stats_repo.apply_change(conn, restat, stats_before)
+            event_repo.record(conn, events)
+            outbox_repo.enqueue(conn, messages)
+            conn.commit()
+        for request_id in target:
+            outcomes[request_id] = BULK_UPDATED
+            _request_cache.invalidate(_request_key(request_id))
+        return outcomes
+    except Exception as e:
+        logger.error(f"Ошибка массового обновления заявок {ids}: {e}")
+        return {request_id: BULK_FAILED for request_id in ids}
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+def bulk_update_status(request_ids, new_status, reason=None, from_statuses=None, outbox=None):
+    """
+    Сменить статус списку заявок одной транзакцией.
+    from_statuses: менять только заявки в этих статусах (например, PENDING_STATUSES),
+    чтобы не затронуть заявки, которые уже обработал кто-то другой.
+    outbox: функция строки заявки -> уведомления (см. _bulk_update).
+    Возвращает {id: BULK_UPDATED | BULK_SKIPPED | BULK_NOT_FOUND | BULK_FAILED}.
+    """
+    if new_status not in ALL_STATUSES:
+        raise ValueError(f"Недопустимый статус: {new_status}")
+    assignments = {'status': new_status}
+    if reason is not None:
+        assignments['reason'] = reason
+    return _bulk_update(request_ids, assignments, from_statuses, outbox=outbox)
+
+def bulk_assign_operator(request_ids, operator_id, transitions=None, outbox=None):
+    """
+    Назначить оператора списку заявок одной транзакцией.
+    transitions: {текущий статус: новый статус}; если задан, заявки в других
+    статусах пропускаются, а статус меняется тем же UPDATE.
+    Возвращает {id: BULK_*}, как bulk_update_status.
+    """
+    for new_status in (transitions or {}).values():
+        if new_status not in ALL_STATUSES:
+            raise ValueError(f"Недопустимый статус: {new_status}")
+    return _bulk_update(request_ids, {'operator_id': operator_id}, transitions=transitions, outbox=outbox)
+
+def get_unparsed_free_form(after_id=0, limit=500):
+    """
+    Заявки в свободной форме без разобранных полей (date_start пуст) с id > after_id:
+    [(id, version, purpose, created_at)] по возрастанию id, None при ошибке.
+    """
+    conn = None
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return None
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, version, purpose, created_at FROM requests
+                WHERE form_type = %s AND date_start IS NULL AND id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (FORM_FREE, after_id, limit))
+            return [tuple(row) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка при выборке заявок в свободной форме: {e}")
+        return None
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+def fill_free_form_fields(parsed):
+    """
+    Записать поля образца, разобранные из текста заявок в свободной форме, одной транзакцией.
+    parsed: [(id, version, поля)] — версия, с которой читался текст; заявка, изменённая
+    после чтения или уже разобранная, пропускается.
+    Возвращает число обновлённых заявок, None при ошибке.
+    """
+    if not parsed:
+        return 0
+    conn = None
+    try:
+        conn = Database.get_connection()
+        if not conn:
+            return None
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT id, version FROM requests
+                WHERE id IN ({', '.join(['%s'] * len(parsed))}) AND form_type = %s AND date_start IS NULL
+                FOR UPDATE
+            """, (*[request_id for request_id, _, _ in parsed], FORM_FREE))
+            current = dict(cursor.fetchall())
+        rows = [(request_id, fields) for request_id, version, fields in parsed if current.get(request_id) == version]
+        ids = [request_id for request_id, _ in rows]
+        for request_id, fields in rows:
+            event_repo.record_before_update(
+                conn, [request_id], changed_fields=[f for f in TEMPLATE_FIELDS if fields.get(f) is not None]
+            )
+        stats_before = stats_repo.snapshot(conn, ids)
+        with conn.cursor() as cursor:
+            for request_id, fields in rows:
+                cursor.execute(
+                    f"UPDATE requests SET {', '.join(f'{f} = %s' for f in TEMPLATE_FIELDS)}, version = version + 1 "
+                    f"WHERE id = %s",
+                    (*[fields.get(f) for f in TEMPLATE_FIELDS], request_id))
+        stats_repo.apply_change(conn, ids, stats_before)
+        conn.commit()
+        for request_id in ids:
+            _request_cache.invalidate(_request_key(request_id))
+        return len(ids)
+    except Exception as e:
+        logger.error(f"Ошибка при записи разобранных заявок в свободной форме: {e}")
+        return None
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+def get_pending_requests(limit=20):
+    """
+    Самые старые заявки, ожидающие решения администратора (PENDING_STATUSES).
+    Возвращает список dict с полями для краткого списка.
+    """
+    def query(conn):
+        with conn.cursor(dictionary=True) as cursor:
+            placeholders = ', '.join(['%s'] * len(PENDING_STATUSES))
+            cursor.execute(f"""
+                SELECT id, user_id, status, division, date_start, leader_name
+                FROM requests
+                WHERE status IN ({placeholders})
                 ORDER BY id ASC
-            """
-            cursor.execute(query, (date_from, date_to))
+                LIMIT %s
+            """, (*PENDING_STATUSES, limit))
+            return cursor.fetchall()
+    try:
+        return Database.run_read(query)
+    except Exception as e:
+        logger.error(f"Ошибка при получении заявок на рассмотрении: {e}")
+        return []
+
+# Колонки, которые выводит карточка заявки у оператора (format_operator_request_text)
+OPERATOR_CARD_COLUMNS = (
+    'id', 'status', 'division', 'direction', 'checkpoint', 'date_start', 'date_end',
+    'time_start', 'time_end', 'car_brand', 'people_count', 'leader_name', 'cargo',
+    'purpose', 'edited_fields', 'form_type'
+)
+
+def _fetch_card_page(conn, where, params, after_id, before_id, limit):
+    # Страница карточек по id вместо OFFSET: (rows по возрастанию id, есть ли ещё в направлении движения).
+    # Назад — выборка id < before_id по убыванию и разворот, вперёд — id > after_id по возрастанию.
+    if before_id is not None:
+        key_cond, order, key = "id < %s", "DESC", before_id
+    else:
+        key_cond, order, key = "id > %s", "ASC", after_id or 0
+    with conn.cursor(dictionary=True) as cursor:
+        # Читается на одну строку больше, чтобы узнать, есть ли следующая страница
+        cursor.execute(f"""
+            SELECT {', '.join(OPERATOR_CARD_COLUMNS)} FROM requests
+            WHERE {where}
+                AND {key_cond}
+            ORDER BY id {order}
+            LIMIT %s
+        """, (*params, key, limit + 1))
+        rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before_id is not None:
+        rows.reverse()
+    return rows, has_more
+
+def get_operator_requests_page(date_from, date_to, after_id=None, before_id=None, limit=5):
+    """
+    Страница заявок за период [date_from, date_to] (и заявок в свободной форме,
+    поданных за этот период) с постраничной навигацией по id вместо OFFSET.
+    after_id: следующая страница — заявки с id > after_id
+    before_id: предыдущая страница — заявки с id < before_id
+    Возвращает (rows, has_more): строки по возрастанию id и признак того,
+    что в направлении движения есть ещё заявки.
+    """
+    date_from, date_to = parse_date(date_from), parse_date(date_to)
+    if date_from is None or date_to is None:
+        raise ValueError("Некорректный диапазон дат")
+    period, period_params = _period_condition(date_from, date_to)
+    try:
+        return Database.run_read(_fetch_card_page, period, period_params, after_id, before_id, limit)
+    except Exception as e:
+        logger.error(f"Ошибка при получении страницы заявок для оператора: {e}")
+        return [], False
+
+# Минимальная длина слова в FULLTEXT-индексе InnoDB (innodb_ft_min_token_size)
+LEADER_FULLTEXT_MIN_WORD = 3
+
+def normalize_leader_name(value):
+    """Позывной в том виде, в каком он хранится в leader_name_norm."""
+    return (value or '').strip().lower()
+
+def _like_prefix(value):
+    # '!' как символ экранирования одинаково записывается в MySQL и SQLite
+    return value.replace('!', '!!').replace('%', '!%').replace('_', '!_') + '%'
+
+def search_requests_by_leader(leader, date_from, date_to, after_id=None, before_id=None, limit=5):
+    """
+    Заявки за период, у которых позывной старшего совпадает с запросом:
+    каждое слово запроса — начало какого-либо слова позывного (в начале строки
+    или после пробела), без учёта регистра. Совпадение в середине слова не ищется:
+    «ван» не находит «Иванов». Правило одно для MySQL и SQLite; в MySQL слова
+    от LEADER_FULLTEXT_MIN_WORD символов сначала отбираются по FULLTEXT-индексу.
+    Навигация по id как в get_operator_requests_page, возвращает (rows, has_more).
+    """
+    date_from, date_to = parse_date(date_from), parse_date(date_to)
+    if date_from is None or date_to is None:
+        raise ValueError("Некорректный диапазон дат")
+    leader = normalize_leader_name(leader)
+    words = re.findall(r'\w+', leader)
+    if not words:
+        return [], False
+    match_cond = ' AND '.join(
+        ["(leader_name_norm LIKE %s ESCAPE '!' OR leader_name_norm LIKE %s ESCAPE '!')"] * len(words)
+    )
+    match_params = []
+    for w in words:
+        match_params += [_like_prefix(w), '% ' + _like_prefix(w)]
+    long_words = [w for w in words if len(w) >= LEADER_FULLTEXT_MIN_WORD]
+    if Database.get_dialect() == 'mysql' and long_words:
+        # FULLTEXT только сужает выборку по индексу, совпадение проверяют условия LIKE;
+        # короткие слова в FULLTEXT не индексируются и проверяются только LIKE
+        match_cond = f"MATCH(leader_name) AGAINST (%s IN BOOLEAN MODE) AND {match_cond}"
+        match_params = [' '.join(f"+{w}*" for w in long_words), *match_params]
+    try:
+        return Database.run_read(
+            _fetch_card_page, f"{match_cond} AND date_start BETWEEN %s AND %s",
+            (*match_params, date_from, date_to), after_id, before_id, limit
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при поиске заявок по старшему: {e}")
+        return [], False
+
+# date_start — колонка DATE, сравнение с датами использует индекс
+_DATE_RANGE_QUERY = f"""
+    SELECT * FROM requests
+    WHERE {_PERIOD_CONDITION.format(p='')}
+    ORDER BY id ASC
+"""
+
+def get_requests_for_operator_by_date_range(operator_id, date_from, date_to):
+    """
+    Получить ВСЕ заявки с датой date_start в диапазоне [date_from, date_to],
+    включая заявки, исполненные другими операторами.
+    Также возвращает заявки в свободной форме, поданные в этот период.
+    date_from, date_to: date или строка в формате, понятном parse_date.
+    """
+    date_from, date_to = parse_date(date_from), parse_date(date_to)
+    if date_from is None or date_to is None:
+        raise ValueError("Некорректный диапазон дат")
+    def query(conn):
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(_DATE_RANGE_QUERY, _period_condition(date_from, date_to)[1])
             return cursor.fetchall()
+    try:
+        return Database.run_read(query)
     except Exception as e:
         logger.error(f"Ошибка при получении заявок для оператора: {e}")
         return []
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
+
+def iter_requests_by_date_range(date_from, date_to, batch_size=500):
+    """
+    Те же заявки, что get_requests_for_operator_by_date_range, по одной,
+    без загрузки всего периода в память (для выгрузок и отчётов).
+    Генератор нужно дочитать без долгих пауз (см. Database.stream_rows).
+    """
+    date_from, date_to = parse_date(date_from), parse_date(date_to)
+    if date_from is None or date_to is None:
+        raise ValueError("Некорректный диапазон дат")
+    for rows in Database.stream_rows(_DATE_RANGE_QUERY, _period_condition(date_from, date_to)[1], batch_size):
+        yield from rows
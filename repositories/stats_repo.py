@@ -0,0 +1,108 @@
+# repositories/stats_repo.py
+# Сводка заявок по дням (таблица request_daily_stats) для /stats.
+# Ключ: день, пункт пропуска, направление, статус -> число заявок и сумма people_count.
+# День — date_start заявки, для заявок в свободной форме — день подачи.
+# Сводку поддерживают функции request_repo в той же транзакции, что и изменение:
+# до UPDATE запоминается вклад заявок (snapshot), после — разница старого и нового
+# вклада записывается одним INSERT ... ON DUPLICATE KEY UPDATE (apply_change).
+# Строки сводки в нём идут в порядке ключа, поэтому встречные смены статуса
+# (A→B и B→A за один день) блокируют их в одном порядке и не дают взаимоблокировки;
+# если ключ не изменился (назначение оператора, правка груза), сводка не трогается.
+# Заявки, перенесённые в архив, из сводки не убираются.
+
+import logging
+from collections import defaultdict
+from db import Database
+
+logger = logging.getLogger(__name__)
+
+# Поля заявки, от которых зависит её строка в сводке
+STATS_FIELDS = ('date_start', 'checkpoint', 'direction', 'status', 'people_count')
+
+_KEY = "COALESCE(date_start, DATE(created_at)), COALESCE(checkpoint, ''), COALESCE(direction, ''), status"
+
+_UPSERT = """
+    INSERT INTO request_daily_stats (stat_date, checkpoint, direction, status, request_count, people_sum)
+    {select}
+    ON DUPLICATE KEY UPDATE
+        request_count = request_count + VALUES(request_count),
+        people_sum = people_sum + VALUES(people_sum)
+"""
+
+
+def touches_stats(fields):
+    return any(field in STATS_FIELDS for field in fields)
+
+
+def snapshot(conn, request_ids):
+    """Вклад заявок в сводку: [(ключ, people_count)]. До UPDATE — для apply_change."""
+    if not request_ids:
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {_KEY}, COALESCE(people_count, 0) FROM requests "
+            f"WHERE id IN ({', '.join(['%s'] * len(request_ids))})",
+            tuple(request_ids))
+        return [(tuple(row[:4]), row[4]) for row in cursor.fetchall()]
+
+
+def apply_change(conn, request_ids, before=()):
+    """
+    Перенести в сводку изменение заявок (после INSERT/UPDATE), без commit.
+    before: snapshot тех же заявок до UPDATE (для новых заявок — пусто).
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for sign, rows in ((-1, before), (1, snapshot(conn, request_ids))):
+        for key, people in rows:
+            deltas[key][0] += sign
+            deltas[key][1] += sign * people
+    rows = sorted((key, delta) for key, delta in deltas.items() if delta != [0, 0])
+    if not rows:
+        return
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))
+    params = [value for key, (count, people) in rows for value in (*key, count, people)]
+    with conn.cursor() as cursor:
+        cursor.execute(_UPSERT.format(select=f"VALUES {values}"), params)
+
+
+def rebuild(conn):
+    """Пересчитать сводку целиком по requests и requests_archive (миграция, восстановление)."""
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM request_daily_stats")
+        cursor.execute(_UPSERT.format(select=f"""
+            SELECT {_KEY}, COUNT(*), SUM(COALESCE(people_count, 0))
+            FROM (
+                SELECT date_start, created_at, checkpoint, direction, status, people_count FROM requests
+                UNION ALL
+                SELECT date_start, created_at, checkpoint, direction, status, people_count FROM requests_archive
+            ) AS all_requests
+            GROUP BY 1, 2, 3, 4
+        """))
+    conn.commit()
+
+
+def get_daily_stats(date_from, date_to):
+    """
+    Строки сводки за период [date_from, date_to] (даты включительно), сгруппированные
+    по пункту пропуска, направлению и статусу:
+    [{'checkpoint', 'direction', 'status', 'request_count', 'people_sum'}]
+    """
+    def query(conn):
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute("""
+                SELECT checkpoint, direction, status,
+                       SUM(request_count) AS request_count, SUM(people_sum) AS people_sum
+                FROM request_daily_stats
+                WHERE stat_date BETWEEN %s AND %s
+                GROUP BY checkpoint, direction, status
+                HAVING SUM(request_count) > 0
+            """, (date_from, date_to))
+            return [
+                dict(row, request_count=int(row['request_count']), people_sum=int(row['people_sum']))
+                for row in cursor.fetchall()
+            ]
+    try:
+        return Database.run_read(query)
+    except Exception as e:
+        logger.error(f"Ошибка при чтении сводки заявок: {e}")
+        return None
@@ -0,0 +1,107 @@
+# services/archiver.py
+# Регулярный перенос закрытых заявок (Исполненная/Отменённая) в архив requests_archive.
+# Переносятся заявки, созданные раньше начала месяца ARCHIVE_AFTER_MONTHS месяцев назад,
+# пачками по ARCHIVE_BATCH_SIZE с паузой между ними, чтобы не мешать обработчикам.
+# Запуск из бота — start(application) в post_init, раз в ARCHIVE_INTERVAL_HOURS;
+# вручную или из cron:
+#   python -m services.archiver           — перенести по настройкам
+#   python -m services.archiver 6         — перенести заявки старше 6 месяцев
+
+import asyncio
+import logging
+import sys
+from datetime import date
+from config import ARCHIVE_CONFIG
+from db_async import run_sync
+from repositories import archive_repo
+from repositories.request_repo import STATUS_COMPLETED, STATUS_CANCELLED
+
+logger = logging.getLogger(__name__)
+
+CLOSED_STATUSES = (STATUS_COMPLETED, STATUS_CANCELLED)
+
+_task = None
+
+
+def archive_cutoff(after_months, today=None):
+    return archive_repo.month_start(today or date.today(), after_months)
+
+
+def run_once(after_months=None):
+    """Перенести все подходящие заявки (синхронно). Возвращает число перенесённых, None при ошибке."""
+    after_months = ARCHIVE_CONFIG['after_months'] if after_months is None else after_months
+    before = archive_cutoff(after_months)
+    if not archive_repo.prepare_archive(before):
+        return None
+    total = 0
+    while True:
+        moved = archive_repo.archive_batch(CLOSED_STATUSES, before, ARCHIVE_CONFIG['batch_size'])
+        if moved is None:
+            return None
+        total += moved
+        if moved < ARCHIVE_CONFIG['batch_size']:
+            break
+    logger.info(f"[archiver] В архив перенесено заявок: {total} (созданы до {before})")
+    return total
+
+
+async def run_async():
+    """То же, что run_once, но каждая пачка — отдельный вызов в потоке БД, с паузой между ними."""
+    before = archive_cutoff(ARCHIVE_CONFIG['after_months'])
+    if not await run_sync(archive_repo.prepare_archive, before):
+        return None
+    total = 0
+    while True:
+        moved = await run_sync(archive_repo.archive_batch, CLOSED_STATUSES, before, ARCHIVE_CONFIG['batch_size'])
+        if moved is None:
+            return None
+        total += moved
+        if moved < ARCHIVE_CONFIG['batch_size']:
+            break
+        await asyncio.sleep(ARCHIVE_CONFIG['pause'])
+    if total:
+        logger.info(f"[archiver] В архив перенесено заявок: {total} (созданы до {before})")
+    return total
+
+
+async def _loop():
+    while True:
+        try:
+            await run_async()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[archiver] Ошибка переноса заявок в архив: {e}")
+        await asyncio.sleep(ARCHIVE_CONFIG['interval_hours'] * 3600)
+
+
+async def start(application):
+    """Запустить регулярный перенос (post_init приложения); при ARCHIVE_AFTER_MONTHS=0 выключен."""
+    global _task
+    if ARCHIVE_CONFIG['after_months'] <= 0:
+        return
+    _task = asyncio.create_task(_loop())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVE_CONFIG['after_months']
+    if months <= 0:
+        print("Укажите, старше скольких месяцев переносить заявки: python -m services.archiver 6")
+        sys.exit(1)
+    moved = run_once(months)
+    if moved is None:
+        print("❌ Ошибка при переносе заявок в архив, подробности в логе")
+        sys.exit(1)
+    print(f"✅ Перенесено в архив: {moved}")
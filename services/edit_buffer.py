@@ -0,0 +1,169 @@
+# services/edit_buffer.py
+# Накопление правок заявки в диалоге редактирования.
+# Каждый шаг редактирования меняет одно поле; вместо полного UPDATE заявки
+# на каждом шаге правки копятся здесь и записываются одним UPDATE только
+# изменённых колонок: при подтверждении, отмене/дублировании или после простоя.
+# Накопленные правки сразу сохраняются в файл-черновик, чтобы не потерять их
+# при падении бота; при запуске незаписанные черновики дописываются в БД (recover).
+
+import asyncio
+import json
+import logging
+import os
+from config import EDIT_BUFFER_CONFIG
+from repositories import request_repo
+from repositories.async_request_repo import get_request_full, update_request_changes
+
+logger = logging.getLogger(__name__)
+
+FLUSH_DELAY = EDIT_BUFFER_CONFIG['flush_delay']
+DRAFTS_DIR = EDIT_BUFFER_CONFIG['drafts_dir']
+
+_staged = {}  # request_id -> {поле: значение}
+_timers = {}  # request_id -> asyncio.TimerHandle
+_tasks = set()  # запущенные по таймеру записи (ссылки, чтобы задачу не собрал GC)
+_flushes = 0
+_fields_staged = 0
+
+
+def _draft_path(request_id):
+    return os.path.join(DRAFTS_DIR, f"{int(request_id)}.json")
+
+
+def _write_draft(request_id, changes):
+    try:
+        os.makedirs(DRAFTS_DIR, exist_ok=True)
+        path = _draft_path(request_id)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'request_id': int(request_id), 'changes': changes}, f, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.error(f"[edit_buffer] Не удалось сохранить черновик заявки #{request_id}: {e}")
+
+
+def _remove_draft(request_id):
+    try:
+        os.remove(_draft_path(request_id))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"[edit_buffer] Не удалось удалить черновик заявки #{request_id}: {e}")
+
+
+def _schedule(request_id):
+    timer = _timers.pop(request_id, None)
+    if timer:
+        timer.cancel()
+    loop = asyncio.get_running_loop()
+
+    def start_flush():
+        task = loop.create_task(flush(request_id))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+
+    _timers[request_id] = loop.call_later(FLUSH_DELAY, start_flush)
+
+
+def stage(request_id, changes, edited_fields=None):
+    """
+    Запомнить правки заявки без записи в БД.
+    changes: dict {поле: значение}
+    edited_fields: список изменённых полей для подсветки у администратора
+    """
+    global _fields_staged
+    request_id = int(request_id)
+    pending = _staged.setdefault(request_id, {})
+    pending.update(changes)
+    if edited_fields is not None:
+        pending['edited_fields'] = ','.join(edited_fields)
+    _fields_staged += len(changes)
+    _write_draft(request_id, pending)
+    _schedule(request_id)
+
+
+async def flush(request_id):
+    """
+    Записать накопленные правки заявки одним UPDATE.
+    Возвращает True, если записывать нечего или запись прошла успешно.
+    При ошибке правки остаются в буфере и в черновике, запись повторится по таймеру.
+    """
+    global _flushes
+    request_id = int(request_id)
+    timer = _timers.pop(request_id, None)
+    if timer:
+        timer.cancel()
+    changes = _staged.pop(request_id, None)
+    if not changes:
+        return True
+    if await update_request_changes(request_id, changes):
+        _flushes += 1
+        if request_id not in _staged:
+            _remove_draft(request_id)
+        logger.info(f"[edit_buffer] Заявка #{request_id}: записано полей {len(changes)}")
+        return True
+    # Правки, сделанные во время записи, новее неудавшихся
+    changes.update(_staged.get(request_id, {}))
+    _staged[request_id] = changes
+    _write_draft(request_id, changes)
+    _schedule(request_id)
+    logger.error(f"[edit_buffer] Заявка #{request_id}: правки не записаны, повтор через {FLUSH_DELAY} с")
+    return False
+
+
+async def flush_all():
+    """Записать все накопленные правки (при остановке бота)."""
+    for request_id in list(_staged):
+        await flush(request_id)
+
+
+def get_staged(request_id):
+    return dict(_staged.get(int(request_id), {}))
+
+
+def overlay(request_id, request):
+    """Заявка из БД с ещё не записанными правками (включая edited_fields для подсветки)."""
+    staged = get_staged(request_id)
+    return {**request, **staged} if request and staged else request
+
+
+async def get_request(request_id):
+    """get_request_full с наложенными правками из буфера — для показа и продолжения редактирования."""
+    return overlay(request_id, await get_request_full(request_id))
+
+
+def recover():
+    """
+    Дописать в БД черновики, оставшиеся после прошлого запуска.
+    Вызывается при старте бота до начала обработки сообщений.
+    Возвращает число записанных черновиков.
+    """
+    if not os.path.isdir(DRAFTS_DIR):
+        return 0
+    recovered = 0
+    for filename in sorted(os.listdir(DRAFTS_DIR)):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(DRAFTS_DIR, filename)
+        try:
+            with open(path, encoding='utf-8') as f:
+                draft = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"[edit_buffer] Повреждённый черновик {filename}: {e}")
+            continue
+        if request_repo.update_request_changes(draft['request_id'], draft['changes']):
+            os.remove(path)
+            recovered += 1
+        else:
+            logger.error(f"[edit_buffer] Черновик заявки #{draft['request_id']} не записан, останется до следующего запуска")
+    if recovered:
+        logger.info(f"[edit_buffer] Восстановлено черновиков: {recovered}")
+    return recovered
+
+
+def stats():
+    return {
+        'pending': len(_staged),
+        'fields_staged': _fields_staged,
+        'flushes': _flushes,
+    }
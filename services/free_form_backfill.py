@@ -0,0 +1,62 @@
+# services/free_form_backfill.py
+# Разбор старых заявок в свободной форме (utils.free_form) и заполнение полей образца.
+# Новые заявки разбираются при сохранении, этот скрипт — для заявок, поданных раньше.
+# Текст разбирается в пуле процессов пачками по BATCH_SIZE; чтение и запись в БД —
+# в основном процессе, каждая пачка отдельной транзакцией (request_repo.fill_free_form_fields).
+# Повторный запуск безопасен: разобранные заявки (date_start заполнен) не выбираются.
+#   python -m services.free_form_backfill       — по процессу на ядро
+#   python -m services.free_form_backfill 4     — 4 процесса
+
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from repositories import request_repo
+from utils.date_utils import parse_date
+from utils.free_form import parse_free_form
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def _parse(row):
+    request_id, version, purpose, created_at = row
+    # Год для 'дд.мм' — от дня подачи заявки, а не от дня разбора
+    return request_id, version, parse_free_form(purpose, parse_date(created_at))
+
+
+def run(workers=None, batch_size=BATCH_SIZE):
+    """
+    Разобрать все неразобранные заявки в свободной форме.
+    Возвращает (просмотрено, заполнено) или None при ошибке БД.
+    """
+    workers = workers or os.cpu_count() or 1
+    checked = filled = 0
+    after_id = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            rows = request_repo.get_unparsed_free_form(after_id, batch_size)
+            if rows is None:
+                return None
+            if not rows:
+                break
+            chunksize = max(1, len(rows) // (workers * 4))
+            parsed = [item for item in pool.map(_parse, rows, chunksize=chunksize) if item[2]]
+            updated = request_repo.fill_free_form_fields(parsed)
+            if updated is None:
+                return None
+            checked += len(rows)
+            filled += updated
+            after_id = rows[-1][0]
+    logger.info(f"[free_form] Просмотрено заявок в свободной форме: {checked}, заполнено полей: {filled}")
+    return checked, filled
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    result = run(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    if result is None:
+        print("❌ Ошибка при разборе заявок, подробности в логе")
+        sys.exit(1)
+    print(f"✅ Просмотрено: {result[0]}, разобрано: {result[1]}")
@@ -0,0 +1,282 @@
+# services/journal.py
+# Локальный журнал на время недоступности MySQL.
+# Если заявку или смену статуса не удалось записать в БД, она дописывается
+# в файл журнала (одна JSON-строка на запись), и пользователь получает подтверждение.
+# Записи, пришедшие почти одновременно, сохраняются одним fsync (fsync_delay),
+# подтверждение отправляется только после fsync.
+# В журнал пишется только при недоступной БД (Database.ping): ошибки самих запросов
+# (блокировки, ограничения, данные) показываются пользователю как ошибки.
+# Когда БД снова доступна, журнал переносится в БД (replay) повторно безопасно:
+# заявка с тем же journal_key сохраняется один раз, смена статуса применяется,
+# только если заявку не меняли после записи в журнал. Время из журнала становится
+# временем подачи заявки и события истории.
+# Запись, которую БД отвергает, переносится в dead.log, чтобы не задерживать остальные.
+# Уведомления о перенесённых записях уходят через очередь outbox.
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from config import JOURNAL_CONFIG, ADMIN_CHAT_ID
+from db import Database
+from db_async import run_sync
+from repositories import outbox_repo, request_repo
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = JOURNAL_CONFIG['dir']
+ACTIVE_FILE = 'journal.log'
+DEAD_FILE = 'dead.log'      # записи, которые БД отвергла; разбираются вручную
+
+OP_SAVE_REQUEST = 'save_request'
+OP_STATUS = 'status'
+
+# Поля заявки, которые сохраняет save_request
+REQUEST_FIELDS = tuple(field for field in request_repo.EDITABLE_FIELDS if field != 'edited_fields')
+
+_pending = []               # (запись, future) — ждут записи в файл и fsync
+_flush_task = None
+_replay_task = None
+_file_lock = threading.Lock()    # запись в журнал и его ротация перед переносом
+_replay_lock = threading.Lock()
+_appended = 0
+_fsyncs = 0
+_replayed = 0
+_rejected = 0
+
+
+def _active_path():
+    return os.path.join(JOURNAL_DIR, ACTIVE_FILE)
+
+
+def _write_lines(path, lines, mode='a'):
+    with open(path, mode, encoding='utf-8') as f:
+        f.write(''.join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _append_batch(lines):
+    with _file_lock:
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        _write_lines(_active_path(), lines)
+
+
+async def _flush_later():
+    global _flush_task, _fsyncs
+    await asyncio.sleep(JOURNAL_CONFIG['fsync_delay'])
+    batch = _pending[:]
+    _pending.clear()
+    _flush_task = None
+    lines = [json.dumps(entry, ensure_ascii=False, default=str) + '\n' for entry, _ in batch]
+    try:
+        await asyncio.to_thread(_append_batch, lines)
+        _fsyncs += 1
+        ok = True
+    except OSError as e:
+        logger.error(f"[journal] Не удалось записать журнал ({len(batch)} записей): {e}")
+        ok = False
+    for _, future in batch:
+        future.set_result(ok)
+
+
+async def _append(entry):
+    """Дописать запись в журнал. True — запись на диске (после fsync)."""
+    global _flush_task, _appended
+    future = asyncio.get_running_loop().create_future()
+    _pending.append((entry, future))
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_later())
+    ok = await future
+    if ok:
+        _appended += 1
+    return ok
+
+
+def _entry(op, **fields):
+    return {'op': op, 'key': str(uuid.uuid4()), 'ts': datetime.now().isoformat(timespec='seconds'), **fields}
+
+
+async def db_unavailable():
+    """True, если БД не отвечает (а не отвергла конкретный запрос)."""
+    return not await run_sync(Database.ping)
+
+
+async def submit_request(user_data, user_id, status=request_repo.STATUS_NEW):
+    """
+    Принять заявку в журнал вместо БД. Возвращает ключ записи или None, если журнал
+    недоступен или БД отвечает (запись не удалась по другой причине).
+    """
+    if not await db_unavailable():
+        return None
+    entry = _entry(
+        OP_SAVE_REQUEST, user_id=user_id, status=status,
+        data={field: user_data.get(field) for field in REQUEST_FIELDS}
+    )
+    return entry['key'] if await _append(entry) else None
+
+
+async def change_status(request_id, to_status, reason=None, outbox=None):
+    """
+    Принять смену статуса в журнал вместо БД; читать заявку для этого не нужно.
+    outbox: уведомления (outbox_repo.message ...), которые уйдут после переноса в БД;
+    chat_id None — пользователю заявки.
+    False — журнал недоступен или БД отвечает (запись не удалась по другой причине).
+    """
+    if not await db_unavailable():
+        return False
+    entry = _entry(
+        OP_STATUS, request_id=int(request_id), to_status=to_status, reason=reason, outbox=outbox or []
+    )
+    return await _append(entry)
+
+
+def _apply(entry):
+    """Применить запись журнала к БД. True — применена (или уже была применена раньше)."""
+    if entry['op'] == OP_SAVE_REQUEST:
+        def messages(request_id):
+            return [
+                outbox_repo.message(
+                    entry['user_id'],
+                    f"📄 Ваша заявка #{request_id} зарегистрирована и отправлена на рассмотрение.\n"
+                    f"📄 Статус: {entry['status']}"
+                ),
+                outbox_repo.request_to_admin(ADMIN_CHAT_ID, request_id),
+            ]
+        request_id = request_repo.save_request(
+            entry['data'], entry['user_id'], entry['status'], journal_key=entry['key'], outbox=messages,
+            created_at=datetime.fromisoformat(entry['ts'])
+        )
+        return request_id is not None
+    if entry['op'] == OP_STATUS:
+        request_id = entry['request_id']
+        outcome = request_repo.apply_journaled_status(
+            request_id, entry['to_status'], entry['reason'], datetime.fromisoformat(entry['ts']), entry['outbox']
+        )
+        if outcome == request_repo.BULK_SKIPPED:
+            logger.warning(
+                f"[journal] Смена статуса заявки #{request_id} на {entry['to_status']} от {entry['ts']} "
+                f"не применена: заявку меняли после записи в журнал (или запись уже перенесена)"
+            )
+        elif outcome == request_repo.BULK_NOT_FOUND:
+            logger.warning(f"[journal] Смена статуса на {entry['to_status']}: заявка #{request_id} не найдена")
+        return outcome != request_repo.BULK_FAILED
+    logger.error(f"[journal] Неизвестная запись журнала: {entry}")
+    return True
+
+
+def _reject(entry):
+    """Отложить запись, которую БД отвергает при доступной БД, в dead.log."""
+    global _rejected
+    _write_lines(os.path.join(JOURNAL_DIR, DEAD_FILE), [json.dumps(entry, ensure_ascii=False, default=str) + '\n'])
+    _rejected += 1
+    logger.error(f"[journal] Запись {entry.get('key')} ({entry.get('op')}) отвергнута БД и перенесена в {DEAD_FILE}")
+
+
+def _read_segment(path):
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Недописанная строка при падении посреди записи
+                logger.error(f"[journal] Повреждённая строка {number} в {os.path.basename(path)} пропущена")
+    return entries
+
+
+def pending_segments():
+    if not os.path.isdir(JOURNAL_DIR):
+        return []
+    return sorted(name for name in os.listdir(JOURNAL_DIR) if name.startswith('replay-') and name.endswith('.log'))
+
+
+def has_pending():
+    path = _active_path()
+    return bool(pending_segments()) or (os.path.exists(path) and os.path.getsize(path) > 0)
+
+
+def replay():
+    """
+    Перенести журнал в БД. Текущий файл сначала переименовывается в сегмент replay-*.log
+    (новые записи идут в новый файл), сегменты применяются по порядку.
+    Запись, которая не применилась при доступной БД, уходит в dead.log.
+    Возвращает число применённых записей или None, если БД всё ещё недоступна
+    (неприменённые записи остаются в сегменте до следующей попытки).
+    """
+    global _replayed
+    if not os.path.isdir(JOURNAL_DIR):
+        return 0
+    with _replay_lock:
+        with _file_lock:
+            path = _active_path()
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                os.replace(path, os.path.join(JOURNAL_DIR, f"replay-{datetime.now():%Y%m%d%H%M%S%f}.log"))
+        applied = 0
+        for name in pending_segments():
+            segment = os.path.join(JOURNAL_DIR, name)
+            entries = _read_segment(segment)
+            for index, entry in enumerate(entries):
+                if not _apply(entry):
+                    if Database.ping():
+                        _reject(entry)
+                        continue
+                    # Сохраняем только оставшиеся записи, чтобы не применять их заново
+                    rest = [json.dumps(e, ensure_ascii=False, default=str) + '\n' for e in entries[index:]]
+                    _write_lines(segment + '.tmp', rest, 'w')
+                    os.replace(segment + '.tmp', segment)
+                    _replayed += applied
+                    logger.warning(f"[journal] БД недоступна, в журнале осталось записей: {len(rest)}")
+                    return None
+                applied += 1
+            os.remove(segment)
+        _replayed += applied
+        if applied:
+            logger.info(f"[journal] Перенесено в БД записей журнала: {applied}")
+        return applied
+
+
+async def _loop():
+    while True:
+        try:
+            if has_pending():
+                # Свой поток вне пула запросов (run_sync): перенос большого журнала
+                # не упирается в таймаут DbExecutor и не занимает потоки обработчиков
+                await asyncio.to_thread(replay)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[journal] Ошибка переноса журнала в БД: {e}")
+        await asyncio.sleep(JOURNAL_CONFIG['replay_interval'])
+
+
+async def start(application):
+    """Запустить перенос журнала в БД (post_init приложения); первая попытка — сразу."""
+    global _replay_task
+    _replay_task = asyncio.create_task(_loop())
+
+
+async def stop():
+    global _replay_task
+    if _replay_task is not None:
+        _replay_task.cancel()
+        try:
+            await _replay_task
+        except asyncio.CancelledError:
+            pass
+        _replay_task = None
+
+
+def stats():
+    return {
+        'appended': _appended,
+        'fsyncs': _fsyncs,
+        'replayed': _replayed,
+        'rejected': _rejected,
+        'segments': len(pending_segments()),
+    }
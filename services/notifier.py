@@ -1,2 +1,142 @@
 ﻿# services/notifier.py
-# Заглушка для отправки уведомлений
+# Отправка уведомлений из очереди outbox (repositories/outbox_repo).
+# Обработчики записывают уведомления в той же транзакции, что и изменение заявки,
+# и сразу отвечают пользователю; отправка идёт здесь, в фоне: несколько сообщений
+# параллельно, с повторами при ошибках Telegram. Доставка «хотя бы один раз»:
+# если бот упадёт между отправкой и отметкой, сообщение уйдёт повторно.
+
+import asyncio
+import logging
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from config import OUTBOX_CONFIG
+from db_async import run_sync
+from repositories import outbox_repo
+
+logger = logging.getLogger(__name__)
+
+_application = None
+_task = None
+_wakeup = None
+_sent = 0
+_failed = 0
+_retried = 0
+
+
+def wake():
+    """Разбудить отправку сразу после записи уведомлений (не ждать poll_interval)."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+async def _deliver(row):
+    # Карточка заявки строится в момент отправки — по уже сохранённой заявке.
+    # Если заявку не удалось прочитать (сбой БД), уведомление остаётся в очереди и повторяется.
+    if row['kind'] == outbox_repo.KIND_REQUEST_TO_OPERATOR:
+        from handlers.operator.operator_requests import send_request_to_operator
+        if not await send_request_to_operator(_application, row['chat_id'], row['payload']['request_id']):
+            raise RuntimeError(f"не удалось прочитать заявку #{row['payload']['request_id']}")
+    elif row['kind'] == outbox_repo.KIND_REQUEST_TO_ADMIN:
+        from handlers.admin.admin_requests import get_admin_request_text_and_keyboard
+        from repositories.async_request_repo import get_request_full
+        request = await get_request_full(row['payload']['request_id'])
+        if not request:
+            raise RuntimeError(f"не удалось прочитать заявку #{row['payload']['request_id']}")
+        text, keyboard = await get_admin_request_text_and_keyboard(request)
+        await _application.bot.send_message(chat_id=row['chat_id'], text=text, reply_markup=keyboard)
+    else:
+        await _application.bot.send_message(
+            chat_id=row['chat_id'],
+            text=row['payload']['text'],
+            parse_mode=row['payload'].get('parse_mode')
+        )
+
+
+async def _send(row, semaphore):
+    """Возвращает True, если сообщение отправлено; ошибки записываются в очередь."""
+    global _failed, _retried
+    async with semaphore:
+        try:
+            await _deliver(row)
+            return True
+        except (Forbidden, BadRequest) as e:
+            # Бот заблокирован или чат не найден — повтор не поможет
+            error, retry_in = e, None
+        except RetryAfter as e:
+            error, retry_in = e, e.retry_after
+        except Exception as e:
+            error, retry_in = e, OUTBOX_CONFIG['retry_delay'] * 2 ** row['attempts']
+        if retry_in is not None and row['attempts'] + 1 >= OUTBOX_CONFIG['max_attempts']:
+            retry_in = None
+        if retry_in is None:
+            _failed += 1
+            logger.error(f"[notifier] Уведомление #{row['id']} в чат {row['chat_id']} не доставлено: {error}")
+        else:
+            _retried += 1
+            logger.warning(f"[notifier] Уведомление #{row['id']}: {error}, повтор через {retry_in} с")
+        await run_sync(outbox_repo.mark_failed, row['id'], error, retry_in)
+        return False
+
+
+async def drain():
+    """Отправить все уведомления, которые пора отправить. Возвращает число отправленных."""
+    global _sent
+    semaphore = asyncio.Semaphore(OUTBOX_CONFIG['concurrency'])
+    total = 0
+    while True:
+        rows = await run_sync(outbox_repo.fetch_due, OUTBOX_CONFIG['batch_size'])
+        if not rows:
+            return total
+        results = await asyncio.gather(*(_send(row, semaphore) for row in rows))
+        sent_ids = [row['id'] for row, ok in zip(rows, results) if ok]
+        await run_sync(outbox_repo.mark_sent, sent_ids)
+        _sent += len(sent_ids)
+        total += len(sent_ids)
+        if len(rows) < OUTBOX_CONFIG['batch_size']:
+            return total
+
+
+async def _loop():
+    cycles = 0
+    while True:
+        try:
+            await drain()
+            cycles += 1
+            if cycles % 1000 == 0:
+                await run_sync(outbox_repo.purge_sent, OUTBOX_CONFIG['keep_days'])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[notifier] Ошибка отправки очереди уведомлений: {e}")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), OUTBOX_CONFIG['poll_interval'])
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+async def start(application):
+    """Запустить фоновую отправку (post_init приложения)."""
+    global _application, _task, _wakeup
+    _application = application
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_loop())
+
+
+async def stop():
+    """Остановить отправку; неотправленное останется в очереди до следующего запуска."""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def stats():
+    return {
+        'sent': _sent,
+        'failed': _failed,
+        'retried': _retried,
+    }
@@ -0,0 +1,114 @@
+# services/operator_directory.py
+# Справочник операторов в памяти процесса.
+# Список операторов нужен на каждом шаге назначения заявки, а меняется только
+# при смене ролей. Справочник перечитывается из БД, когда меняется
+# Database.get_operators_version() (set_user_role / set_user оператора),
+# либо явно через refresh() (команда /refresh_operators).
+
+import asyncio
+import logging
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from db import Database
+from db_async import AsyncDatabase
+
+logger = logging.getLogger(__name__)
+
+# Префиксы callback_data кнопок выбора оператора: <префикс><operator_id>_<request_id>
+OPERATOR_PREFIXES = ('operator_', 'edited_operator_', 'duplicate_operator_')
+
+_operators = []     # список операторов в порядке user_id
+_by_id = {}         # user_id -> оператор
+_rows = {}          # префикс -> [(подпись кнопки, callback_data без request_id)]
+_version = None     # версия, с которой загружен справочник
+_loads = 0
+_lock = None
+
+
+def _get_lock():
+    # Lock создаётся внутри работающего цикла событий
+    global _lock
+    if _lock is None:
+        _lock = asyncio.Lock()
+    return _lock
+
+
+def _build(operators, version):
+    global _operators, _by_id, _rows, _version, _loads
+    labels = [(f"{op['full_name']} (@{op['username']})", op['user_id']) for op in operators]
+    _rows = {
+        prefix: [(label, f"{prefix}{user_id}_") for label, user_id in labels]
+        for prefix in OPERATOR_PREFIXES
+    }
+    _by_id = {op['user_id']: op for op in operators}
+    _operators = list(operators)
+    _version = version
+    _loads += 1
+    logger.info(f"[operator_directory] Загружено операторов: {len(operators)} (версия {version})")
+
+
+def _clear():
+    # Справочник без версии: при следующем обращении он будет прочитан заново
+    global _operators, _by_id, _rows, _version
+    _operators, _by_id, _rows, _version = [], {}, {}, None
+
+
+async def _load(force=False):
+    async with _get_lock():
+        version = Database.get_operators_version()
+        if not force and _version == version and _operators:
+            return
+        operators = await AsyncDatabase.get_operators()
+        if not operators:
+            # Пустой ответ может означать и ошибку БД: не запоминаем его,
+            # при следующем обращении список будет прочитан заново
+            logger.warning("[operator_directory] Операторы не найдены")
+            _clear()
+            return
+        _build(operators, version)
+
+
+async def get_operators(force=False):
+    """Список операторов (user_id, username, full_name)."""
+    if force or _version != Database.get_operators_version() or not _operators:
+        await _load(force)
+    return list(_operators)
+
+
+async def refresh():
+    """Принудительно перечитать справочник из БД."""
+    return await get_operators(force=True)
+
+
+async def get_operator(operator_id):
+    await get_operators()
+    return _by_id.get(operator_id)
+
+
+async def get_operator_name(operator_id):
+    operator = await get_operator(operator_id)
+    return operator['full_name'] if operator else f"Оператор {operator_id}"
+
+
+async def get_operator_keyboard(prefix, request_id):
+    """
+    Клавиатура выбора оператора для заявки.
+    Подписи и callback_data готовятся при загрузке справочника,
+    здесь к ним только дописывается номер заявки.
+    Возвращает None, если операторов нет.
+    """
+    await get_operators()
+    rows = _rows.get(prefix, [])
+    if not rows:
+        return None
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(label, callback_data=f"{callback}{request_id}")]
+        for label, callback in rows
+    ])
+
+
+def stats():
+    return {
+        'operators': len(_operators),
+        'version': _version,
+        'loads': _loads,
+    }
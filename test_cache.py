@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Тесты TTL-кэша профилей пользователей
+"""
+
+import time
+from cache import TTLCache
+
+def test_hit_and_expire():
+    cache = TTLCache(ttl=0.05, max_size=10)
+    cache.set(1, 'a')
+    assert cache.get(1) == 'a'
+    time.sleep(0.06)
+    assert cache.get(1) is None
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+
+def test_lru_eviction():
+    cache = TTLCache(ttl=60, max_size=2)
+    cache.set(1, 'a')
+    cache.set(2, 'b')
+    cache.get(1)
+    cache.set(3, 'c')
+    assert cache.get(2) is None
+    assert cache.get(1) == 'a' and cache.get(3) == 'c'
+
+def test_stale_load_not_stored_after_invalidate():
+    # Значение, прочитанное до изменения, не должно попасть в кэш
+    cache = TTLCache(ttl=60, max_size=10)
+    token = cache.token()
+    cache.invalidate(1)
+    assert cache.set(1, 'old', token) is False
+    assert cache.get(1) is None
+
+def test_concurrent_misses_collapse():
+    import threading
+    cache = TTLCache(ttl=60, max_size=10)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(1)
+        return {'id': 1}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_load(1, loader)))
+    leader.start()
+    started.wait(1)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_load(1, loader))) for _ in range(3)]
+    for t in followers:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in [leader] + followers:
+        t.join(1)
+    assert len(calls) == 1
+    assert results == [{'id': 1}] * 4
+    assert cache.stats()['collapsed'] == 3
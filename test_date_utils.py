@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Тесты разбора дат и времени для записи в колонки DATE/TIME
+"""
+
+from datetime import date, time, timedelta
+from utils.date_utils import parse_date, parse_time
+
+def test_parse_date_formats():
+    assert parse_date("2025-08-02") == date(2025, 8, 2)
+    assert parse_date("02.08.2025") == date(2025, 8, 2)
+    assert parse_date("02.08.25") == date(2025, 8, 2)
+    assert parse_date(date(2025, 8, 2)) == date(2025, 8, 2)
+    assert parse_date("02.08", reference=date(2025, 7, 30)) == date(2025, 8, 2)
+
+def test_parse_date_year_rollover():
+    # 31 декабря выбрана дата '01.01' — это следующий год
+    assert parse_date("01.01", reference=date(2025, 12, 31)) == date(2026, 1, 1)
+
+def test_parse_date_invalid():
+    assert parse_date("") is None
+    assert parse_date(None) is None
+    assert parse_date("завтра") is None
+    assert parse_date("31.02.2025") is None
+
+def test_parse_time():
+    assert parse_time("08:30") == time(8, 30)
+    assert parse_time("08:30:15") == time(8, 30, 15)
+    assert parse_time(timedelta(hours=22, minutes=5)) == time(22, 5)
+    assert parse_time("") is None
+    assert parse_time("25:00") is None
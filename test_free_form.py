@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Тесты разбора заявок в свободной форме по образцу из меню
+"""
+
+from datetime import date, time
+from utils.free_form import parse_free_form
+
+TEXT = (
+    "🏢 Подразделение: Новый мир\n"
+    "🚧 Направление: В РФ\n"
+    "🚪 Пункт пропуска: Пункт № 1\n"
+    "📅 Дата (ДД.ММ - ДД.ММ): 28.12 - 03.01\n"
+    "⏰ Время (ЧЧ:ММ - ЧЧ:ММ): 08:00 - 18:00\n"
+    "🚘 Марки авто и кол-во (КамАЗ -1): КамАЗ-2\n"
+    "УАЗ-1\n"
+    "👥 Кол-во людей: 15 человек\n"
+    "👨‍✈️ Позывной старшего: Орел-1\n"
+    "🔫 Наличие ВВСТ (Оружие, Техника): нет\n"
+    "💬 Цель перехода: Перевозка груза\n"
+)
+
+def test_parse_template_text():
+    fields = parse_free_form(TEXT, reference=date(2025, 12, 20))
+    assert fields['division'] == 'Новый мир'
+    assert fields['checkpoint'] == 'Пункт № 1'
+    assert (fields['date_start'], fields['date_end']) == (date(2025, 12, 28), date(2026, 1, 3))
+    assert (fields['time_start'], fields['time_end']) == (time(8, 0), time(18, 0))
+    assert fields['car_brand'] == 'КамАЗ-2, УАЗ-1'
+    assert fields['people_count'] == 15
+    assert fields['leader_name'] == 'Орел-1'
+    assert 'purpose' not in fields
+
+def test_parse_single_date():
+    fields = parse_free_form(TEXT.replace("28.12 - 03.01", "15.08.2025"))
+    assert fields['date_start'] == fields['date_end'] == date(2025, 8, 15)
+
+def test_not_confident():
+    assert parse_free_form("Прошу пропустить машину завтра") is None
+    assert parse_free_form(TEXT.replace("28.12 - 03.01", "после обеда")) is None
+    assert parse_free_form(TEXT.replace("08:00 - 18:00", "с утра")) is None
+    assert parse_free_form("📅 Дата: 15.08\n💬 Цель перехода: работа") is None
+    assert parse_free_form(TEXT + "🏢 Подразделение: другое\n") is None
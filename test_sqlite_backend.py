@@ -0,0 +1,372 @@
+"""
+Тесты репозитория заявок на хранилище SQLite в памяти (без MySQL)
+"""
+
+import asyncio
+import json
+import time
+import pytest
+import db
+from datetime import date, datetime, timedelta
+from mysql.connector.errors import OperationalError
+from config import ADMIN_CHAT_ID
+from db import Database, current_actor
+from db_sqlite import SQLitePool, translate
+from repositories import archive_repo, event_repo, outbox_repo, request_repo, stats_repo
+from services import archiver, free_form_backfill, journal
+
+REQUEST = {
+    'division': 'Отдел', 'direction': 'Север', 'checkpoint': 'КПП-1',
+    'date_start': '10.10.2026', 'date_end': '12.10.2026',
+    'time_start': '08:00', 'time_end': '10:30',
+    'car_brand': 'КамАЗ', 'people_count': 3, 'leader_name': 'Сокол Иванов',
+    'cargo': 'нет', 'purpose': 'работы'
+}
+
+
+@pytest.fixture(autouse=True)
+def sqlite_pool():
+    Database.set_pool(SQLitePool(':memory:'))
+    yield
+    Database.set_pool(None)
+
+
+def test_translate_mysql_dialect():
+    sql = translate(
+        "INSERT INTO users (user_id, username) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE username=VALUES(username)"
+    )
+    assert sql == "INSERT INTO users (user_id, username) VALUES (?, ?) ON CONFLICT DO UPDATE SET username=excluded.username"
+    assert translate("SELECT id FROM requests WHERE id IN (%s) FOR UPDATE") == "SELECT id FROM requests WHERE id IN (?)"
+
+
+def test_request_roundtrip():
+    request_id = request_repo.save_request(dict(REQUEST), 1)
+    assert request_repo.update_request_status(request_id, request_repo.STATUS_IN_PROGRESS)
+    request = request_repo.get_request_full(request_id)
+    assert request['status'] == request_repo.STATUS_IN_PROGRESS
+    assert request['date_start'].isoformat() == '2026-10-10'
+    assert request['version'] == 1
+
+
+def test_register_user_keeps_role():
+    Database.set_user(5, 'op', 'Оператор', 'operator')
+    profile = Database.register_or_touch_user(5, 'op2', 'Оператор')
+    assert profile['role'] == 'operator'
+    assert [u['username'] for u in request_repo.iter_all_users()] == ['op2']
+
+
+def test_operators_version_bumped_on_demotion():
+    Database.set_user(5, 'op', 'Оператор', 'operator')
+    version = Database.get_operators_version()
+    Database.set_user(6, 'user', 'Пользователь', 'user')
+    assert Database.get_operators_version() == version
+    Database.set_user(5, 'op', 'Оператор', 'user')
+    assert Database.get_operators_version() == version + 1
+
+
+class DroppedReplica:
+    # Реплика, соединение с которой обрывается на первом запросе
+    def __init__(self):
+        self.pool = object()
+        self.down = False
+
+    def acquire(self, actor=None):
+        return None if self.down else DroppedConnection(self.pool)
+
+    def owns(self, conn):
+        return conn._pool is self.pool
+
+    def mark_down(self):
+        self.down = True
+
+
+class DroppedConnection:
+    def __init__(self, pool):
+        self._pool = pool
+        self.open = True
+
+    def cursor(self, **kwargs):
+        raise OperationalError(msg="Lost connection to MySQL server during query", errno=2013)
+
+    def discard(self):
+        self.open = False
+
+    def is_connected(self):
+        return self.open
+
+
+def test_read_retried_on_primary_when_replica_drops(monkeypatch):
+    request_id = request_repo.save_request(dict(REQUEST), 7)
+    replica = DroppedReplica()
+    monkeypatch.setattr(db, '_replica', replica)
+    assert request_repo.get_request_for_viewer(request_id, user_id=7)['id'] == request_id
+    assert replica.down
+
+
+def test_leader_search_without_fulltext():
+    request_repo.save_request(dict(REQUEST), 1)
+    request_repo.save_request(dict(REQUEST, leader_name='Беркут'), 1)
+    rows, has_more = request_repo.search_requests_by_leader('ИВАН', '01.10.2026', '31.10.2026')
+    assert [row['leader_name'] for row in rows] == ['Сокол Иванов']
+    assert not has_more
+    # Короткое слово — тоже начало любого слова позывного; середина слова не ищется
+    rows, _ = request_repo.search_requests_by_leader('ив', '01.10.2026', '31.10.2026')
+    assert [row['leader_name'] for row in rows] == ['Сокол Иванов']
+    assert request_repo.search_requests_by_leader('ван', '01.10.2026', '31.10.2026') == ([], False)
+
+
+def test_operator_page_navigation():
+    ids = [request_repo.save_request(dict(REQUEST), 1) for _ in range(5)]
+    rows, has_more = request_repo.get_operator_requests_page('01.10.2026', '31.10.2026', limit=2)
+    assert [r['id'] for r in rows] == ids[:2] and has_more
+    rows, has_more = request_repo.get_operator_requests_page('01.10.2026', '31.10.2026', after_id=ids[3], limit=2)
+    assert [r['id'] for r in rows] == ids[4:] and not has_more
+    # Назад: строки по возрастанию id, has_more — есть ли ещё более ранние
+    rows, has_more = request_repo.get_operator_requests_page('01.10.2026', '31.10.2026', before_id=ids[4], limit=2)
+    assert [r['id'] for r in rows] == ids[2:4] and has_more
+
+
+def test_bulk_outcomes():
+    first = request_repo.save_request(dict(REQUEST), 1)
+    second = request_repo.save_request(dict(REQUEST), 1)
+    request_repo.update_request_status(second, request_repo.STATUS_COMPLETED)
+    outcomes = request_repo.bulk_update_status(
+        [first, second, 999], request_repo.STATUS_CANCELLED, 'дубль', request_repo.PENDING_STATUSES
+    )
+    assert outcomes == {
+        first: request_repo.BULK_UPDATED,
+        second: request_repo.BULK_SKIPPED,
+        999: request_repo.BULK_NOT_FOUND,
+    }
+
+
+def test_outbox_written_with_status_change():
+    request_id = request_repo.save_request(dict(REQUEST), 7)
+    assert request_repo.assign_operator(request_id, 42, request_repo.STATUS_IN_PROGRESS, outbox=[
+        outbox_repo.request_to_operator(42, request_id),
+        outbox_repo.message(7, "принята"),
+    ])
+    with pytest.raises(ValueError):
+        request_repo.update_request_status(request_id, 'нет такого', outbox=[outbox_repo.message(7, "лишнее")])
+    rows = outbox_repo.fetch_due()
+    assert [(row['kind'], row['chat_id']) for row in rows] == [
+        (outbox_repo.KIND_REQUEST_TO_OPERATOR, 42), (outbox_repo.KIND_MESSAGE, 7)
+    ]
+    assert rows[0]['payload'] == {'request_id': request_id}
+    assert outbox_repo.mark_sent([rows[0]['id']])
+    assert outbox_repo.mark_failed(rows[1]['id'], "Forbidden")
+    assert outbox_repo.get_outbox_counts() == {outbox_repo.OUTBOX_SENT: 1, outbox_repo.OUTBOX_FAILED: 1}
+    assert request_repo.get_request_full(request_id)['status'] == request_repo.STATUS_IN_PROGRESS
+
+
+def test_request_history_events():
+    token = current_actor.set(77)
+    try:
+        request_id = request_repo.save_request(dict(REQUEST), 7)
+        request_repo.update_request_changes(request_id, {'cargo': 'есть', 'edited_fields': 'cargo'})
+        request_repo.assign_operator(request_id, 42, request_repo.STATUS_IN_PROGRESS)
+        request_repo.bulk_update_status([request_id], request_repo.STATUS_CANCELLED, 'дубль')
+    finally:
+        current_actor.reset(token)
+    history = event_repo.get_request_history(request_id)
+    assert [(e['from_status'], e['to_status'], e['changed_fields']) for e in history] == [
+        (None, request_repo.STATUS_NEW, None),
+        (request_repo.STATUS_NEW, request_repo.STATUS_NEW, 'cargo'),
+        (request_repo.STATUS_NEW, request_repo.STATUS_IN_PROGRESS, 'operator_id'),
+        (request_repo.STATUS_IN_PROGRESS, request_repo.STATUS_CANCELLED, 'reason'),
+    ]
+    assert {e['actor'] for e in history} == {77}
+    now = datetime.now()
+    counts = event_repo.get_status_change_counts(now - timedelta(hours=1), now + timedelta(hours=1))
+    assert counts == {request_repo.STATUS_NEW: 1, request_repo.STATUS_IN_PROGRESS: 1, request_repo.STATUS_CANCELLED: 1}
+
+
+def test_archived_request_found_by_id():
+    old = request_repo.save_request(dict(REQUEST), 7)
+    open_old = request_repo.save_request(dict(REQUEST), 7)
+    fresh = request_repo.save_request(dict(REQUEST), 7)
+    for request_id in (old, fresh):
+        request_repo.update_request_status(request_id, request_repo.STATUS_COMPLETED)
+    conn = Database.get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute("UPDATE requests SET created_at = %s WHERE id IN (%s, %s)", (datetime(2025, 1, 15), old, open_old))
+    conn.commit()
+    conn.close()
+
+    assert archiver.run_once(after_months=3) == 1
+    assert archive_repo.get_archive_count() == 1
+    archived = request_repo.get_request_full(old)
+    assert archived['status'] == request_repo.STATUS_COMPLETED
+    assert archived['date_start'].isoformat() == '2026-10-10'
+    assert request_repo.get_request_status(old) == request_repo.STATUS_COMPLETED
+    assert request_repo.get_request_for_viewer(old, user_id=7)['id'] == old
+    assert request_repo.get_request_for_viewer(old, user_id=8) is None
+    assert request_repo.get_request_full(open_old)['status'] == request_repo.STATUS_NEW
+    # Архивную заявку не изменить, уведомления о смене статуса не пишутся
+    assert request_repo.is_archived(archived) and not request_repo.is_archived(request_repo.get_request_full(fresh))
+    assert not request_repo.update_request_status(
+        old, request_repo.STATUS_CANCELLED, 'поздно', outbox=[outbox_repo.message(7, "отменена")]
+    )
+    assert outbox_repo.fetch_due() == []
+
+
+def test_daily_stats_match_rebuild():
+    first = request_repo.save_request(dict(REQUEST), 7)
+    second = request_repo.save_request(dict(REQUEST, checkpoint='КПП-2', people_count=5), 7)
+    free_form = request_repo.save_request({'purpose': 'свободная форма'}, 7)
+    request_repo.assign_operator(first, 42, request_repo.STATUS_IN_PROGRESS)
+    request_repo.update_request_changes(second, {'date_start': '11.10.2026', 'people_count': 2})
+    request_repo.bulk_update_status([first, free_form], request_repo.STATUS_CANCELLED, 'дубль')
+    october = stats_repo.get_daily_stats(date(2026, 10, 10), date(2026, 10, 12))
+    assert sorted((r['checkpoint'], r['status'], r['request_count'], r['people_sum']) for r in october if r['checkpoint']) == [
+        ('КПП-1', request_repo.STATUS_CANCELLED, 1, 3),
+        ('КПП-2', request_repo.STATUS_NEW, 1, 2),
+    ]
+    today = datetime.now().date()
+    incremental = stats_repo.get_daily_stats(date(2000, 1, 1), today + timedelta(days=3650))
+    conn = Database.get_connection()
+    stats_repo.rebuild(conn)
+    conn.close()
+    rebuilt = stats_repo.get_daily_stats(date(2000, 1, 1), today + timedelta(days=3650))
+    key = lambda r: (r['checkpoint'], r['direction'], r['status'])
+    assert sorted(incremental, key=key) == sorted(rebuilt, key=key)
+
+
+def test_journal_replay_is_idempotent(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, 'JOURNAL_DIR', str(tmp_path))
+    request_id = request_repo.save_request(dict(REQUEST), 7)
+    # БД отвечает — запись в журнал не принимается
+    assert asyncio.run(journal.submit_request(dict(REQUEST), 8)) is None
+
+    async def accept():
+        return await asyncio.gather(
+            journal.submit_request(dict(REQUEST, leader_name='Беркут'), 8),
+            journal.change_status(request_id, request_repo.STATUS_CANCELLED, 'дубль',
+                                  outbox=[outbox_repo.message(None, "отменена")]),
+        )
+
+    # Следующая секунда: смена статуса записана в журнал позже сохранения заявки
+    time.sleep(1)
+    with monkeypatch.context() as db_down:
+        db_down.setattr(Database, 'ping', staticmethod(lambda: False))
+        key, changed = asyncio.run(accept())
+    assert key and changed
+    saved = (tmp_path / journal.ACTIVE_FILE).read_text(encoding='utf-8')
+    assert journal.replay() == 2
+    assert not journal.has_pending()
+    # Падение после применения, но до удаления сегмента: журнал применяется ещё раз
+    (tmp_path / journal.ACTIVE_FILE).write_text(saved, encoding='utf-8')
+    assert journal.replay() == 2
+    rows, _ = request_repo.search_requests_by_leader('беркут', '01.10.2026', '31.10.2026')
+    assert len(rows) == 1
+    assert request_repo.get_request_full(request_id)['status'] == request_repo.STATUS_CANCELLED
+    assert [(row['kind'], row['chat_id']) for row in outbox_repo.fetch_due()] == [
+        (outbox_repo.KIND_MESSAGE, 8), (outbox_repo.KIND_REQUEST_TO_ADMIN, ADMIN_CHAT_ID), (outbox_repo.KIND_MESSAGE, 7)
+    ]
+
+
+def test_free_form_requests_scoped_by_created_at():
+    template_id = request_repo.save_request(dict(REQUEST), 7)
+    fresh_id = request_repo.save_request({'purpose': 'Пропустить машину'}, 7)
+    old_id = request_repo.save_request({'purpose': 'Старая заявка'}, 7)
+    conn = Database.get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute("UPDATE requests SET created_at = %s WHERE id = %s", (datetime(2025, 1, 10, 12), old_id))
+    conn.commit()
+    conn.close()
+    assert request_repo.get_request_full(template_id)['form_type'] == request_repo.FORM_TEMPLATE
+    assert request_repo.is_free_form(request_repo.get_request_full(fresh_id))
+    today = datetime.now().date()
+    ids = [r['id'] for r in request_repo.get_requests_for_operator_by_date_range(0, today, today)]
+    assert fresh_id in ids and old_id not in ids
+    rows, _ = request_repo.get_operator_requests_page(date(2025, 1, 10), date(2025, 1, 10))
+    assert [r['id'] for r in rows] == [old_id]
+    assert request_repo.get_request_for_viewer(old_id, operator_id=1, date_from=today, date_to=today) is None
+
+
+def test_free_form_fields_extracted_and_backfilled():
+    text = (
+        "🏢 Подразделение: Новый мир\n🚪 Пункт пропуска: КПП-1\n📅 Дата: 10.10.2026 - 11.10.2026\n"
+        "👥 Кол-во людей: 4\n👨‍✈️ Позывной старшего: Сокол\n"
+    )
+    request_id = request_repo.save_request({'purpose': text}, 7)
+    request = request_repo.get_request_full(request_id)
+    assert request_repo.is_free_form(request) and request['checkpoint'] == 'КПП-1'
+    rows, _ = request_repo.search_requests_by_leader('сокол', '01.10.2026', '31.10.2026')
+    assert [r['id'] for r in rows] == [request_id]
+    # Заявка, поданная до разбора при сохранении
+    old_id = request_repo.save_request({'purpose': 'черновик'}, 7)
+    conn = Database.get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute("UPDATE requests SET purpose = %s WHERE id = %s", (text.replace('Сокол', 'Ястреб'), old_id))
+    conn.commit()
+    conn.close()
+    assert free_form_backfill.run(workers=2) == (1, 1)
+    assert free_form_backfill.run(workers=2) == (0, 0)
+    rows, _ = request_repo.search_requests_by_leader('ястреб', '01.10.2026', '31.10.2026')
+    assert [r['id'] for r in rows] == [old_id]
+    assert request_repo.get_request_full(old_id)['version'] == 1
+    # Текст исправлен и больше не разбирается — прежние поля очищаются
+    assert request_repo.update_request_changes(old_id, {'purpose': 'пропустить'})
+    assert request_repo.get_request_full(old_id)['date_start'] is None
+
+
+def test_outbox_card_kept_when_request_unreadable(monkeypatch):
+    from repositories import async_request_repo
+    from services import notifier
+
+    async def unreadable(request_id):
+        return None
+
+    monkeypatch.setattr(async_request_repo, 'get_request_full', unreadable)
+    monkeypatch.setattr('handlers.operator.operator_requests.get_request_full', unreadable)
+    request_id = request_repo.save_request(dict(REQUEST), 7)
+    assert request_repo.assign_operator(request_id, 42, outbox=[
+        outbox_repo.request_to_operator(42, request_id),
+        outbox_repo.request_to_admin(1, request_id),
+    ])
+    assert asyncio.run(notifier.drain()) == 0
+    assert outbox_repo.get_outbox_counts() == {outbox_repo.OUTBOX_PENDING: 2}
+
+
+def test_edit_buffer_overlays_staged_changes(tmp_path, monkeypatch):
+    from services import edit_buffer
+    monkeypatch.setattr(edit_buffer, 'DRAFTS_DIR', str(tmp_path))
+    request_id = request_repo.save_request(dict(REQUEST), 7)
+
+    async def edit():
+        edit_buffer.stage(request_id, {'checkpoint': 'КПП-2'}, ['checkpoint'])
+        edit_buffer.stage(request_id, {'cargo': 'ящики'}, ['checkpoint', 'cargo'])
+        staged = await edit_buffer.get_request(request_id)
+        assert await edit_buffer.flush(request_id)
+        return staged
+
+    staged = asyncio.run(edit())
+    assert (staged['checkpoint'], staged['cargo'], staged['edited_fields']) == ('КПП-2', 'ящики', 'checkpoint,cargo')
+    assert request_repo.get_request_full(request_id)['edited_fields'] == 'checkpoint,cargo'
+
+
+def test_journal_rejected_entry_does_not_block_replay(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, 'JOURNAL_DIR', str(tmp_path))
+    request_id = request_repo.save_request(dict(REQUEST), 7)
+    entries = [
+        # БД отвечает, но отвергает эту запись при каждой попытке
+        {'op': journal.OP_STATUS, 'key': 'k1', 'ts': '2026-10-01T10:00:00', 'request_id': request_id,
+         'to_status': request_repo.STATUS_CANCELLED, 'reason': None, 'outbox': []},
+        {'op': journal.OP_SAVE_REQUEST, 'key': 'k2', 'ts': '2026-10-01T10:00:05', 'user_id': 9,
+         'status': request_repo.STATUS_NEW, 'data': dict(REQUEST, leader_name='Орлан')},
+    ]
+    apply_status = request_repo.apply_journaled_status
+    monkeypatch.setattr(request_repo, 'apply_journaled_status', lambda *args: request_repo.BULK_FAILED)
+    (tmp_path / journal.ACTIVE_FILE).write_text(
+        ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries), encoding='utf-8')
+    assert journal.replay() == 1
+    assert not journal.has_pending()
+    assert json.loads((tmp_path / journal.DEAD_FILE).read_text(encoding='utf-8'))['key'] == 'k1'
+    rows, _ = request_repo.search_requests_by_leader('орлан', '01.10.2026', '31.10.2026')
+    saved = request_repo.get_request_full(rows[0]['id'])
+    assert str(saved['created_at']).startswith('2026-10-01 10:00:05')
+    # Смена статуса, записанная в журнал раньше последнего изменения заявки, не применяется
+    assert apply_status(
+        request_id, request_repo.STATUS_CANCELLED, None, datetime(2026, 1, 1)) == request_repo.BULK_SKIPPED
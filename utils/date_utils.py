@@ -1,7 +1,7 @@
 ﻿# utils/date_utils.py
 # Функции для работы с датами
 
-from datetime import datetime, timedelta
+from datetime import datetime, date, time, timedelta
 
 def format_date_for_display(date_str):
     """
@@ -47,4 +47,68 @@ def format_time_for_display(time_str):
             dt = datetime.strptime(time_str, "%H:%M")
         except ValueError:
             return time_str
-    return dt.strftime("%H:%M")
\ No newline at end of file
+    return dt.strftime("%H:%M")
+
+def parse_date(value, reference=None):
+    """
+    Единый разбор даты для записи в БД (колонки DATE).
+    Принимает 'дд.мм', 'дд.мм.гг', 'дд.мм.гггг', 'YYYY-MM-DD' и объекты date/datetime.
+    Для 'дд.мм' год берётся из reference (по умолчанию сегодня); если дата
+    оказывается больше чем на полгода в прошлом, считается, что это следующий год
+    (выбор '01.01' 31 декабря). Нераспознанное значение возвращается как None.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d.%m.%Y", "%d.%m.%y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    try:
+        day_month = datetime.strptime(text, "%d.%m")
+    except ValueError:
+        return None
+    reference = reference or date.today()
+    if isinstance(reference, datetime):
+        reference = reference.date()
+    try:
+        result = day_month.replace(year=reference.year).date()
+    except ValueError:
+        # 29.02 в невисокосном году
+        return None
+    if result < reference - timedelta(days=183):
+        try:
+            result = result.replace(year=reference.year + 1)
+        except ValueError:
+            return None
+    return result
+
+def parse_time(value):
+    """
+    Единый разбор времени для записи в БД (колонки TIME).
+    Принимает 'ЧЧ:ММ', 'ЧЧ:ММ:СС', объекты time/datetime и timedelta (так MySQL
+    возвращает TIME). Нераспознанное значение возвращается как None.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.time().replace(microsecond=0)
+    if isinstance(value, time):
+        return value
+    if isinstance(value, timedelta):
+        total_seconds = int(value.total_seconds())
+        if not 0 <= total_seconds < 24 * 3600:
+            return None
+        return time(total_seconds // 3600, (total_seconds % 3600) // 60, total_seconds % 60)
+    text = str(value).strip()
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            return datetime.strptime(text, fmt).time()
+        except ValueError:
+            pass
+    return None
\ No newline at end of file
@@ -0,0 +1,110 @@
+# utils/free_form.py
+# Разбор заявки в свободной форме по образцу, который бот показывает при выборе
+# «🗒 В свободной форме» (main.menu_choice): строки «Подпись: значение».
+# Поля заполняются только при уверенном разборе: распознаны даты и несколько подписей,
+# даты, время и число людей читаются без ошибок. Иначе заявка остаётся только текстом.
+# Функции без обращения к БД — их можно выполнять в пуле процессов (services/free_form_backfill).
+
+import re
+from utils.date_utils import parse_date, parse_time
+
+# Начало подписи (нижний регистр, без эмодзи) -> поле заявки;
+# 'dates'/'times' — диапазоны «ДД.ММ - ДД.ММ» и «ЧЧ:ММ - ЧЧ:ММ»
+LABELS = (
+    ('подразделение', 'division'),
+    ('направление', 'direction'),
+    ('пункт пропуска', 'checkpoint'),
+    ('кпп', 'checkpoint'),
+    ('дата', 'dates'),
+    ('время', 'times'),
+    ('марк', 'car_brand'),
+    ('кол-во людей', 'people_count'),
+    ('количество людей', 'people_count'),
+    ('позывной', 'leader_name'),
+    ('фио старшего', 'leader_name'),
+    ('старший', 'leader_name'),
+    ('наличие', 'cargo'),
+    ('груз', 'cargo'),
+    ('цель', 'purpose'),
+)
+
+# Сколько подписей должно быть распознано, кроме даты
+MIN_LABELS = 3
+
+# Длина строковых колонок requests
+FIELD_LIMITS = {'division': 255, 'direction': 50, 'checkpoint': 100, 'car_brand': 255, 'leader_name': 255}
+
+_LINE = re.compile(r'^[^\w]*(?P<label>[^:()]+?)\s*(?:\([^)]*\))?\s*:\s*(?P<value>.*)$')
+_DATE = re.compile(r'\d{1,2}\.\d{1,2}(?:\.\d{2,4})?')
+_TIME = re.compile(r'\d{1,2}:\d{2}')
+_NUMBER = re.compile(r'\d+')
+
+
+def _field_for(label):
+    label = ' '.join(label.lower().replace('ё', 'е').split())
+    for prefix, field in LABELS:
+        if label.startswith(prefix):
+            return field
+    return None
+
+
+def split_lines(text):
+    """Значения по полям: {поле: текст}. Строки без подписи продолжают предыдущее поле."""
+    values, field = {}, None
+    for line in (text or '').splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match = _LINE.match(line)
+        labeled = _field_for(match.group('label')) if match else None
+        if labeled:
+            if labeled in values:
+                raise ValueError(f"Подпись повторяется: {labeled}")
+            field = labeled
+            values[field] = match.group('value').strip()
+        elif field:
+            values[field] = f"{values[field]}, {line}" if values[field] else line
+    return {field: value for field, value in values.items() if value}
+
+
+def _range(value, pattern, parser):
+    parts = pattern.findall(value)
+    if not 1 <= len(parts) <= 2:
+        raise ValueError(f"Не удалось разобрать диапазон: {value!r}")
+    parsed = [parser(part) for part in parts]
+    if None in parsed:
+        raise ValueError(f"Не удалось разобрать диапазон: {value!r}")
+    return parsed[0], parsed[-1]
+
+
+def parse_free_form(text, reference=None):
+    """
+    Поля заявки по образцу из текста в свободной форме или None, если разбор не уверенный.
+    reference: дата подачи, от неё считается год для 'дд.мм' (как в parse_date).
+    Текст (purpose) не возвращается — он остаётся в заявке как есть.
+    """
+    try:
+        values = split_lines(text)
+        if 'dates' not in values or len(values) - 1 < MIN_LABELS:
+            return None
+        date_start, date_end = _range(values['dates'], _DATE, lambda v: parse_date(v, reference))
+        if date_end < date_start:
+            return None
+        fields = {'date_start': date_start, 'date_end': date_end, 'time_start': None, 'time_end': None}
+        if 'times' in values:
+            fields['time_start'], fields['time_end'] = _range(values['times'], _TIME, parse_time)
+        people = None
+        if 'people_count' in values:
+            number = _NUMBER.search(values['people_count'])
+            if not number:
+                return None
+            people = int(number.group())
+        fields['people_count'] = people
+        for field in ('division', 'direction', 'checkpoint', 'car_brand', 'leader_name', 'cargo'):
+            value = values.get(field)
+            if value and len(value) > FIELD_LIMITS.get(field, len(value)):
+                return None
+            fields[field] = value
+        return fields
+    except ValueError:
+        return None